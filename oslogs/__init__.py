@@ -0,0 +1,90 @@
+"""Tools for working with OpenSesame logfiles at scale.
+
+The tutorials in this book show how to merge and wrangle the logfiles of a
+handful of participants. The functions in this package do the same things
+for studies with thousands of logfiles. Run ``python -m oslogs --help`` from
+the root of the repository for the command line interface.
+"""
+from .chunked import PipelineResult, iter_chunks, run_pipeline
+from .collect import CollectStats, collect_files
+from .columnar import load_columnar, merge_columnar
+from .compact import MemoryReport, profile_dtypes, read_compact
+from .cube import SummaryCube, build_cube, cube_logfiles
+from .downloads import DownloadStats, download, read_csvs
+from .effects import compute_effects
+from .facets import FacetHistograms, facet_histograms
+from .figures import FigureStats, render_figures
+from .incremental import IncrementalStats, merge_incremental
+from .merge import (MergeStats, list_logfiles, merge_logfiles, merge_union, project_columns,
+                    union_columns)
+from .outliers import ExclusionReport, filter_trials
+from .pivot import count_by
+from .preprocess import preprocess_subjects
+from .provenance import annotate_file
+from .query import LogQuery, scan_logs
+from .recode import build_mapping, load_mapping, recode_values, save_mapping
+from .reshape import split_columns, wide_to_long
+from .sketch import (Histogram, Moments, QuantileSketch, Summary, describe, describe_groups,
+                     summarize, summarize_logfiles)
+from .sort import SortStats, sort_logfile
+from .stages import Pipeline, datawrangling_pipeline
+from .versions import VersionIndex, scan_versions
+
+__all__ = [
+    'CollectStats',
+    'DownloadStats',
+    'ExclusionReport',
+    'FacetHistograms',
+    'FigureStats',
+    'Histogram',
+    'IncrementalStats',
+    'LogQuery',
+    'MemoryReport',
+    'MergeStats',
+    'Moments',
+    'Pipeline',
+    'PipelineResult',
+    'QuantileSketch',
+    'SortStats',
+    'Summary',
+    'SummaryCube',
+    'VersionIndex',
+    'annotate_file',
+    'build_cube',
+    'build_mapping',
+    'collect_files',
+    'compute_effects',
+    'count_by',
+    'cube_logfiles',
+    'datawrangling_pipeline',
+    'describe',
+    'describe_groups',
+    'download',
+    'facet_histograms',
+    'filter_trials',
+    'iter_chunks',
+    'list_logfiles',
+    'load_columnar',
+    'load_mapping',
+    'merge_columnar',
+    'merge_incremental',
+    'merge_logfiles',
+    'merge_union',
+    'preprocess_subjects',
+    'profile_dtypes',
+    'project_columns',
+    'read_compact',
+    'read_csvs',
+    'recode_values',
+    'render_figures',
+    'run_pipeline',
+    'save_mapping',
+    'scan_logs',
+    'scan_versions',
+    'sort_logfile',
+    'split_columns',
+    'summarize',
+    'summarize_logfiles',
+    'union_columns',
+    'wide_to_long',
+]
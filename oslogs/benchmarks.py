@@ -0,0 +1,464 @@
+"""Benchmarks on synthetic OpenSesame logfiles.
+
+Run them with ``python -m oslogs bench <name>``; ``-n`` sets the size of the
+benchmark. Every benchmark prints its timings and returns them as a dict.
+"""
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from . import (cube, facets, figures, incremental, merge, outliers, pivot, preprocess, provenance, query,
+               recode, reshape, versions)
+
+# column names of a typical OpenSesame logfile: a few that matter and many
+# counters and backend settings that are logged because "Log all variables"
+# is checked
+LOG_COLUMNS = ['block', 'congruency_transition_type', 'congruency_type', 'correct', 'response',
+               'response_time', 'session', 'subject_nr', 'task_transition_type', 'task_type']
+
+
+def log_columns(n_columns=347):
+    """Return ``n_columns`` sorted column names, like the header of an OpenSesame logfile."""
+    extra = ['count_item_{}'.format(i) for i in range(max(0, n_columns - len(LOG_COLUMNS)))]
+    return sorted(LOG_COLUMNS + extra)[:n_columns]
+
+
+def make_logfiles(folder, n_files, n_rows=20, n_columns=347, first=1, seed=0):
+    """Write ``n_files`` synthetic logfiles ``subject-<nr>.csv`` to ``folder``.
+
+    Subject numbers start at ``first``. Returns the list of paths.
+    """
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    columns = log_columns(n_columns)
+    header = ','.join('"{}"'.format(column) for column in columns) + '\n'
+    paths = []
+    for subject_nr in range(first, first + n_files):
+        lines = [header]
+        for trial in range(n_rows):
+            values = {
+                'block': str(trial // 10 + 1),
+                'congruency_transition_type': rng.choice(['congruent-congruent', 'incongruent-congruent']),
+                'congruency_type': rng.choice(['congruent', 'incongruent']),
+                'correct': str(int(rng.random() < 0.9)),
+                'response': rng.choice(['a', 'l', 'None']),
+                'response_time': '{:.4f}'.format(rng.lognormvariate(6.5, 0.3)),
+                'session': rng.choice(['lowswitch', 'highswitch']),
+                'subject_nr': str(subject_nr),
+                'task_transition_type': rng.choice(['task-switch', 'task-repetition']),
+                'task_type': rng.choice(['parity', 'magnitude']),
+            }
+            lines.append(','.join('"{}"'.format(values.get(column, trial)) for column in columns) + '\n')
+        path = os.path.join(folder, 'subject-{}.csv'.format(subject_nr))
+        with open(path, 'w') as fout:
+            fout.writelines(lines)
+        paths.append(path)
+    return paths
+
+
+def bench_incremental(n=5000):
+    """Merge ``n`` logfiles from scratch, then again after adding one participant."""
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, 'data')
+        out = os.path.join(tmp, 'merged.csv')
+        make_logfiles(data, n)
+
+        start = time.perf_counter()
+        merge.merge_logfiles(data, out)
+        full = time.perf_counter() - start
+        incremental.merge_incremental(data, out)
+
+        make_logfiles(data, 1, first=n + 1, seed=1)
+        start = time.perf_counter()
+        stats = incremental.merge_incremental(data, out)
+        append = time.perf_counter() - start
+        assert stats.files_read == 1 and not stats.rebuilt
+
+        start = time.perf_counter()
+        incremental.merge_incremental(data, out)
+        noop = time.perf_counter() - start
+
+    print('full merge of {} files:       {:8.1f} ms'.format(n, full * 1e3))
+    print('incremental, 1 file added:    {:8.1f} ms'.format(append * 1e3))
+    print('incremental, nothing changed: {:8.1f} ms'.format(noop * 1e3))
+    return {'full': full, 'append': append, 'noop': noop}
+
+
+def _annotate_per_line(src, dst):
+    # Exercise 4 of the merging tutorial: rewrite every line in Python
+    name = os.path.basename(src)
+    pp = provenance.participant_from_path(src)
+    with open(src) as fhand, open(dst, 'w') as fout:
+        for linecount, line in enumerate(fhand):
+            fout.write(name + '\t' + pp + '\t' + str(linecount) + '\t' + line)
+
+
+def bench_annotate(n=1000000):
+    """Add provenance columns to a tab-delimited file of ``n`` lines, per line and per block."""
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'file_pp1.txt')
+        with open(src, 'w') as fout:
+            for j in range(n):
+                fout.write('Hello world. \t This is another column with line number {}\n'.format(j))
+        size = os.path.getsize(src)
+
+        start = time.perf_counter()
+        _annotate_per_line(src, os.path.join(tmp, 'per_line.txt'))
+        per_line = time.perf_counter() - start
+
+        start = time.perf_counter()
+        provenance.annotate_file(src, os.path.join(tmp, 'blocks.txt'))
+        blocks = time.perf_counter() - start
+
+        with open(os.path.join(tmp, 'per_line.txt'), 'rb') as a, \
+                open(os.path.join(tmp, 'blocks.txt'), 'rb') as b:
+            assert a.read() == b.read()
+
+    for label, seconds in [('per line', per_line), ('in blocks', blocks)]:
+        print('{:10} {:8.3f} s {:8.1f} MB/s'.format(label, seconds, size / 1e6 / seconds))
+    return {'per_line': per_line, 'blocks': blocks}
+
+
+def bench_versions(n=20000):
+    """Classify ``n`` logfiles of three experiment versions by their header."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # most participants ran the current version, some an older one
+        for folder, n_files, n_columns, first in [('v2', n - n // 5, 347, 1),
+                                                  ('v1/a', n // 10, 345, n),
+                                                  ('v1/b', n // 5 - n // 10, 340, 2 * n)]:
+            make_logfiles(os.path.join(tmp, folder), n_files, n_rows=2,
+                          n_columns=n_columns, first=first)
+        index = versions.scan_versions(tmp)
+        assert index.files == n and len(index.versions) == 3
+
+    print('{} files in {} versions: {:.3f} s, {:.0f} files/s'.format(
+        index.files, len(index.versions), index.seconds, index.files / index.seconds))
+    return {'scan': index.seconds}
+
+
+def _measure(func):
+    """Return the result of ``func()``, its run time and its peak of traced memory."""
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        result = func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def bench_query(n=200):
+    """Load, trim and filter ``n`` logfiles eagerly (like the tutorial) and with a lazy query."""
+    include_columns = ['subject_nr', 'block', 'session', 'congruency_transition_type',
+                       'congruency_type', 'correct', 'response_time', 'task_transition_type',
+                       'task_type', 'response']
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_logfiles(tmp, n, n_rows=400)
+
+        def eager():
+            df = pd.concat((pd.read_csv(path) for path in paths), ignore_index=True)
+            df_trim = df[include_columns]
+            df_trim_blocks = df_trim[df_trim['block'] < 11]
+            return df_trim_blocks[df_trim_blocks['correct'] == 1].reset_index(drop=True)
+
+        def lazy():
+            return (query.scan_logs(paths).select(include_columns)
+                    .filter('block', '<', 11).filter('correct', '==', 1).collect())
+
+        expected, eager_seconds, eager_peak = _measure(eager)
+        result, lazy_seconds, lazy_peak = _measure(lazy)
+        assert result.equals(expected)
+
+    for label, seconds, peak in [('eager', eager_seconds, eager_peak),
+                                 ('lazy', lazy_seconds, lazy_peak)]:
+        print('{:6} {:8.3f} s {:8.1f} MB peak'.format(label, seconds, peak / 1e6))
+    return {'eager': eager_seconds, 'lazy': lazy_seconds,
+            'eager_peak': eager_peak, 'lazy_peak': lazy_peak}
+
+
+def make_trials(n_subjects, n_trials=100, n_columns=20, seed=0):
+    """Return a DataFrame of ``n_trials`` trials per subject with ``n_columns`` conditions.
+
+    Besides ``subject_nr`` and ``response_time`` there are ``n_columns``
+    categorical columns ``factor_<i>`` with two to five levels each.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = n_subjects * n_trials
+    data = {'subject_nr': np.repeat(np.arange(1, n_subjects + 1), n_trials)}
+    for i in range(n_columns):
+        levels = np.array(['level_{}'.format(level) for level in range(2 + i % 4)])
+        data['factor_{}'.format(i)] = levels[rng.integers(0, len(levels), n_rows)]
+    data['response_time'] = rng.lognormal(6.5, 0.3, n_rows).round()
+    return pd.DataFrame(data)
+
+
+def bench_pivot(n=10000):
+    """Count trials per subject for 20 columns: a pivot table per column or one ``count_by``."""
+    trials = make_trials(n)
+    columns = [column for column in trials if column.startswith('factor_')]
+
+    start = time.perf_counter()
+    dfs = []
+    for column in columns:
+        dfs.append(trials.pivot_table(index=['subject_nr'], columns=[column], aggfunc='size'))
+    expected = pd.concat(dfs, axis=1)
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = pivot.count_by(trials, columns)
+    single = time.perf_counter() - start
+    pd.testing.assert_frame_equal(result, expected)
+
+    print('{} subjects, {} rows, {} columns'.format(n, len(trials), len(columns)))
+    for label, seconds in [('pivot loop', loop), ('count_by', single)]:
+        print('{:10} {:8.3f} s'.format(label, seconds))
+    return {'loop': loop, 'count_by': single}
+
+
+def bench_preprocess(n=400):
+    """Preprocess ``n`` logfiles in this process and in a pool of ``preprocess.PROCESSES`` processes."""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_logfiles(tmp, n, n_rows=400)
+        recode = {subject_nr: n + 1 - subject_nr for subject_nr in range(1, n + 1)}
+
+        start = time.perf_counter()
+        expected = preprocess.preprocess_subjects(paths, recode=recode, processes=1)
+        serial = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = preprocess.preprocess_subjects(paths, recode=recode)
+        pooled = time.perf_counter() - start
+        pd.testing.assert_frame_equal(result, expected)
+
+    print('{} logfiles, {} trials, {} processes'.format(n, len(result), preprocess.PROCESSES))
+    for label, seconds in [('serial', serial), ('processes', pooled)]:
+        print('{:10} {:8.3f} s'.format(label, seconds))
+    return {'serial': serial, 'processes': pooled}
+
+
+def bench_recode(n=2000):
+    """Renumber ``n`` subjects of 100 trials: a ``replace`` per subject, one with a dict, ``recode_values``."""
+    subject_nrs = make_trials(n, n_columns=0)['subject_nr'] + 1000
+
+    start = time.perf_counter()
+    mapping = recode.build_mapping(subject_nrs)
+    result = recode.recode_values(subject_nrs, mapping)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = subject_nrs.replace(mapping.to_dict())
+    replace_dict = time.perf_counter() - start
+    assert result.equals(expected)
+
+    # the tutorial's chained replace calls, one scan per subject
+    start = time.perf_counter()
+    chained = subject_nrs
+    for old, new in mapping.items():
+        chained = chained.replace(old, new)
+    replace_chain = time.perf_counter() - start
+    assert result.equals(chained)
+
+    print('{} subjects, {} rows'.format(n, len(subject_nrs)))
+    for label, seconds in [('replace per subject', replace_chain), ('replace dict', replace_dict),
+                           ('recode_values', single)]:
+        print('{:20} {:8.3f} s'.format(label, seconds))
+    return {'chained': replace_chain, 'dict': replace_dict, 'recode': single}
+
+
+def make_wide(n_rows, n_columns=200, seed=0):
+    """Return a wide table like the tutorial's ``df_messy``: name, age and ``t<i>_min``/``t<i>_max`` columns."""
+    rng = np.random.default_rng(seed)
+    columns = ['t{}_{}'.format(time, measure) for time in range(1, n_columns // 2 + 1)
+               for measure in ('min', 'max')]
+    frame = pd.DataFrame(rng.integers(0, 30, (n_rows, len(columns))), columns=columns)
+    frame.insert(0, 'name', ['subject_{}'.format(i) for i in range(n_rows)])
+    frame.insert(1, 'age', rng.integers(18, 30, n_rows))
+    return frame
+
+
+def bench_reshape(n=20000):
+    """Tidy a wide table of ``n`` rows and 200 columns: melt, split and pivot_table, or ``wide_to_long``."""
+    wide = make_wide(n)
+
+    start = time.perf_counter()
+    df_messy = pd.melt(wide, id_vars=['name', 'age'], var_name='time_minmax', value_name='score')
+    df_messy[['time', 'minmax']] = df_messy.time_minmax.str.split('_', expand=True)
+    del df_messy['time_minmax']
+    df_messy = df_messy.pivot_table(index=['name', 'age', 'time'], columns='minmax', values='score')
+    df_messy.reset_index(drop=False, inplace=True)
+    tutorial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = reshape.wide_to_long(wide, ['name', 'age'], sort=True)
+    single = time.perf_counter() - start
+    # the same values; the times are categorical and the scores keep their
+    # type, where pivot_table makes text and means
+    pd.testing.assert_frame_equal(result, df_messy[result.columns], check_dtype=False,
+                                  check_categorical=False, check_names=False)
+    del df_messy
+
+    start = time.perf_counter()
+    reshape.wide_to_long(wide, ['name', 'age'])
+    unsorted = time.perf_counter() - start
+
+    print('{} rows x {} columns -> {} rows'.format(n, wide.shape[1], len(result)))
+    for label, seconds in [('melt/split/pivot', tutorial), ('wide_to_long sorted', single),
+                           ('wide_to_long', unsorted)]:
+        print('{:20} {:8.3f} s'.format(label, seconds))
+    return {'tutorial': tutorial, 'sorted': single, 'unsorted': unsorted}
+
+
+def _filter_per_group(frame, by, cutoffs, sd, mad):
+    """The reference for ``outliers.filter_trials``: the rules one after another, a loop per group."""
+    frame = frame[frame['response'].notna() & (frame['response'] != 'None')]
+    frame = frame[frame['correct'] == 1]
+    frame = frame[(frame['response_time'] >= cutoffs[0]) & (frame['response_time'] <= cutoffs[1])]
+    for rule in ['sd', 'mad']:
+        parts = []
+        for _, group in frame.groupby(by, sort=False):
+            times = group['response_time']
+            if rule == 'sd':
+                keep = ~((times - times.mean()).abs() > sd * times.std())
+            else:
+                median = times.median()
+                deviations = (times - median).abs()
+                keep = ~(deviations > mad * outliers.MAD_SCALE * deviations.median())
+            parts.append(group[keep])
+        frame = pd.concat(parts).sort_index()
+    return frame.reset_index(drop=True)
+
+
+def bench_outliers(n=5000):
+    """Exclude extreme trials of ``n`` subjects of 200 trials: a loop per subject and condition, or ``filter_trials``."""
+    trials = make_trials(n, n_trials=200, n_columns=1).rename(columns={'factor_0': 'congruency_type'})
+    rng = np.random.default_rng(1)
+    trials['correct'] = (rng.random(len(trials)) < 0.9).astype(int)
+    trials['response'] = np.where(rng.random(len(trials)) < 0.03, 'None', 'a')
+    options = dict(by=['subject_nr', 'congruency_type'], cutoffs=(100, 1000), sd=2.5, mad=3)
+
+    start = time.perf_counter()
+    expected = _filter_per_group(trials, **options)
+    loop = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result, report = outliers.filter_trials(trials, **options)
+    single = time.perf_counter() - start
+    pd.testing.assert_frame_equal(result, expected)
+
+    print('{} subjects, {} trials'.format(n, len(trials)))
+    print(report)
+    for label, seconds in [('loop per group', loop), ('filter_trials', single)]:
+        print('{:15} {:8.3f} s'.format(label, seconds))
+    return {'loop': loop, 'filter_trials': single}
+
+
+def bench_cube(n=20000):
+    """Draw the tutorial's session x task transition line plot for ``n`` subjects of 100 trials, from the trials and from a cube."""
+    trials = make_trials(n, n_columns=2).rename(
+        columns={'factor_0': 'session', 'factor_1': 'task_transition_type'})
+    dims = ['session', 'task_transition_type']
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    grouped = trials.groupby(dims).response_time.agg(['mean', 'sem']).unstack('task_transition_type')
+    fig, ax = plt.subplots()
+    for column in grouped['mean']:
+        ax.plot(range(len(grouped)), grouped['mean'][column])
+        ax.fill_between(range(len(grouped)), grouped['mean'][column] - 1.96 * grouped['sem'][column],
+                        grouped['mean'][column] + 1.96 * grouped['sem'][column], alpha=0.2)
+    raw = time.perf_counter() - start
+    plt.close(fig)
+
+    start = time.perf_counter()
+    summary = cube.build_cube(trials, ['subject_nr'] + dims)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fig, ax = plt.subplots()
+    summary.lineplot('session', hue='task_transition_type', ax=ax)
+    single = time.perf_counter() - start
+    plt.close(fig)
+    stats = summary.stats(dims)
+    assert np.allclose(stats['mean'].unstack('task_transition_type'), grouped['mean'])
+
+    print('{} subjects, {} trials, {} cells'.format(n, len(trials), len(summary.table)))
+    for label, seconds in [('from trials', raw), ('build cube', build), ('from cube', single)]:
+        print('{:12} {:8.3f} s'.format(label, seconds))
+    return {'raw': raw, 'build': build, 'cube': single}
+
+
+def bench_facets(n=50):
+    """Histograms per subject and task of ``n`` subjects of 400 trials: ``sns.displot`` or ``facet_histograms``."""
+    trials = make_trials(n, n_trials=400, n_columns=1).rename(columns={'factor_0': 'task_type'})
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    start = time.perf_counter()
+    grid = sns.displot(trials, x='response_time', col='task_type', row='subject_nr', binwidth=50,
+                       height=3, facet_kws=dict(margin_titles=True))
+    seaborn = time.perf_counter() - start
+    plt.close(grid.figure)
+
+    start = time.perf_counter()
+    histograms = facets.facet_histograms(trials)
+    binned = time.perf_counter() - start
+    for fig in histograms.pages():
+        plt.close(fig)
+    drawn = time.perf_counter() - start
+
+    start = time.perf_counter()
+    plt.close(histograms.plot())
+    page = time.perf_counter() - start
+
+    print('{} subjects, {} trials, {}'.format(n, len(trials), histograms))
+    for label, seconds in [('sns.displot', seaborn), ('binning', binned), ('all pages', drawn),
+                           ('one page', page)]:
+        print('{:12} {:8.3f} s'.format(label, seconds))
+    return {'seaborn': seaborn, 'binning': binned, 'pages': drawn, 'page': page}
+
+
+def bench_figures(n=20):
+    """Draw the default figures of ``n`` subjects in this process, in worker processes, and again (up to date)."""
+    trials = make_trials(n, n_trials=300, n_columns=2).rename(
+        columns={'factor_0': 'session', 'factor_1': 'task_transition_type'})
+    rng = np.random.default_rng(1)
+    trials['correct'] = (rng.random(len(trials)) < 0.9).astype(int)
+    trials['response'] = np.where(rng.random(len(trials)) < 0.03, 'None', 'a')
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'df_cleaned.csv')
+        trials.to_csv(src, index=False)
+        for label, out, processes in [('serial', 'serial', 1), ('processes', 'pooled', figures.PROCESSES),
+                                      ('up to date', 'pooled', figures.PROCESSES)]:
+            stats = figures.render_figures(src, os.path.join(tmp, out), processes=processes)
+            timings[label] = stats.seconds
+            print('{:10} {}'.format(label, stats))
+    return timings
+
+
+BENCHMARKS = {
+    'annotate': bench_annotate,
+    'cube': bench_cube,
+    'facets': bench_facets,
+    'figures': bench_figures,
+    'incremental': bench_incremental,
+    'outliers': bench_outliers,
+    'pivot': bench_pivot,
+    'preprocess': bench_preprocess,
+    'query': bench_query,
+    'recode': bench_recode,
+    'reshape': bench_reshape,
+    'versions': bench_versions,
+}
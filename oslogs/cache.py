@@ -0,0 +1,56 @@
+"""Helpers shared by the caches and manifests of this package.
+
+``stages.Pipeline``, ``incremental.merge_incremental``,
+``figures.render_figures`` and ``downloads.fetch`` all decide whether
+something needs doing again from what they wrote down the last time. The
+hashes of functions and values they use come from ``source_id`` and
+``value_id``; their small JSON files are read with ``read_json`` and
+written with ``write_json``, which never leaves half a file behind.
+"""
+import inspect
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+def source_id(func):
+    """Return bytes that identify the code of ``func``: its source, or its byte code."""
+    try:
+        return inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        return func.__code__.co_code
+
+
+def value_id(value):
+    """Return bytes that identify ``value``; the repr of large tables and arrays is cut short."""
+    if isinstance(value, (pd.Series, pd.DataFrame, pd.Index)):
+        return pd.util.hash_pandas_object(value).to_numpy().tobytes()
+    if isinstance(value, np.ndarray):
+        return value.tobytes()
+    return repr(value).encode()
+
+
+def read_json(path):
+    """Return the data in JSON file ``path``, or None if it is missing or unreadable."""
+    try:
+        with open(path) as fhand:
+            return json.load(fhand)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path, data):
+    """Write ``data`` to JSON file ``path`` through a temporary file, so a crash never leaves half a file."""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'w') as fout:
+            # no indent: only the compact encoder is fast for thousands of entries
+            fout.write(json.dumps(data, separators=(',', ':')))
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
@@ -0,0 +1,197 @@
+"""The datawrangling pipeline in blocks of rows, for data that does not fit in memory.
+
+Every step of ``content/10_dataframes/datawrangling.ipynb`` works on the
+whole concatenated DataFrame: trim the columns, round ``response_time``,
+keep blocks before 11, recode ``subject_nr``, count trials per condition,
+compute the switch cost of the correct trials and ``describe()`` their
+response times. ``run_pipeline`` does the same steps on one block of rows at
+a time and keeps only partial results:
+
+- trial counts per subject (and per session) for every condition column,
+- the sum and count of the response times per subject and condition (the
+  cells of ``effects.cell_sums``), from which all means and effects follow,
+- a ``sketch.Summary`` (moments, quantile sketch and histogram) of the
+  response times.
+
+Memory use depends on the block size and the number of subjects, not on the
+number of trials. Counts, means and effects are the same as in the
+tutorial; of ``describe()`` only the quartiles are estimates. The cleaned
+trials (the tutorial's ``df_cleaned.csv``) can be written along the way.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from . import columnar, effects, merge, pivot, sketch, sources
+from .recode import recode_values
+
+# the columns the tutorial keeps (include_columns)
+INCLUDE_COLUMNS = ['subject_nr', 'block', 'session', 'congruency_transition_type', 'congruency_type',
+                   'correct', 'response_time', 'task_transition_type', 'task_type', 'response']
+# the columns the tutorial counts trials of (columns_to_check)
+COUNT_COLUMNS = ['task_type', 'congruency_type', 'task_transition_type', 'congruency_transition_type']
+MAX_BLOCK = 11
+CHUNK_ROWS = 1 << 16
+
+
+def iter_chunks(src, pattern='*', exclude=(), columns=None, chunk_rows=CHUNK_ROWS,
+                workers=merge.DEFAULT_WORKERS):
+    """Yield the rows in ``src`` as DataFrames of at most ``chunk_rows`` rows.
+
+    ``src`` is a Parquet or Feather file, a merged csv file, or what
+    ``merge.merge_logfiles`` accepts (a folder, an archive or a list of
+    logfiles). Only ``columns`` are read; a logfile without one of them gets
+    an empty column. Logfiles are read by ``workers`` threads.
+    """
+    file_format = None
+    usecols = None if columns is None else set(columns).__contains__
+    if isinstance(src, (str, os.PathLike)):
+        file_format = columnar.columnar_format(src)
+        if not file_format and os.path.isfile(src) and not sources.is_archive(src):
+            # a merged csv file: read block by block, never the whole file
+            with open(src, 'rb') as fhand:
+                try:
+                    reader = pd.read_csv(fhand, usecols=usecols, chunksize=chunk_rows)
+                except pd.errors.EmptyDataError:
+                    return
+                for chunk in reader:
+                    yield chunk if columns is None else chunk.reindex(columns=columns)
+            return
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(src).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+        return
+    if file_format == 'feather':
+        import pyarrow.ipc
+        with pyarrow.ipc.open_file(src) as reader:
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                yield (batch if columns is None else batch.select(columns)).to_pandas()
+        return
+
+    def read(item):
+        with sources.open_logfile(item) as fhand:
+            try:
+                reader = pd.read_csv(fhand, usecols=usecols, chunksize=chunk_rows)
+            except pd.errors.EmptyDataError:
+                return []
+            return [chunk if columns is None else chunk.reindex(columns=columns) for chunk in reader]
+
+    # logfiles are read by a pool of threads, and as they are much smaller
+    # than a block, collected until a block is full
+    pending = []
+    n_pending = 0
+    with merge.open_sources(src, None, pattern, exclude) as items:
+        for chunks in merge.ordered_map(read, items, workers):
+            for chunk in chunks:
+                pending.append(chunk)
+                n_pending += len(chunk)
+                if n_pending >= chunk_rows:
+                    yield pd.concat(pending, ignore_index=True)
+                    pending = []
+                    n_pending = 0
+    if pending:
+        yield pd.concat(pending, ignore_index=True)
+
+
+def to_numbers(values):
+    """Return ``values`` as floats, whether they were read as text, numbers or categories."""
+    return pd.to_numeric(values, errors='coerce').astype(float)
+
+
+def _add(total, part):
+    return part if total is None else total.add(part, fill_value=0)
+
+
+def _counts_table(tables):
+    """Return the partial count tables in ``tables`` as ``pivot.count_by`` would."""
+    return pivot.counts_table([table.fillna(0).sort_index(axis=1) for table in tables.values()
+                               if table is not None])
+
+
+@dataclass
+class PipelineResult:
+    """The tables of the datawrangling tutorial, from ``run_pipeline``."""
+    counts: pd.DataFrame = None
+    session_counts: pd.DataFrame = None
+    effects: pd.DataFrame = None
+    describe: pd.Series = None
+    rows_read: int = 0
+    rows_kept: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    cleaned: str = None
+    cells: pd.DataFrame = field(default=None, repr=False)
+    summary: sketch.Summary = field(default=None, repr=False)
+
+    def __str__(self):
+        lines = ['Read {} rows in {} blocks in {:.2f} s, kept {} trials{}'.format(
+            self.rows_read, self.chunks, self.seconds, self.rows_kept,
+            '' if self.cleaned is None else ' (written to {})'.format(self.cleaned))]
+        for title, table in [('Trials per session', self.session_counts),
+                             ('Trials per subject', self.counts),
+                             ('Effects (correct trials)', self.effects),
+                             ('Response time (correct trials)', self.describe)]:
+            if table is not None:
+                lines.extend(['', title, table.to_string()])
+        return '\n'.join(lines)
+
+
+def run_pipeline(src, pattern='*', exclude=(), recode=None, max_block=MAX_BLOCK,
+                 count_columns=COUNT_COLUMNS, contrasts=effects.CONTRASTS, cleaned=None,
+                 chunk_rows=CHUNK_ROWS, sketch_k=sketch.SKETCH_K, workers=merge.DEFAULT_WORKERS):
+    """Run the datawrangling tutorial on the trials in ``src``, one block of rows at a time.
+
+    ``src`` is anything ``iter_chunks`` reads. ``recode`` maps old to new
+    subject numbers, like the tutorial's ``replace(3, 1)``: a dict or a
+    mapping from ``recode.build_mapping``. With
+    ``cleaned`` the trimmed, filtered and recoded trials are written to that
+    csv file, like ``df_trim_blocks.to_csv``. Returns a ``PipelineResult``.
+    """
+    start = time.perf_counter()
+    result = PipelineResult(cleaned=cleaned)
+    columns = merge.union_columns([INCLUDE_COLUMNS, count_columns, effects.contrast_columns(contrasts)])
+    factors = effects.contrast_columns(contrasts)
+    tables = dict.fromkeys(count_columns)
+    session_table = None
+    cells = None
+    summary = sketch.Summary(quantiles=sketch.QuantileSketch(sketch_k))
+
+    for chunk in iter_chunks(src, pattern, exclude, columns, chunk_rows, workers):
+        result.chunks += 1
+        result.rows_read += len(chunk)
+        chunk['response_time'] = to_numbers(chunk['response_time']).round()
+        chunk = chunk[to_numbers(chunk['block']) < max_block]
+        if recode is not None:
+            chunk['subject_nr'] = recode_values(chunk['subject_nr'], recode, unknown='keep')
+        result.rows_kept += len(chunk)
+        if cleaned is not None:
+            # whole numbers, like the tutorial's astype(int), but missing values stay empty
+            first = result.chunks == 1
+            chunk[INCLUDE_COLUMNS].astype({'response_time': 'Int64'}).to_csv(
+                cleaned, mode='w' if first else 'a', header=first, index=False)
+        if not len(chunk):
+            continue
+
+        for column in count_columns:
+            tables[column] = _add(tables[column], pivot.count_by(chunk, [column]).fillna(0))
+        if 'task_transition_type' in chunk:
+            session_table = _add(session_table, pivot.count_by(
+                chunk, ['task_transition_type'], index='session').fillna(0))
+
+        correct = chunk[to_numbers(chunk['correct']) == 1]
+        cells = _add(cells, effects.cell_sums(correct, ['subject_nr'], factors))
+        summary.update(correct['response_time'])
+
+    result.counts = _counts_table(tables)
+    result.session_counts = _counts_table({'task_transition_type': session_table})
+    if cells is not None:
+        result.cells = cells
+        result.effects = effects.effects_from_cells(cells, contrasts)
+    result.summary = summary
+    result.describe = summary.describe(name='response_time')
+    result.seconds = time.perf_counter() - start
+    return result
@@ -0,0 +1,270 @@
+"""Command line interface, run as ``python -m oslogs <command>``."""
+import argparse
+import json
+
+from . import (benchmarks, chunked, collect, columnar, compact, downloads, figures, incremental, merge,
+               query, recode, sketch, sort, versions)
+
+
+def _column_list(value):
+    return [column.strip() for column in value.split(',') if column.strip()]
+
+
+def _size(value):
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def _merge(args):
+    if columnar.columnar_format(args.out):
+        if args.incremental:
+            raise ValueError('cannot merge incrementally into {}'.format(args.out))
+        stats = columnar.merge_columnar(args.src, args.out, pattern=args.pattern,
+                                        exclude=args.exclude, union=args.union,
+                                        columns=args.columns, drop_columns=args.drop_columns,
+                                        annotate=args.annotate, workers=args.workers,
+                                        verbose=args.verbose)
+    elif args.incremental:
+        stats = incremental.merge_incremental(args.src, args.out, pattern=args.pattern,
+                                              exclude=args.exclude, union=args.union,
+                                              missing=args.missing, columns=args.columns,
+                                              drop_columns=args.drop_columns,
+                                              annotate=args.annotate, workers=args.workers,
+                                              verbose=args.verbose)
+    elif args.union:
+        stats = merge.merge_union(args.src, args.out, pattern=args.pattern,
+                                  exclude=args.exclude, missing=args.missing,
+                                  columns=args.columns, drop_columns=args.drop_columns,
+                                  annotate=args.annotate, workers=args.workers,
+                                  verbose=args.verbose)
+    else:
+        stats = merge.merge_logfiles(args.src, args.out, pattern=args.pattern,
+                                     exclude=args.exclude, columns=args.columns,
+                                     drop_columns=args.drop_columns, annotate=args.annotate,
+                                     workers=args.workers, verbose=args.verbose)
+    print(stats)
+    for path in stats.skipped:
+        print('Skipped (different header): {}'.format(path))
+
+
+def _collect(args):
+    stats = collect.collect_files(args.root, args.dest, pattern=args.pattern, mode=args.mode,
+                                  participant=args.participant, name_template=args.template,
+                                  overwrite=args.overwrite, workers=args.workers)
+    print(stats)
+    for path, error in stats.errors:
+        print('Failed: {}: {}'.format(path, error))
+
+
+def _download(args):
+    stats = downloads.download(args.urls, cache_dir=args.cache, max_age=args.max_age,
+                              workers=args.workers)
+    print(stats)
+    for url, path in zip(args.urls, stats.paths):
+        print('{} -> {}'.format(url, path))
+
+
+def _sort(args):
+    stats = sort.sort_logfile(args.src, args.out, keys=args.keys, dedupe=not args.keep_duplicates,
+                              memory=args.memory, tmpdir=args.tmpdir)
+    print(stats)
+
+
+def _versions(args):
+    index = versions.scan_versions(args.root, pattern=args.pattern, workers=args.workers)
+    print(index)
+    if args.json:
+        with open(args.json, 'w') as fout:
+            json.dump(index.to_dict(), fout, indent=1)
+
+
+def _profile(args):
+    frame, report = compact.read_compact(args.src, pattern=args.pattern, exclude=args.exclude,
+                                         sample_rows=args.sample_rows, workers=args.workers)
+    print('{} rows, {} columns'.format(*frame.shape))
+    print(report)
+
+
+def _recode(value):
+    if value.endswith('.csv'):
+        return recode.load_mapping(value)
+    pairs = (pair.split('=') for pair in _column_list(value))
+    return {int(old): int(new) for old, new in pairs}
+
+
+def _wrangle(args):
+    result = chunked.run_pipeline(args.src, pattern=args.pattern, exclude=args.exclude,
+                                  recode=args.recode, max_block=args.max_block,
+                                  cleaned=args.cleaned, chunk_rows=args.chunk_rows,
+                                  workers=args.workers)
+    print(result)
+
+
+def _condition(value):
+    # only the comparisons; 'in' would also match inside column names
+    comparisons = [op for op in query.OPERATORS if 'in' not in op]
+    for op in sorted(comparisons, key=len, reverse=True):
+        column, found, operand = value.partition(op)
+        if found and column.strip():
+            try:
+                operand = float(operand) if '.' in operand else int(operand)
+            except ValueError:
+                operand = operand.strip()
+            return column.strip(), op, operand
+    raise argparse.ArgumentTypeError('expected a condition like correct==1, not {!r}'.format(value))
+
+
+def _describe(args):
+    summaries = sketch.summarize_logfiles(args.src, by=args.by, value=args.value, filters=args.where,
+                                          pattern=args.pattern, exclude=args.exclude,
+                                          workers=args.workers)
+    if args.by:
+        print(sketch.describe_groups(summaries, args.by).to_string())
+    else:
+        print(summaries.describe(name=args.value).to_string())
+
+
+def _figures(args):
+    stats = figures.render_figures(args.src, args.out, spec=args.spec or figures.DEFAULT_SPEC,
+                                   formats=args.format or ['png'], force=args.force,
+                                   processes=args.processes)
+    print(stats)
+
+
+def _bench(args):
+    kwargs = {} if args.n is None else {'n': args.n}
+    benchmarks.BENCHMARKS[args.name](**kwargs)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='oslogs', description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('merge', help='merge logfiles into one csv file')
+    p.add_argument('src', help='folder, zip or tar archive with the logfiles')
+    p.add_argument('out', help='merged csv file to write, or a typed .parquet or .feather file')
+    p.add_argument('--pattern', default='*', help='only merge files matching this glob (default: all files)')
+    p.add_argument('--exclude', action='append', default=[], metavar='NAME',
+                   help='file name to leave out, can be repeated')
+    p.add_argument('--union', action='store_true',
+                   help='merge all files into the union of their columns instead of skipping different headers')
+    p.add_argument('--missing', default='', help='value for columns a file does not have (with --union)')
+    p.add_argument('--columns', type=_column_list, metavar='COLUMNS',
+                   help='comma separated columns or glob patterns to keep, e.g. subject_nr,block,response_*')
+    p.add_argument('--drop-columns', type=_column_list, default=[], metavar='COLUMNS',
+                   help='comma separated columns or glob patterns to leave out, e.g. count_*')
+    p.add_argument('--annotate', action='store_true',
+                   help='add the source file, participant and row number as first columns')
+    p.add_argument('--incremental', action='store_true',
+                   help='only append files that are new since the last merge (keeps OUT.manifest.json)')
+    p.add_argument('--workers', type=int, default=merge.DEFAULT_WORKERS, help='number of reader threads')
+    p.add_argument('-v', '--verbose', action='store_true', help='print every file that is read')
+    p.set_defaults(func=_merge)
+
+    p = commands.add_parser('collect', help='copy the files in per-participant folders into one folder')
+    p.add_argument('root', help='folder with a subfolder per participant')
+    p.add_argument('dest', help='folder to collect the files in')
+    p.add_argument('--pattern', default='*', help='only collect files matching this glob (default: all files)')
+    p.add_argument('--mode', choices=collect.MODES, default='copy',
+                   help='copy the files, or hard-link or reflink them so no bytes are duplicated')
+    p.add_argument('--participant', default=collect.PARTICIPANT_PATTERN,
+                   help='regular expression for the participant folder names, the first group is the id')
+    p.add_argument('--template', default=collect.NAME_TEMPLATE,
+                   help='new file name, with {stem}, {suffix} and {pp} (default: %(default)s)')
+    p.add_argument('--overwrite', action='store_true', help='replace files that already exist in DEST')
+    p.add_argument('--workers', type=int, default=merge.DEFAULT_WORKERS, help='number of threads')
+    p.set_defaults(func=_collect)
+
+    p = commands.add_parser('download', help='download logfiles into the local cache')
+    p.add_argument('urls', nargs='+', metavar='URL')
+    p.add_argument('--cache', default=downloads.CACHE_DIR, help='cache folder (default: %(default)s)')
+    p.add_argument('--max-age', type=float, default=downloads.MAX_AGE,
+                   help='seconds before a cached file is checked with the server again (default: %(default)s)')
+    p.add_argument('--workers', type=int, default=merge.DEFAULT_WORKERS, help='number of download threads')
+    p.set_defaults(func=_download)
+
+    p = commands.add_parser('sort', help='sort a merged csv file by participant and trial, dropping duplicates')
+    p.add_argument('src', help='merged csv file')
+    p.add_argument('out', help='sorted csv file to write')
+    p.add_argument('--keys', type=_column_list, default=sort.SORT_KEYS, metavar='COLUMNS',
+                   help='comma separated columns to sort by (default: {})'.format(','.join(sort.SORT_KEYS)))
+    p.add_argument('--keep-duplicates', action='store_true', help='keep rows that are exact copies')
+    p.add_argument('--memory', type=_size, default=sort.MEMORY,
+                   help='memory to use for sorting, e.g. 512M or 2G (default: 256M)')
+    p.add_argument('--tmpdir', help='folder for the temporary files (default: the system temp folder)')
+    p.set_defaults(func=_sort)
+
+    p = commands.add_parser('versions', help='group logfiles by experiment version (their header)')
+    p.add_argument('root', help='folder (searched recursively), zip or tar archive with the logfiles')
+    p.add_argument('--pattern', default='*.csv', help='only scan files matching this glob (default: %(default)s)')
+    p.add_argument('--json', metavar='FILE', help='also save the index, with the files of every version, as JSON')
+    p.add_argument('--workers', type=int, default=merge.DEFAULT_WORKERS, help='number of reader threads')
+    p.set_defaults(func=_versions)
+
+    p = commands.add_parser('profile', help='show how much memory compact column types save')
+    p.add_argument('src', help='folder, zip or tar archive with the logfiles')
+    p.add_argument('--pattern', default='*', help='only read files matching this glob (default: all files)')
+    p.add_argument('--exclude', action='append', default=[], metavar='NAME',
+                   help='file name to leave out, can be repeated')
+    p.add_argument('--sample-rows', type=int, default=compact.SAMPLE_ROWS,
+                   help='rows to choose the column types from (default: %(default)s)')
+    p.add_argument('--workers', type=int, default=merge.DEFAULT_WORKERS, help='number of reader threads')
+    p.set_defaults(func=_profile)
+
+    p = commands.add_parser('wrangle', help='run the datawrangling tutorial in blocks of rows, in bounded memory')
+    p.add_argument('src', help='merged csv, Parquet or Feather file, or folder, zip or tar archive of logfiles')
+    p.add_argument('--pattern', default='*', help='only read files matching this glob (default: all files)')
+    p.add_argument('--exclude', action='append', default=[], metavar='NAME',
+                   help='file name to leave out, can be repeated')
+    p.add_argument('--recode', type=_recode, metavar='OLD=NEW,...',
+                   help='new subject numbers, e.g. 3=1,4=2, or a mapping csv file from recode.save_mapping')
+    p.add_argument('--max-block', type=int, default=chunked.MAX_BLOCK,
+                   help='keep the blocks before this one (default: %(default)s)')
+    p.add_argument('--cleaned', metavar='FILE', help='also write the cleaned trials to this csv file')
+    p.add_argument('--chunk-rows', type=int, default=chunked.CHUNK_ROWS,
+                   help='rows per block (default: %(default)s)')
+    p.add_argument('--workers', type=int, default=merge.DEFAULT_WORKERS, help='number of reader threads')
+    p.set_defaults(func=_wrangle)
+
+    p = commands.add_parser('describe', help='describe() a column per group without loading all trials')
+    p.add_argument('src', help='Parquet or Feather file, or folder, zip or tar archive of logfiles')
+    p.add_argument('--value', default='response_time', help='column to describe (default: %(default)s)')
+    p.add_argument('--by', type=_column_list, default=[], metavar='COLUMNS',
+                   help='comma separated columns to group by, e.g. subject_nr,session')
+    p.add_argument('--where', type=_condition, action='append', default=[], metavar='CONDITION',
+                   help='only trials where this holds, e.g. correct==1, can be repeated')
+    p.add_argument('--pattern', default='*', help='only read files matching this glob (default: all files)')
+    p.add_argument('--exclude', action='append', default=[], metavar='NAME',
+                   help='file name to leave out, can be repeated')
+    p.add_argument('--workers', type=int, default=merge.DEFAULT_WORKERS, help='number of reader threads')
+    p.set_defaults(func=_describe)
+
+    p = commands.add_parser('figures', help='draw the plotting tutorial figures per subject in worker processes')
+    p.add_argument('src', help='cleaned csv file, like df_cleaned.csv, or a Parquet or Feather file')
+    p.add_argument('out', help='folder to write the figures to')
+    p.add_argument('--spec', metavar='FILE',
+                   help='JSON file with the figures to draw (default: histograms and switch costs per subject)')
+    p.add_argument('--format', action='append', choices=figures.FORMATS,
+                   help='file format, can be repeated (default: png)')
+    p.add_argument('--force', action='store_true', help='draw all figures, also the ones that are up to date')
+    p.add_argument('--processes', type=int, default=figures.PROCESSES, help='number of worker processes')
+    p.set_defaults(func=_figures)
+
+    p = commands.add_parser('bench', help='run a benchmark on synthetic logfiles')
+    p.add_argument('name', choices=sorted(benchmarks.BENCHMARKS))
+    p.add_argument('-n', type=int, help='size of the benchmark (default depends on the benchmark)')
+    p.set_defaults(func=_bench)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        return args.func(args)
+    except (OSError, ImportError, ValueError, KeyError) as error:
+        parser.exit(1, '{}: error: {}\n'.format(parser.prog, error))
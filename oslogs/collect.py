@@ -0,0 +1,179 @@
+"""Collect the files of participants that are stored in a folder per participant.
+
+Exercise 3 of ``content/07_files/merging_files.ipynb`` copies
+``tutorial_data2/<pp>/file.txt`` to ``tutorial_data2/file_pp<pp>.txt`` one
+file at a time. ``collect_files`` does the same for large trees (for instance
+on a network share): it walks the tree with ``os.scandir``, infers the
+participant from the folder names and copies the files with a pool of
+threads. Instead of copying, files can be hard-linked or reflinked (a
+copy-on-write clone, on filesystems such as Btrfs and XFS) so that no bytes
+are duplicated. Where reflinks are not supported the files are copied
+instead, with a warning.
+"""
+import errno
+import fnmatch
+import os
+import shutil
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from .merge import DEFAULT_WORKERS
+from .provenance import PARTICIPANT_PATTERN, participant_from_parts
+
+NAME_TEMPLATE = '{stem}_pp{pp}{suffix}'
+MODES = ('copy', 'hardlink', 'reflink')
+
+# ioctl request that clones a file on Linux (FICLONE in linux/fs.h)
+_FICLONE = 0x40049409
+# what FICLONE fails with when the filesystem cannot clone, or not across
+# filesystems
+_NO_REFLINK = {errno.EOPNOTSUPP, errno.ENOTSUP, errno.EXDEV, errno.ENOTTY, errno.EINVAL}
+
+
+@dataclass
+class CollectStats:
+    """What ``collect_files`` did and how long every stage took."""
+    files: int = 0
+    bytes: int = 0
+    unassigned: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    copied: int = 0
+
+    def __str__(self):
+        stages = ', '.join('{} {:.3f} s'.format(stage, seconds)
+                           for stage, seconds in self.timings.items())
+        fallback = ' ({} copied, reflink is not supported)'.format(self.copied) if self.copied else ''
+        return 'Collected {} files ({:.1f} MB){}, {} without participant, {} errors. {}'.format(
+            self.files, self.bytes / 1e6, fallback, len(self.unassigned), len(self.errors), stages)
+
+
+def walk_files(root, pattern='*', skip=()):
+    """Yield (path, relative folder parts) of all files below ``root`` matching ``pattern``.
+
+    Folders whose real path is in ``skip`` are not entered.
+    """
+    stack = [(os.fspath(root), ())]
+    while stack:
+        folder, parts = stack.pop()
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if os.path.realpath(entry.path) not in skip:
+                        stack.append((entry.path, parts + (entry.name,)))
+                elif entry.is_file() and fnmatch.fnmatch(entry.name, pattern):
+                    yield entry.path, parts
+
+
+class ReflinkUnsupported(OSError):
+    """The filesystem cannot reflink the file."""
+
+
+def _reflink(src, dst):
+    try:
+        import fcntl
+    except ImportError:
+        raise ReflinkUnsupported(errno.EOPNOTSUPP, 'reflink needs Linux') from None
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError as error:
+            fdst.close()
+            os.remove(dst)
+            if error.errno in _NO_REFLINK:
+                raise ReflinkUnsupported(error.errno, os.strerror(error.errno), dst) from None
+            raise
+
+
+def _transfer(src, dst, mode, overwrite):
+    if os.path.lexists(dst):
+        if not overwrite:
+            raise FileExistsError('{} already exists'.format(dst))
+        os.remove(dst)
+    if mode == 'copy':
+        shutil.copy2(src, dst)
+    elif mode == 'hardlink':
+        os.link(src, dst)
+    else:
+        _reflink(src, dst)
+    return os.path.getsize(src)
+
+
+def collect_files(root, dest, pattern='*', mode='copy', participant=PARTICIPANT_PATTERN,
+                  name_template=NAME_TEMPLATE, overwrite=False, workers=DEFAULT_WORKERS):
+    """Copy (or link) every participant's files below ``root`` into folder ``dest``.
+
+    The participant id is taken from the folder names (see
+    ``provenance.participant_from_parts``); files directly in ``root`` or without a
+    participant folder are left alone. Every file gets a new name from
+    ``name_template``, which can use ``{stem}``, ``{suffix}`` and ``{pp}``.
+    ``mode`` is 'copy', 'hardlink' or 'reflink'; when the filesystem cannot
+    reflink, the files are copied (and counted in ``copied``) with one
+    warning. Existing files in ``dest`` are only replaced with
+    ``overwrite``. Returns a ``CollectStats``; files that could not be
+    collected are listed in its ``errors``.
+    """
+    if mode not in MODES:
+        raise ValueError('mode must be one of {}, not {!r}'.format(', '.join(MODES), mode))
+    stats = CollectStats()
+    os.makedirs(dest, exist_ok=True)
+
+    start = time.perf_counter()
+    found = list(walk_files(root, pattern, skip={os.path.realpath(dest)}))
+    stats.timings['scan'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    plan = {}
+    for path, parts in found:
+        if not parts:
+            continue
+        pp = participant_from_parts(parts, participant)
+        if pp is None:
+            stats.unassigned.append(path)
+            continue
+        stem, suffix = os.path.splitext(os.path.basename(path))
+        target = os.path.join(dest, name_template.format(stem=stem, suffix=suffix, pp=pp))
+        if target in plan:
+            raise ValueError('{} and {} would both be collected as {}'.format(
+                plan[target], path, target))
+        plan[target] = path
+    stats.timings['plan'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # set once a reflink failed because the filesystem cannot do it; the
+    # files are copied from then on
+    no_reflink = threading.Event()
+    lock = threading.Lock()
+
+    def fall_back(error):
+        with lock:
+            if not no_reflink.is_set():
+                no_reflink.set()
+                warnings.warn('cannot reflink in {} ({}), copying the files instead'.format(
+                    dest, error.strerror), RuntimeWarning)
+
+    def transfer(target):
+        copied = mode == 'reflink' and no_reflink.is_set()
+        try:
+            try:
+                nbytes = _transfer(plan[target], target, 'copy' if copied else mode, overwrite)
+            except ReflinkUnsupported as error:
+                fall_back(error)
+                nbytes, copied = _transfer(plan[target], target, 'copy', overwrite), True
+        except OSError as error:
+            return 0, (plan[target], error), False
+        return nbytes, None, copied
+
+    with ThreadPoolExecutor(workers) as pool:
+        for nbytes, error, copied in pool.map(transfer, plan):
+            if error is None:
+                stats.files += 1
+                stats.bytes += nbytes
+                stats.copied += copied
+            else:
+                stats.errors.append(error)
+    stats.timings[mode] = time.perf_counter() - start
+    return stats
@@ -0,0 +1,264 @@
+"""Merge logfiles straight into a typed columnar file (Parquet or Feather).
+
+``content/10_dataframes/datawrangling.ipynb`` reads the merged csv file
+with ``pd.read_csv``, which infers every column type from scratch, and then
+casts ``subject_nr`` and ``correct`` to ``category`` and rounds
+``response_time`` to whole numbers by hand. ``merge_columnar`` does that
+once while merging and stores the result with its types in a Parquet or
+Feather file, so loading it again with ``pd.read_parquet`` or
+``pd.read_feather`` (or ``load_columnar``) is fast and the text columns
+take little memory.
+
+Writing these formats needs pyarrow (``pip install pyarrow``).
+"""
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+from . import merge, provenance, sources
+
+# the types of the columns the tutorials work with; all other columns are
+# read as text, so a column has the same type in every logfile (pandas
+# would guess numbers for one file and text for the next). Integer columns
+# are rounded first, like the tutorial does with response_time.
+LOG_DTYPES = {
+    'subject_nr': 'category',
+    'session': 'category',
+    'block': 'Int64',
+    'congruency_transition_type': 'category',
+    'congruency_type': 'category',
+    'correct': 'category',
+    'response': 'category',
+    'response_time': 'Int64',
+    'task_transition_type': 'category',
+    'task_type': 'category',
+}
+
+# rows per row group of a merged Parquet file
+ROW_GROUP_ROWS = 1 << 16
+FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+
+
+def columnar_format(path):
+    """Return 'parquet' or 'feather' if the name of ``path`` asks for it, else None."""
+    return FORMATS.get(os.path.splitext(os.fspath(path))[1].lower())
+
+
+def apply_dtypes(frame, dtypes=LOG_DTYPES):
+    """Cast the columns of ``frame`` that are in ``dtypes`` to their type, in place."""
+    for column, dtype in dtypes.items():
+        if column not in frame or frame[column].dtype == dtype:
+            continue
+        values = frame[column]
+        try:
+            if dtype != 'category' and pd.api.types.is_integer_dtype(dtype):
+                values = pd.to_numeric(values).round()
+            frame[column] = values.astype(dtype)
+        except (TypeError, ValueError) as error:
+            raise ValueError('column {} cannot be {}: {}'.format(column, dtype, error)) from None
+    return frame
+
+
+def load_columnar(path, columns=None, dtypes=LOG_DTYPES):
+    """Load a file written by ``merge_columnar``, optionally just ``columns``.
+
+    Parquet stores categories of numbers (like ``subject_nr``) as plain
+    numbers, so the types in ``dtypes`` are applied again after loading.
+    """
+    if columnar_format(path) == 'parquet':
+        frame = pd.read_parquet(path, columns=columns)
+        # the row groups of a Parquet file have categories of their own,
+        # which come back in order of appearance
+        for column in frame.columns:
+            if isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = _sorted_categories(frame[column])
+    else:
+        frame = pd.read_feather(path, columns=columns)
+    return apply_dtypes(frame, dtypes)
+
+
+def _sorted_categories(values):
+    try:
+        return values.cat.reorder_categories(values.cat.categories.sort_values())
+    except TypeError:
+        return values
+
+
+def _read_frame(item, refheader, columns, dtypes, annotate):
+    """Read one logfile into a typed DataFrame, or None if its header is not ``refheader``.
+
+    With ``refheader`` None every file is read and reindexed to ``columns``.
+    Returns the DataFrame and the number of bytes read.
+    """
+    with sources.open_logfile(item) as fhand:
+        header, rest = merge.split_header(merge.normalized_chunks(fhand))
+        data = header + b''.join(rest)
+    if refheader is not None and header != refheader:
+        return None, len(data)
+    file_columns = merge.parse_header(header)
+    usecols = None if columns is None else [column for column in columns if column in file_columns]
+    text = dict.fromkeys((column for column in file_columns if column not in dtypes), object)
+    frame = pd.read_csv(io.BytesIO(data), usecols=usecols, dtype=text) if file_columns else pd.DataFrame()
+    if columns is not None:
+        frame = frame.reindex(columns=columns)
+        for column in columns:
+            if column not in dtypes and column not in text:
+                # a column this file does not have
+                frame[column] = frame[column].astype('str')
+    if annotate:
+        name, participant = merge.source_values(item)
+        values = [name, participant, range(len(frame))]
+        # one concat: inserting into a frame of hundreds of columns is slow
+        front = pd.DataFrame(dict(zip(provenance.PROVENANCE_COLUMNS, values)), index=frame.index)
+        frame = pd.concat([front, frame], axis=1)
+        dtypes = dict(dtypes, **dict.fromkeys(provenance.PROVENANCE_COLUMNS[:2], 'category'))
+    try:
+        return apply_dtypes(frame, dtypes), len(data)
+    except ValueError as error:
+        raise ValueError('{}: {}'.format(item, error)) from None
+
+
+def combine(frames):
+    """Concatenate ``frames``, keeping the category columns categorical.
+
+    ``pd.concat`` turns categories into plain objects unless every frame has
+    the same categories, so the categories are unified first.
+    """
+    if not frames:
+        return pd.DataFrame()
+    for column in frames[0].columns:
+        if not isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            continue
+        parts = [frame[column].cat.categories for frame in frames
+                 if len(frame[column].cat.categories)]
+        categories = parts[0].append(parts[1:]).unique() if parts else pd.Index([])
+        try:
+            categories = categories.sort_values()
+        except TypeError:
+            pass
+        for frame in frames:
+            frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _unknown_values(schema):
+    """Return the category columns of ``schema`` whose values could not be typed (all missing)."""
+    import pyarrow as pa
+    return [field.name for field in schema if pa.types.is_dictionary(field.type)
+            and (pa.types.is_null(field.type.value_type) or pa.types.is_floating(field.type.value_type))]
+
+
+def _write_parquet(frames, out, row_group_rows=ROW_GROUP_ROWS):
+    """Write ``frames`` to Parquet file ``out`` as they come and return the columns.
+
+    Frames are collected into row groups of about ``row_group_rows`` rows.
+    The schema is that of the first row group in which every category
+    column has a value (row groups before it are held back); category
+    columns are stored as dictionaries, whose values may differ between row
+    groups.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    schema = None
+    held = []
+    pending = []
+    n_pending = 0
+
+    def flush(last=False):
+        nonlocal writer, schema
+        table = pa.Table.from_pandas(combine(pending), preserve_index=False)
+        held.append(table)
+        if schema is None:
+            if _unknown_values(table.schema) and not last:
+                return
+            schema = pa.schema([
+                pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+                if pa.types.is_dictionary(field.type) else field
+                for field in table.schema], metadata=table.schema.metadata)
+            writer = pq.ParquetWriter(out, schema)
+        try:
+            for table in held:
+                writer.write_table(table.cast(schema))
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as error:
+            raise ValueError('cannot store a column in one type: {}'.format(error)) from None
+        held.clear()
+
+    try:
+        for frame in frames:
+            pending.append(frame)
+            n_pending += len(frame)
+            if n_pending >= row_group_rows:
+                flush()
+                pending, n_pending = [], 0
+        if pending or held:
+            flush(last=True)
+        if writer is None:
+            pd.DataFrame().to_parquet(out, index=False)
+            return []
+    finally:
+        if writer is not None:
+            writer.close()
+    return list(schema.names)
+
+
+def merge_columnar(src, out, pattern='*', exclude=(), union=False, columns=None,
+                   drop_columns=(), annotate=False, dtypes=LOG_DTYPES, file_format=None,
+                   workers=merge.DEFAULT_WORKERS, verbose=False):
+    """Merge the logfiles in ``src`` into the Parquet or Feather file ``out``.
+
+    ``file_format`` is 'parquet' or 'feather'; by default it follows the
+    suffix of ``out`` (see ``FORMATS``). Which files and columns are merged
+    works as in ``merge.merge_logfiles`` or, with ``union=True``, as in
+    ``merge.merge_union``; columns a file does not have are left empty. The
+    columns in ``dtypes`` get that type (see ``LOG_DTYPES``). Returns a
+    ``MergeStats``.
+    """
+    file_format = file_format or columnar_format(out)
+    if file_format not in ('parquet', 'feather'):
+        raise ValueError('cannot tell the format of {}: use a name ending in {}'.format(
+            out, ', '.join(FORMATS)))
+    start = time.perf_counter()
+    stats = merge.MergeStats()
+    with merge.open_sources(src, out, pattern, exclude) as items:
+        if union:
+            refheader = None
+            headers = merge.ordered_map(merge.read_header, items, workers)
+            schema = merge.union_columns(merge.parse_header(header) for header in headers)
+        else:
+            first = merge.first_item(items)
+            refheader = b'' if first is None else merge.read_header(first)
+            schema = merge.parse_header(refheader)
+        projected = merge.projection(schema, columns, drop_columns) if schema else None
+        target = schema if union and projected is None else projected
+
+        def read(item):
+            return item, _read_frame(item, refheader, target, dtypes, annotate)
+
+        def merged_frames():
+            for item, (frame, nbytes) in merge.ordered_map(read, items, workers):
+                if verbose:
+                    print('Reading {}'.format(item), file=sys.stderr)
+                stats.files_read += 1
+                stats.bytes_read += nbytes
+                if frame is None:
+                    stats.skipped.append(str(item))
+                else:
+                    stats.files_merged += 1
+                    yield frame
+
+        if file_format == 'parquet':
+            # written as the files are read, in row groups of ROW_GROUP_ROWS rows
+            stats.columns = _write_parquet(merged_frames(), out)
+        else:
+            # all record batches of a Feather file share their categories
+            merged = combine(list(merged_frames()))
+            merged.to_feather(out)
+            stats.columns = list(merged.columns)
+    stats.bytes_written = os.path.getsize(out)
+    stats.seconds = time.perf_counter() - start
+    return stats
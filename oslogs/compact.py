@@ -0,0 +1,162 @@
+"""Load logfiles with compact column types, chosen from a sample of rows.
+
+``content/10_dataframes/datawrangling.ipynb`` casts ``subject_nr`` and
+``correct`` to ``category`` by hand and leaves every other column as text
+or 64-bit numbers. Most of the 347 columns of an OpenSesame logfile are
+settings that never change (``canvas_backend``, ``fullscreen``, ...) and
+most text columns only hold a handful of values. ``read_compact`` profiles a
+sample of rows and then loads the logfiles with:
+
+- text columns with few distinct values as categories,
+- integer columns downcast to the smallest integer type,
+- constant columns dropped, their value kept once in ``frame.attrs['constants']``.
+
+Logfiles are read and compacted one at a time by a pool of threads, so the
+full table never exists with the default types. The ``MemoryReport`` shows
+what that saved per column.
+"""
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from . import columnar, merge, sources
+
+SAMPLE_ROWS = 1000
+# a text column becomes a category if the sample has at most this many
+# distinct values, and at most this fraction of the rows
+MAX_CATEGORIES = 1000
+CATEGORY_RATIO = 0.5
+
+
+@dataclass
+class DtypePlan:
+    """The column types ``profile_dtypes`` chose for a sample."""
+    categories: list = field(default_factory=list)
+    integers: list = field(default_factory=list)
+    constants: list = field(default_factory=list)
+
+
+@dataclass
+class MemoryReport:
+    """Memory per column with the default types (before) and compact types (after)."""
+    columns: pd.DataFrame = None
+    constants: dict = field(default_factory=dict)
+
+    @property
+    def bytes_before(self):
+        return int(self.columns['before'].sum())
+
+    @property
+    def bytes_after(self):
+        return int(self.columns['after'].sum())
+
+    def __str__(self):
+        lines = ['{:.1f} MB -> {:.1f} MB ({:.0f}% saved), {} constant columns dropped'.format(
+            self.bytes_before / 1e6, self.bytes_after / 1e6,
+            100 * (1 - self.bytes_after / self.bytes_before) if self.bytes_before else 0,
+            len(self.constants))]
+        top = self.columns.sort_values('saved', ascending=False).head(10)
+        for column, row in top.iterrows():
+            lines.append('  {:40} {:>10} -> {:10} {:10.1f} kB saved'.format(
+                column, str(row['dtype_before']), str(row['dtype_after']), row['saved'] / 1e3))
+        return '\n'.join(lines)
+
+
+def profile_dtypes(sample, max_categories=MAX_CATEGORIES, category_ratio=CATEGORY_RATIO):
+    """Return a ``DtypePlan`` for the columns of DataFrame ``sample``."""
+    plan = DtypePlan()
+    for column in sample:
+        values = sample[column]
+        n_unique = values.nunique(dropna=False)
+        if n_unique <= 1:
+            plan.constants.append(column)
+        elif pd.api.types.is_integer_dtype(values):
+            plan.integers.append(column)
+        elif (not pd.api.types.is_numeric_dtype(values) and n_unique <= max_categories
+              and n_unique <= category_ratio * len(values)):
+            plan.categories.append(column)
+    return plan
+
+
+def _apply_plan(frame, plan):
+    """Cast the columns of ``frame`` as ``plan`` says, in place.
+
+    Constant columns are kept as categories here; whether they are constant
+    in all logfiles is only known at the end.
+    """
+    for column in plan.categories + plan.constants:
+        if column in frame:
+            frame[column] = frame[column].astype('category')
+    for column in plan.integers:
+        if column in frame and pd.api.types.is_integer_dtype(frame[column]):
+            frame[column] = pd.to_numeric(frame[column], downcast='integer')
+    return frame
+
+
+def _read_sample(items, n_rows):
+    """Read the first ``n_rows`` rows of the logfiles ``items``."""
+    frames = []
+    for item in items:
+        with sources.open_logfile(item) as fhand:
+            frames.append(pd.read_csv(fhand, nrows=n_rows))
+        n_rows -= len(frames[-1])
+        if n_rows <= 0:
+            break
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def read_compact(src, pattern='*', exclude=(), sample_rows=SAMPLE_ROWS,
+                 max_categories=MAX_CATEGORIES, category_ratio=CATEGORY_RATIO,
+                 drop_constants=True, workers=merge.DEFAULT_WORKERS):
+    """Load the logfiles in ``src`` into one DataFrame with compact column types.
+
+    ``src`` is what ``merge.merge_logfiles`` accepts. The types are chosen
+    from the first ``sample_rows`` rows (see ``profile_dtypes``) and checked
+    against all rows: an integer column that does not fit is kept as it is,
+    and a column is only dropped as constant if it has one value in every
+    logfile. Returns the DataFrame and a ``MemoryReport``.
+    """
+    with merge.open_sources(src, None, pattern, exclude) as items:
+        items = list(items)
+        plan = profile_dtypes(_read_sample(items, sample_rows), max_categories, category_ratio)
+
+        def read(item):
+            with sources.open_logfile(item) as fhand:
+                frame = pd.read_csv(fhand)
+            before = frame.memory_usage(index=False, deep=True)
+            dtypes = frame.dtypes
+            return _apply_plan(frame, plan), before, dtypes
+
+        frames = []
+        before = pd.Series(dtype='int64')
+        dtypes_before = {}
+        for frame, file_before, file_dtypes in merge.ordered_map(read, items, workers):
+            frames.append(frame)
+            before = before.add(file_before, fill_value=0)
+            for column, dtype in file_dtypes.items():
+                dtypes_before.setdefault(column, dtype)
+
+    merged = columnar.combine(frames)
+    constants = {}
+    if drop_constants:
+        for column in plan.constants:
+            if column in merged and merged[column].nunique(dropna=False) == 1:
+                constants[column] = merged[column].iloc[0] if len(merged) else None
+        merged = merged.drop(columns=list(constants))
+        merged.attrs['constants'] = constants
+    # downcast again: pd.concat widens to the widest type of all logfiles
+    for column in plan.integers:
+        if column in merged and pd.api.types.is_integer_dtype(merged[column]):
+            merged[column] = pd.to_numeric(merged[column], downcast='integer')
+
+    after = merged.memory_usage(index=False, deep=True)
+    columns = pd.DataFrame({
+        'dtype_before': pd.Series(dtypes_before),
+        'dtype_after': merged.dtypes,
+        'before': before,
+        'after': after,
+    }, index=list(dtypes_before))
+    columns['dtype_after'] = columns['dtype_after'].astype(object).fillna('constant')
+    columns['after'] = columns['after'].fillna(0).astype('int64')
+    columns['saved'] = columns['before'] - columns['after']
+    return merged, MemoryReport(columns, constants)
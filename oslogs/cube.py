@@ -0,0 +1,257 @@
+"""Plot means and confidence intervals from a small table of sums, not from every trial.
+
+Every figure in ``content/11_plotting/plotting_behavioral_data.ipynb``
+starts again from the trials in ``df_cleaned.csv``: ``sns.lineplot``
+groups them and bootstraps a confidence interval from 1000 resamples of
+every group, and the pyplot versions make a ``pivot_table`` or a
+``groupby(['session', 'task_transition_type']).response_time.mean()``
+first. A ``SummaryCube`` holds the count, sum and sum of squares of the
+response times for every combination of a few columns (subject, session,
+condition, ...); it is built in one pass over the trials (``build_cube``,
+or ``cube_logfiles`` for logfiles that do not fit in memory), and is small
+enough to keep, e.g. as a stage of a ``stages.Pipeline``.
+
+Means, standard deviations and confidence intervals over any of its
+columns come from the cube by adding up cells, so drawing a figure takes
+milliseconds however many trials there are::
+
+    cube = build_cube(df, ['subject_nr', 'session', 'task_transition_type'])
+    cube.lineplot('session', hue='task_transition_type')
+    cube.pivot('subject_nr', 'task_transition_type').plot(kind='line')
+
+The confidence intervals are the usual t intervals of the mean of the
+trials (mean +- t * sd / sqrt(n)), which is what seaborn's bootstrap
+estimates. Without scipy the t quantile is replaced by the normal one,
+which makes intervals of cells with only a few trials a bit too narrow.
+"""
+import os
+from dataclasses import dataclass, field
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from . import columnar, merge, query
+from .chunked import iter_chunks, to_numbers
+
+CONFIDENCE = 0.95
+STATS = ('count', 'sum', 'sumsq')
+# up to this many possible cells the cells are counted with np.bincount
+# directly, beyond it the cells that occur are numbered first
+MAX_DENSE_CELLS = 1 << 22
+
+
+def _t_quantile(confidence, dof):
+    """Return the two-sided ``confidence`` quantile of Student's t for ``dof`` (an array)."""
+    try:
+        from scipy import stats
+    except ImportError:
+        return np.full(np.shape(dof), NormalDist().inv_cdf(0.5 + confidence / 2))
+    return stats.t.ppf(0.5 + confidence / 2, dof)
+
+
+@dataclass
+class SummaryCube:
+    """Count, sum and sum of squares (``sumsq``) of ``value`` per combination of the ``dims``.
+
+    ``table`` has a row per combination that occurs, indexed by the dims in
+    sorted order. Reductions to fewer dims are kept, so the next figure over
+    the same dims does not add up the cells again.
+    """
+    table: pd.DataFrame
+    value: str = 'response_time'
+    _reduced: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def __str__(self):
+        return '{} cells of {} over {}, {} trials'.format(
+            len(self.table), self.value, ', '.join(self.dims), int(self.table['count'].sum()))
+
+    @property
+    def dims(self):
+        return list(self.table.index.names)
+
+    def merge(self, other):
+        """Return a cube of the trials of this cube and ``other`` (with the same dims)."""
+        if other.dims != self.dims:
+            raise ValueError('cannot merge cubes over {} and {}'.format(self.dims, other.dims))
+        table = pd.concat([self.table, other.table]).groupby(level=self.dims, sort=True).sum()
+        return SummaryCube(table, self.value)
+
+    def select(self, **levels):
+        """Return the cube of the trials where every dim in ``levels`` has the given value.
+
+        E.g. ``cube.select(correct=1)`` for the correct trials; the selected
+        dims are dropped.
+        """
+        if set(levels) >= set(self.dims):
+            raise ValueError('select would leave no dims, use reduce([]) for the totals')
+        table = self.table
+        for dim, level in levels.items():
+            table = table.xs(level, level=dim, drop_level=True)
+        if isinstance(table.index, pd.MultiIndex):
+            # levels of the other dims that no longer occur would be plotted as gaps
+            table = table.set_axis(table.index.remove_unused_levels())
+        return SummaryCube(table, self.value)
+
+    def reduce(self, dims):
+        """Return the cube over ``dims`` only (the other dims are added up)."""
+        dims = list(dims)
+        if not dims:
+            return self.table[list(STATS)].sum()
+        missing = set(dims) - set(self.dims)
+        if missing:
+            raise KeyError('the cube has no dims {}'.format(', '.join(sorted(missing))))
+        if tuple(dims) in self._reduced:
+            return self._reduced[tuple(dims)]
+        index = self.table.index
+        if not isinstance(index, pd.MultiIndex):
+            index = pd.MultiIndex.from_arrays([index])
+        positions = [index.names.index(dim) for dim in dims]
+        table = _add_cells([index.codes[i] for i in positions], [index.levels[i] for i in positions],
+                           dims, {column: self.table[column].to_numpy() for column in STATS})
+        self._reduced[tuple(dims)] = SummaryCube(table, self.value)
+        return self._reduced[tuple(dims)]
+
+    def stats(self, dims, confidence=CONFIDENCE):
+        """Return count, mean, sd, sem and the ``confidence`` interval of the mean per group of ``dims``."""
+        table = self.reduce(dims).table
+        count = table['count'].to_numpy(dtype=float)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = table['sum'].to_numpy() / count
+            # rounding can make the sum of squared deviations slightly negative
+            squares = np.maximum(table['sumsq'].to_numpy() - table['sum'].to_numpy() * mean, 0)
+            sd = np.sqrt(squares / (count - 1))
+            sem = sd / np.sqrt(count)
+        half = _t_quantile(confidence, np.maximum(count - 1, 1)) * sem
+        return pd.DataFrame({'count': table['count'].to_numpy(), 'mean': mean, 'sd': sd, 'sem': sem,
+                             'ci_low': mean - half, 'ci_high': mean + half}, index=table.index)
+
+    def pivot(self, index, columns=None, stat='mean'):
+        """Return ``stat`` (a column of ``stats``) like ``df.pivot_table(value, index, columns)``."""
+        dims = [index] if columns is None else [index, columns]
+        table = self.stats(dims)[stat]
+        return table if columns is None else table.unstack(columns)
+
+    def _lines(self, x, hue, confidence):
+        """Return the x values and a (hue value, stats per x value) pair per line."""
+        stats = self.stats([x] if hue is None else [hue, x], confidence)
+        levels = stats.index.levels[stats.index.names.index(x)]
+        if hue is None:
+            return levels, [(None, stats)]
+        return levels, [(level, stats.xs(level, level=hue).reindex(levels))
+                        for level in stats.index.unique(hue)]
+
+    def lineplot(self, x, hue=None, ax=None, confidence=CONFIDENCE, **kwargs):
+        """Draw the mean per ``x`` value, a line per ``hue`` value, with bands for the intervals.
+
+        Like ``sns.lineplot(data=df, x=x, y=value, hue=hue)``; with
+        ``confidence=None`` no bands are drawn.
+        """
+        import matplotlib.pyplot as plt
+        ax = plt.gca() if ax is None else ax
+        levels, lines = self._lines(x, hue, confidence or CONFIDENCE)
+        numeric = pd.api.types.is_numeric_dtype(levels)
+        # like seaborn, categories are placed at 0, 1, 2, ...
+        positions = levels.to_numpy() if numeric else np.arange(len(levels))
+        for level, stats in lines:
+            line, = ax.plot(positions, stats['mean'], label=level, **kwargs)
+            if confidence:
+                ax.fill_between(positions, stats['ci_low'], stats['ci_high'], color=line.get_color(),
+                                alpha=0.2, linewidth=0)
+        if not numeric:
+            ax.set_xticks(positions, levels)
+        ax.set_xlabel(x)
+        ax.set_ylabel(self.value)
+        if hue is not None:
+            ax.legend(title=hue)
+        return ax
+
+    def barplot(self, x, hue=None, ax=None, confidence=CONFIDENCE, **kwargs):
+        """Draw the mean per ``x`` value as bars, grouped by ``hue``, with error bars for the intervals."""
+        import matplotlib.pyplot as plt
+        ax = plt.gca() if ax is None else ax
+        levels, lines = self._lines(x, hue, confidence or CONFIDENCE)
+        width = 0.8 / len(lines)
+        for i, (level, stats) in enumerate(lines):
+            error = None
+            if confidence:
+                error = [stats['mean'] - stats['ci_low'], stats['ci_high'] - stats['mean']]
+            ax.bar(np.arange(len(levels)) + (i - (len(lines) - 1) / 2) * width, stats['mean'], width,
+                   yerr=error, label=level, **kwargs)
+        ax.set_xticks(np.arange(len(levels)), levels)
+        ax.set_xlabel(x)
+        ax.set_ylabel(self.value)
+        if hue is not None:
+            ax.legend(title=hue)
+        return ax
+
+
+def _add_cells(codes, levels, names, weights):
+    """Return a table with the sums of ``weights`` per combination of ``codes`` that occurs.
+
+    ``codes`` are the codes of every row in the ``levels`` of each dim and
+    ``weights`` maps the columns of the table to arrays of the rows (None
+    to count the rows).
+    """
+    shape = tuple(len(dim_levels) for dim_levels in levels)
+    flat = np.ravel_multi_index(codes, shape)
+    n_cells = int(np.prod(shape, dtype=float))
+    if n_cells <= max(MAX_DENSE_CELLS, len(flat)):
+        cells = np.flatnonzero(np.bincount(flat, minlength=n_cells))
+    else:
+        cells, flat = np.unique(flat, return_inverse=True)
+        n_cells = len(cells)
+    columns = {}
+    for column, values in weights.items():
+        sums = np.bincount(flat, values, minlength=n_cells)
+        columns[column] = sums[cells] if n_cells != len(cells) else sums
+    columns['count'] = columns['count'].astype(np.int64)
+    index = pd.MultiIndex(levels=levels, codes=np.unravel_index(cells, shape), names=names)
+    return pd.DataFrame(columns, index=index)
+
+
+def build_cube(frame, dims, value='response_time'):
+    """Return the ``SummaryCube`` of column ``value`` of ``frame`` over the ``dims`` columns.
+
+    Trials with a missing value or a missing dim are left out, as
+    ``groupby`` and seaborn do.
+    """
+    dims = list(dims)
+    if not dims:
+        raise ValueError('a cube needs at least one dim')
+    times = to_numbers(frame[value]).to_numpy()
+    keep = ~np.isnan(times)
+    codes, levels = [], []
+    for dim in dims:
+        dim_codes, uniques = pd.factorize(frame[dim], sort=True)
+        keep &= dim_codes >= 0
+        codes.append(dim_codes)
+        levels.append(uniques)
+    times = times[keep]
+    codes = [dim_codes[keep] for dim_codes in codes]
+    table = _add_cells(codes, levels, dims, {'count': None, 'sum': times, 'sumsq': times * times})
+    return SummaryCube(table, value)
+
+
+def cube_logfiles(src, dims, value='response_time', filters=(), pattern='*', exclude=(),
+                  workers=merge.DEFAULT_WORKERS):
+    """Return the ``SummaryCube`` of ``value`` over ``dims`` for the logfiles in ``src``.
+
+    Like ``sketch.summarize_logfiles``: ``filters`` are conditions as for
+    ``query.LogQuery.filter``, every logfile is read (only the needed
+    columns) by one of ``workers`` threads, and Parquet and Feather files
+    are read block by block.
+    """
+    dims = list(dims)
+    lazy = query.LogQuery(src, pattern, exclude, dims + [value], filters)
+    if isinstance(src, (str, os.PathLike)) and columnar.columnar_format(src):
+        parts = (build_cube(lazy.apply(chunk), dims, value)
+                 for chunk in iter_chunks(src, columns=lazy.needed_columns()))
+        tables = [part.table for part in parts]
+    else:
+        with merge.open_sources(src, None, pattern, exclude) as items:
+            tables = [part.table for part in merge.ordered_map(
+                lambda item: build_cube(lazy.read_logfile(item), dims, value), items, workers)]
+    if not tables:
+        return build_cube(pd.DataFrame(columns=dims + [value]), dims, value)
+    return SummaryCube(pd.concat(tables).groupby(level=dims, sort=True).sum(), value)
@@ -0,0 +1,169 @@
+"""Download logfiles once, concurrently, into a local cache.
+
+``content/10_dataframes/datawrangling.ipynb`` reads every subject straight
+from GitHub with ``pd.read_csv(url)``: one subject after the other, and all
+of them again on every run of the notebook. ``download`` fetches the URLs
+with a pool of threads into a cache folder and returns the local paths;
+``read_csvs`` is the drop-in for the ``pd.concat`` line of the notebook.
+
+The cache is content-addressed: every file is stored once under the SHA-256
+of its content (``objects/<hash>``), and a small JSON record per URL
+(``urls/<hash of the url>.json``) points to it, together with the ETag and
+Last-Modified headers of the response. A URL that was checked less than
+``max_age`` seconds ago is not requested at all; after that it is
+revalidated with a conditional request, which costs a round trip but no
+download if the file did not change. Without a network connection the cached
+copy is used, so repeated runs work offline.
+"""
+import hashlib
+import os
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from . import cache, merge
+
+CACHE_DIR = os.environ.get('OSLOGS_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'oslogs')
+MAX_AGE = 24 * 3600
+TIMEOUT = 30
+
+
+@dataclass
+class DownloadStats:
+    """The local ``paths`` of the URLs and how each was obtained."""
+    paths: list = field(default_factory=list)
+    downloaded: int = 0
+    revalidated: int = 0
+    cached: int = 0
+    offline: int = 0
+    bytes_downloaded: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        return ('{} files: {} downloaded ({:.1f} MB), {} unchanged, {} from the cache, '
+                '{} offline, in {:.2f} s'.format(
+                    len(self.paths), self.downloaded, self.bytes_downloaded / 1e6,
+                    self.revalidated, self.cached, self.offline, self.seconds))
+
+
+def _is_url(source):
+    return urllib.parse.urlsplit(str(source)).scheme in ('http', 'https', 'ftp', 'file')
+
+
+def _record_path(cache_dir, url):
+    return os.path.join(cache_dir, 'urls', hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+
+def _store(response, cache_dir):
+    """Stream ``response`` into the object store; return its path and size."""
+    objects = os.path.join(cache_dir, 'objects')
+    os.makedirs(objects, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=objects)
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            for chunk in iter(lambda: response.read(merge.CHUNK_SIZE), b''):
+                digest.update(chunk)
+                fout.write(chunk)
+                size += len(chunk)
+        path = os.path.join(objects, digest.hexdigest())
+        # a file with the same content may be stored already
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path, size
+
+
+def fetch(url, cache_dir=CACHE_DIR, max_age=MAX_AGE, timeout=TIMEOUT):
+    """Return (local path, how, bytes downloaded) for ``url``, using the cache.
+
+    ``how`` is 'downloaded', 'revalidated' (asked the server, unchanged),
+    'cached' (checked less than ``max_age`` seconds ago; None means never
+    ask again) or 'offline' (the server could not be reached).
+    """
+    record_path = _record_path(cache_dir, url)
+    record = cache.read_json(record_path)
+    cached = None
+    if record is not None:
+        cached = os.path.join(cache_dir, 'objects', record['sha256'])
+        if not os.path.exists(cached):
+            record = cached = None
+    if cached and (max_age is None or time.time() - record['checked'] < max_age):
+        return cached, 'cached', 0
+
+    request = urllib.request.Request(url)
+    if cached:
+        if record.get('etag'):
+            request.add_header('If-None-Match', record['etag'])
+        if record.get('last_modified'):
+            request.add_header('If-Modified-Since', record['last_modified'])
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            path, size = _store(response, cache_dir)
+            headers = response.headers
+    except urllib.error.HTTPError as error:
+        if error.code != 304 or not cached:
+            raise
+        record['checked'] = time.time()
+        cache.write_json(record_path, record)
+        return cached, 'revalidated', 0
+    except OSError:
+        if not cached:
+            raise
+        return cached, 'offline', 0
+    os.makedirs(os.path.dirname(record_path), exist_ok=True)
+    cache.write_json(record_path, {
+        'url': url,
+        'sha256': os.path.basename(path),
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'checked': time.time(),
+    })
+    return path, 'downloaded', size
+
+
+def download(sources, cache_dir=CACHE_DIR, max_age=MAX_AGE, timeout=TIMEOUT,
+             workers=merge.DEFAULT_WORKERS):
+    """Fetch the URLs in ``sources`` concurrently (see ``fetch``).
+
+    Local paths in ``sources`` are passed through as they are. Returns a
+    ``DownloadStats`` whose ``paths`` are in the order of ``sources``; a
+    URL that occurs more than once is fetched (and counted) once.
+    """
+    start = time.perf_counter()
+    stats = DownloadStats()
+    sources = list(sources)
+    unique = list(dict.fromkeys(sources))
+
+    def get(source):
+        if not _is_url(source):
+            return source, 'local', 0
+        return fetch(str(source), cache_dir, max_age, timeout)
+
+    paths = {}
+    for source, (path, how, size) in zip(unique, merge.ordered_map(get, unique, workers)):
+        paths[source] = path
+        if how != 'local':
+            setattr(stats, how, getattr(stats, how) + 1)
+        stats.bytes_downloaded += size
+    stats.paths = [paths[source] for source in sources]
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def read_csvs(sources, cache_dir=CACHE_DIR, max_age=MAX_AGE, workers=merge.DEFAULT_WORKERS,
+              **kwargs):
+    """Download ``sources`` and return them as one DataFrame, like the tutorial's ``pd.concat``.
+
+    Extra keyword arguments go to ``pd.read_csv``.
+    """
+    paths = download(sources, cache_dir, max_age, workers=workers).paths
+    return pd.concat((pd.read_csv(path, **kwargs) for path in paths), ignore_index=True)
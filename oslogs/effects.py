@@ -0,0 +1,84 @@
+"""Switch costs, congruency effects and their interaction per subject.
+
+``content/10_dataframes/datawrangling.ipynb`` computes the switch cost with a
+``pivot_table`` of the mean response time per task transition type and then
+subtracts the two columns; a congruency effect or a per-session effect would
+need another pivot table each. ``compute_effects`` makes a single groupby
+pass over the trials that sums the response times and counts the trials of
+every cell (subject x condition). All means, contrasts and interactions are
+then derived from that small table of cells, so the trials are read once no
+matter how many effects are asked for.
+"""
+import itertools
+
+import pandas as pd
+
+# name: (column, level, baseline); the effect is mean(level) - mean(baseline)
+CONTRASTS = {
+    'switch_cost': ('task_transition_type', 'task-switch', 'task-repetition'),
+    'congruency_effect': ('congruency_type', 'incongruent', 'congruent'),
+}
+
+
+def cell_sums(frame, by, factors, value='response_time'):
+    """Return the sum and count of ``value`` for every combination of ``by`` and ``factors``.
+
+    This is the only pass over the trials; rows where ``value`` or one of
+    the columns is missing are left out.
+    """
+    keys = list(by) + [factor for factor in factors if factor not in by]
+    return frame.groupby(keys, observed=True, sort=True)[value].agg(['sum', 'count'])
+
+
+def _means(cells, keys):
+    """Return the trial-weighted mean per combination of ``keys`` from ``cells``."""
+    totals = cells.groupby(level=keys, observed=True).sum()
+    return totals['sum'] / totals['count']
+
+
+def compute_effects(frame, contrasts=CONTRASTS, by=('subject_nr',), value='response_time',
+                    interactions=True):
+    """Return the mean ``value`` per level and the effect of every contrast, per ``by``.
+
+    ``contrasts`` maps an effect name to (column, level, baseline), see
+    ``CONTRASTS``. For every contrast the result has a column with the mean
+    of both levels (like the tutorial's ``switch_table``) and one with the
+    effect. With ``interactions`` every pair of contrasts also gets its
+    interaction: the first effect at the level of the second contrast minus
+    the first effect at its baseline. Use ``by=('subject_nr', 'session')``
+    for effects per session. Filter the trials first (e.g. correct trials
+    only), as in the tutorial.
+    """
+    cells = cell_sums(frame, by, contrast_columns(contrasts), value)
+    return effects_from_cells(cells, contrasts, by, interactions)
+
+
+def contrast_columns(contrasts=CONTRASTS):
+    """Return the columns the ``contrasts`` compare levels of."""
+    return list(dict.fromkeys(column for column, _, _ in contrasts.values()))
+
+
+def effects_from_cells(cells, contrasts=CONTRASTS, by=('subject_nr',), interactions=True):
+    """Return the table of ``compute_effects`` from the ``cells`` of ``cell_sums``.
+
+    Cells of separate parts of the trials can be added up first
+    (``a.add(b, fill_value=0)``), which is how ``chunked`` computes the
+    effects without having all trials in memory.
+    """
+    by = list(by)
+    result = pd.DataFrame(index=_means(cells, by).index)
+    for name, (column, level, baseline) in contrasts.items():
+        means = _means(cells, by + [column]).unstack(column)
+        result[level] = means[level]
+        result[baseline] = means[baseline]
+        result[name] = means[level] - means[baseline]
+
+    if interactions:
+        for first, second in itertools.combinations(contrasts, 2):
+            column, level, baseline = contrasts[first]
+            other, other_level, other_baseline = contrasts[second]
+            means = _means(cells, by + [column, other]).unstack([column, other])
+            at_level = means[(level, other_level)] - means[(baseline, other_level)]
+            at_baseline = means[(level, other_baseline)] - means[(baseline, other_baseline)]
+            result['{} x {}'.format(first, second)] = at_level - at_baseline
+    return result
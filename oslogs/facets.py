@@ -0,0 +1,134 @@
+"""A grid of response time histograms, one per subject and task, binned in one pass.
+
+``content/11_plotting/plotting_behavioral_data.ipynb`` draws::
+
+    sns.displot(df, x='response_time', col='task_type', row='subject_nr', binwidth=50)
+
+seaborn selects the trials of every facet from the whole frame and bins them
+separately, and draws every facet, so with a few hundred subjects it makes
+hundreds of axes in one very tall figure. ``facet_histograms`` numbers the
+facets (row value x column value) and the bins once and counts all
+(facet, bin) pairs with a single ``np.bincount``. The counts are a small
+array; ``FacetHistograms.plot`` draws one page of ``rows_per_page`` rows at
+a time into a figure, so only the rows that are looked at are drawn.
+"""
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .chunked import to_numbers
+
+BINWIDTH = 50
+ROWS_PER_PAGE = 10
+HEIGHT = 3
+
+
+@dataclass
+class FacetHistograms:
+    """Histogram counts per (row value, column value) facet, from ``facet_histograms``.
+
+    ``counts`` has shape (rows, columns, bins) and ``edges`` has the bins'
+    edges, which all facets share.
+    """
+    counts: np.ndarray
+    edges: np.ndarray
+    rows: pd.Index
+    cols: pd.Index
+    row: str = None
+    col: str = None
+    x: str = 'response_time'
+    rows_per_page: int = ROWS_PER_PAGE
+
+    def __str__(self):
+        return '{} x {} facets of {} bins, {} pages'.format(
+            len(self.rows), len(self.cols), len(self.edges) - 1, self.n_pages)
+
+    @property
+    def n_pages(self):
+        return max(math.ceil(len(self.rows) / self.rows_per_page), 1)
+
+    def facet(self, row=None, col=None):
+        """Return the counts of the facet with row value ``row`` and column value ``col``."""
+        i = 0 if self.row is None else self.rows.get_loc(row)
+        j = 0 if self.col is None else self.cols.get_loc(col)
+        return self.counts[i, j]
+
+    def plot(self, page=0, fig=None, height=HEIGHT, aspect=1, **kwargs):
+        """Draw the facets of the rows on ``page`` into ``fig`` (a new figure by default).
+
+        All facets share their axes, as in ``sns.displot``; column values
+        are the titles of the top row and row values are written on the
+        right. ``kwargs`` go to ``ax.stairs``.
+        """
+        import matplotlib.pyplot as plt
+        if not 0 <= page < self.n_pages:
+            raise IndexError('page {} of {}'.format(page, self.n_pages))
+        rows = range(page * self.rows_per_page, min((page + 1) * self.rows_per_page, len(self.rows)))
+        if fig is None:
+            fig = plt.figure(figsize=(height * aspect * len(self.cols), height * max(len(rows), 1)))
+        axes = fig.subplots(max(len(rows), 1), len(self.cols), sharex=True, sharey=True, squeeze=False)
+        top = self.counts.max() if self.counts.size else 1
+        kwargs.setdefault('fill', True)
+        kwargs.setdefault('edgecolor', 'white')
+        for ax_row, i in zip(axes, rows):
+            for j, ax in enumerate(ax_row):
+                ax.stairs(self.counts[i, j], self.edges, **kwargs)
+            if self.row is not None:
+                ax_row[-1].annotate('{} = {}'.format(self.row, self.rows[i]), xy=(1.02, 0.5),
+                                    xycoords='axes fraction', rotation=270, ha='left', va='center')
+        if self.col is not None:
+            for j, ax in enumerate(axes[0]):
+                ax.set_title('{} = {}'.format(self.col, self.cols[j]))
+        axes[0, 0].set_ylim(0, top * 1.05)
+        for ax in axes[-1]:
+            ax.set_xlabel(self.x)
+        for ax in axes[:, 0]:
+            ax.set_ylabel('Count')
+        return fig
+
+    def pages(self, **kwargs):
+        """Yield the figure of every page (close each one when done with it)."""
+        for page in range(self.n_pages):
+            yield self.plot(page, **kwargs)
+
+
+def _codes(values):
+    if values is None:
+        return None, pd.Index([None])
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, pd.Index(uniques)
+
+
+def facet_histograms(frame, x='response_time', col='task_type', row='subject_nr', binwidth=BINWIDTH,
+                     start=None, rows_per_page=ROWS_PER_PAGE):
+    """Return the histograms of column ``x`` per value of ``row`` and ``col`` (either can be None).
+
+    The bins are ``binwidth`` wide and start at ``start`` (by default the
+    smallest value, like seaborn); all facets use the same bins. Trials
+    with a missing ``x``, row or column value are left out.
+    """
+    values = to_numbers(frame[x]).to_numpy()
+    row_codes, rows = _codes(None if row is None else frame[row])
+    col_codes, cols = _codes(None if col is None else frame[col])
+    keep = ~np.isnan(values)
+    if start is not None:
+        keep &= values >= start
+    for codes in (row_codes, col_codes):
+        if codes is not None:
+            keep &= codes >= 0
+    values = values[keep]
+    if start is None:
+        start = values.min() if len(values) else 0
+    bins = ((values - start) // binwidth).astype(np.intp)
+    n_bins = int(bins.max()) + 1 if len(bins) else 1
+    facets = np.zeros(len(values), dtype=np.intp)
+    if row_codes is not None:
+        facets += row_codes[keep] * len(cols)
+    if col_codes is not None:
+        facets += col_codes[keep]
+    counts = np.bincount(facets * n_bins + bins, minlength=len(rows) * len(cols) * n_bins)
+    return FacetHistograms(counts.reshape(len(rows), len(cols), n_bins),
+                           start + binwidth * np.arange(n_bins + 1), rows, cols, row, col, x,
+                           rows_per_page)
@@ -0,0 +1,252 @@
+"""Render the figures of the plotting tutorial for every subject, in worker processes.
+
+A report of a study shows the figures of
+``content/11_plotting/plotting_behavioral_data.ipynb`` (the response time
+histogram, correct vs incorrect trials, the switch cost lines) for every
+participant, and drawing hundreds of them one after another in a notebook
+is slow. ``render_figures`` reads the cleaned trials once, splits them into
+the groups of every figure (e.g. per subject, or per subject and session)
+and draws the figures in a pool of processes. Figures are drawn on
+``matplotlib.figure.Figure`` objects, which render with Agg (or the SVG and
+PDF backends) and never open a window or touch the pyplot state.
+
+A figure is only drawn again when its trials, its entry in the spec or the
+function that draws it changed: ``figures.manifest.json`` in the output
+folder keeps a hash of these for every file written.
+
+A spec is a list of figures (or a JSON file with one), e.g.::
+
+    [{"name": "rt_histogram", "kind": "hist", "per": ["subject_nr", "session"], "bins": 30},
+     {"name": "switch_cost", "kind": "line", "x": "session", "hue": "task_transition_type",
+      "per": ["subject_nr"], "where": [["correct", "==", 1]]}]
+
+``kind`` is one of ``KINDS``; ``per`` are the columns to make a figure per
+value of (none for one figure of all trials); ``where`` are (column,
+operator, value) conditions as for ``query.LogQuery.filter``. The other
+keys are options of the kind.
+"""
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from . import cache, columnar, merge, query
+from .chunked import to_numbers
+from .cube import build_cube
+
+FORMATS = ('png', 'svg', 'pdf')
+MANIFEST = 'figures.manifest.json'
+# the layout of figures.manifest.json; a manifest of another version is ignored
+MANIFEST_VERSION = 1
+PROCESSES = os.cpu_count() or 1
+FIGSIZE = (8, 6)
+DPI = 100
+# the figures of the plotting tutorial, per subject and session
+DEFAULT_SPEC = [
+    {'name': 'rt_histogram', 'kind': 'hist', 'per': ['subject_nr', 'session'], 'bins': 30},
+    {'name': 'correct_vs_incorrect', 'kind': 'correct_incorrect', 'per': ['subject_nr', 'session'],
+     'bins': 20},
+    {'name': 'switch_cost', 'kind': 'line', 'per': ['subject_nr'], 'x': 'session',
+     'hue': 'task_transition_type'},
+]
+
+
+def _draw_hist(ax, frame, x='response_time', bins=30):
+    ax.hist(to_numbers(frame[x]).dropna(), bins=bins)
+    ax.set_xlabel('RT' if x == 'response_time' else x)
+    ax.set_ylabel('Count')
+    ax.set_title('Response time distribution')
+
+
+def _draw_correct_incorrect(ax, frame, x='response_time', bins=20):
+    # incorrect trials without a response have no response time worth showing
+    correct = to_numbers(frame['correct'])
+    response = frame['response']
+    values = to_numbers(frame[x])
+    ax.hist(values[correct == 1].dropna(), bins=bins, alpha=0.5, color='green', label='correct trials')
+    ax.hist(values[(correct == 0) & response.notna() & (response != 'None')].dropna(), bins=bins,
+            alpha=0.5, color='red', label='incorrect trials')
+    ax.set_xlabel('RT' if x == 'response_time' else x)
+    ax.set_ylabel('Count')
+    ax.set_title('Correct vs incorrect response time distributions')
+    ax.legend(loc='upper right')
+
+
+def _draw_line(ax, frame, x='session', hue='task_transition_type', y='response_time'):
+    build_cube(frame, [x] if hue is None else [x, hue], y).lineplot(x, hue=hue, ax=ax)
+
+
+KINDS = {
+    'hist': _draw_hist,
+    'correct_incorrect': _draw_correct_incorrect,
+    'line': _draw_line,
+}
+# keys of a spec entry that are not options of its kind
+SPEC_KEYS = ('name', 'kind', 'per', 'where', 'figsize')
+
+
+@dataclass
+class FigureStats:
+    """What ``render_figures`` did."""
+    rendered: int = 0
+    skipped: int = 0
+    files: list = field(default_factory=list)
+    seconds: float = 0.0
+
+    def __str__(self):
+        return 'Rendered {} figures, {} up to date, wrote {} files in {:.2f} s'.format(
+            self.rendered, self.skipped, len(self.files), self.seconds)
+
+
+def load_spec(spec):
+    """Return the list of figures in ``spec``: a list, or the path of a JSON file with one."""
+    if isinstance(spec, (str, os.PathLike)):
+        with open(spec) as fhand:
+            spec = json.load(fhand)
+    names = set()
+    for figure in spec:
+        if figure.get('kind') not in KINDS:
+            raise ValueError('figure {}: unknown kind {!r}, use one of {}'.format(
+                figure.get('name'), figure.get('kind'), ', '.join(KINDS)))
+        if not figure.get('name') or figure['name'] in names:
+            raise ValueError('every figure needs a name of its own, not {!r}'.format(figure.get('name')))
+        names.add(figure['name'])
+    return list(spec)
+
+
+def _options(figure):
+    """Return the options of the drawing function of ``figure``, with its defaults filled in."""
+    parameters = inspect.signature(KINDS[figure['kind']]).parameters.values()
+    options = {parameter.name: parameter.default for parameter in parameters
+               if parameter.default is not inspect.Parameter.empty}
+    options.update((key, value) for key, value in figure.items() if key not in SPEC_KEYS)
+    return options
+
+
+def _needed_columns(spec):
+    columns = set()
+    for figure in spec:
+        columns.update(figure.get('per', ()))
+        columns.update(condition[0] for condition in figure.get('where', ()))
+        options = _options(figure)
+        columns.update(options[key] for key in ('x', 'y', 'hue') if options.get(key))
+        if figure['kind'] == 'correct_incorrect':
+            columns.update(['correct', 'response'])
+    return sorted(columns)
+
+
+def _load(src, columns):
+    if columnar.columnar_format(src):
+        return columnar.load_columnar(src, columns)
+    return pd.read_csv(src, usecols=columns)
+
+
+def _where(frame, conditions):
+    for column, op, value in conditions:
+        frame = frame[query.OPERATORS[op](frame[column], value).fillna(False).astype(bool)]
+    return frame
+
+
+def _file_name(figure, key):
+    """Return the file name (without suffix) of the figure of group ``key``."""
+    parts = ['{}-{}'.format(column, value) for column, value in zip(figure.get('per', ()), key)]
+    name = '_'.join([figure['name']] + parts)
+    return os.path.join(figure['name'], name) if parts else name
+
+
+def _figure_key(figure, frame, formats):
+    digest = hashlib.sha256(json.dumps(figure, sort_keys=True, default=str).encode())
+    digest.update(cache.source_id(KINDS[figure['kind']]))
+    digest.update(cache.value_id(frame.reset_index(drop=True)))
+    digest.update(repr(sorted(formats)).encode())
+    return digest.hexdigest()
+
+
+def _tasks(frame, spec):
+    """Yield (figure, group key, trials of the group) for every figure to draw."""
+    for figure in spec:
+        trials = _where(frame, figure.get('where', ()))
+        per = list(figure.get('per', ()))
+        if not per:
+            yield figure, (), trials
+            continue
+        for key, group in trials.groupby(per, observed=True, sort=True):
+            yield figure, key, group
+
+
+def render_figure(figure, frame, paths):
+    """Draw ``figure`` (an entry of a spec) of the trials in ``frame`` and save it to every path in ``paths``."""
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figure.get('figsize', FIGSIZE), dpi=DPI)
+    ax = fig.subplots()
+    KINDS[figure['kind']](ax, frame, **_options(figure))
+    fig.tight_layout()
+    for path in paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fig.savefig(path)
+    return paths
+
+
+def _render_task(task):
+    return render_figure(*task)
+
+
+def render_figures(src, out, spec=DEFAULT_SPEC, formats=('png',), force=False, processes=PROCESSES):
+    """Draw the figures in ``spec`` of the trials in ``src`` into folder ``out``.
+
+    ``src`` is a cleaned csv file, like ``df_cleaned.csv``, or a Parquet or
+    Feather file. Every figure is written once per format in ``formats``
+    (png, svg or pdf), as ``out/<name>/<name>_<column>-<value>....<format>``
+    for figures per group. Figures whose trials, spec entry and drawing
+    function did not change since the last run are skipped, unless
+    ``force``. With ``processes=1`` everything runs in this process.
+    """
+    start = time.perf_counter()
+    spec = load_spec(spec)
+    if not formats:
+        raise ValueError('no formats to write the figures in, use one or more of {}'.format(
+            ', '.join(FORMATS)))
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError('unknown formats {}, use {}'.format(', '.join(sorted(unknown)), ', '.join(FORMATS)))
+    frame = _load(src, _needed_columns(spec))
+    manifest_file = os.path.join(out, MANIFEST)
+    manifest = None if force else cache.read_json(manifest_file)
+    if manifest is None or manifest.get('version') != MANIFEST_VERSION:
+        manifest = {'version': MANIFEST_VERSION, 'figures': {}}
+    stats = FigureStats()
+
+    def todo():
+        for figure, key, group in _tasks(frame, spec):
+            name = _file_name(figure, key)
+            paths = [os.path.join(out, '{}.{}'.format(name, fmt)) for fmt in formats]
+            figure_key = _figure_key(figure, group, formats)
+            if manifest['figures'].get(name) == figure_key and all(map(os.path.exists, paths)):
+                stats.skipped += 1
+                continue
+            # recorded when the figure has been written
+            manifest['figures'][name] = None
+            keys[name] = figure_key
+            yield figure, group, paths
+
+    keys = {}
+    os.makedirs(out, exist_ok=True)
+    try:
+        if processes == 1:
+            written = map(_render_task, todo())
+        else:
+            written = merge.ordered_map(_render_task, todo(), processes, executor=ProcessPoolExecutor)
+        for paths in written:
+            name = os.path.splitext(os.path.relpath(paths[0], out))[0]
+            manifest['figures'][name] = keys.pop(name)
+            stats.rendered += 1
+            stats.files.extend(paths)
+    finally:
+        cache.write_json(manifest_file, manifest)
+    stats.seconds = time.perf_counter() - start
+    return stats
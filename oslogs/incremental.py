@@ -0,0 +1,200 @@
+"""Incremental merging: only add the logfiles that are new since the last merge.
+
+During data collection a new participant arrives every hour or so, and
+merging thousands of logfiles from scratch each time is wasteful.
+``merge_incremental`` keeps a small manifest next to the merged file
+(``merged.csv.manifest.json``) with the path, size, modification time,
+content hash and header id of every logfile it has seen. On the next run it
+appends only the new files. The merged file is rebuilt from scratch when a
+logfile was changed or removed, when the merge options changed, or when the
+merged file itself was changed.
+
+Appended files end up after the files that were merged before, so after
+appending the row order can differ from a merge from scratch.
+"""
+import os
+import time
+from dataclasses import dataclass
+
+from . import cache, merge, provenance, sources
+
+MANIFEST_SUFFIX = '.manifest.json'
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class IncrementalStats(merge.MergeStats):
+    """``MergeStats`` plus whether, and why, the merged file was rebuilt."""
+    rebuilt: bool = False
+    reason: str = ''
+
+    def __str__(self):
+        if self.rebuilt:
+            action = 'Rebuilt ({})'.format(self.reason)
+        elif self.files_read:
+            action = 'Appended'
+        else:
+            action = 'Up to date'
+        return '{}. {}'.format(action, super().__str__())
+
+
+def manifest_path(out):
+    """Return the path of the manifest that belongs to merged file ``out``."""
+    return os.fspath(out) + MANIFEST_SUFFIX
+
+
+def load_manifest(path):
+    """Return the manifest in ``path``, or None if it is missing or unreadable."""
+    manifest = cache.read_json(path)
+    if manifest is None or manifest.get('version') != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def _hash_file(path):
+    digest = merge.content_hash()
+    with sources.open_logfile(path) as fhand:
+        for chunk in iter(lambda: fhand.read(merge.CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_manifest(manifest, options, out, items, current, new, workers):
+    """Check whether ``out`` must be rebuilt or the new files can be appended.
+
+    ``items`` maps the name of every logfile to its path or archive member
+    and ``current`` maps it to its (size, mtime_ns). Returns the reason
+    for a rebuild (None to append) and the files that were only touched;
+    their size and mtime are updated in ``manifest``.
+    """
+    if manifest is None:
+        return 'no manifest', []
+    if not manifest['refheader']:
+        # the last merge saw no logfiles, so there is no header to append to
+        return 'no reference header', []
+    if manifest['options'] != options:
+        return 'merge options changed', []
+    try:
+        if os.path.getsize(out) != manifest['output_size']:
+            return 'merged file changed', []
+    except OSError:
+        return 'merged file missing', []
+
+    entries = {entry['path']: entry for entry in manifest['files']}
+    touched = []
+    for path, entry in entries.items():
+        if path not in current:
+            return 'removed {}'.format(path), []
+        if current[path] != (entry['size'], entry['mtime_ns']):
+            touched.append(path)
+    # only files whose size or mtime changed are read, to compare their content
+    digests = merge.ordered_map(_hash_file, [items[path] for path in touched], workers)
+    for path, digest in zip(touched, digests):
+        if digest != entries[path]['hash']:
+            return 'changed {}'.format(path), []
+        entries[path]['size'], entries[path]['mtime_ns'] = current[path]
+
+    if options['union']:
+        columns = set(manifest['schema'])
+        headers = merge.ordered_map(merge.read_header, new, workers)
+        for item, header in zip(new, headers):
+            if not columns.issuperset(merge.parse_header(header)):
+                return 'new columns in {}'.format(item), []
+    return None, touched
+
+
+def merge_incremental(src, out, pattern='*', exclude=(), union=False, missing='',
+                      columns=None, drop_columns=(), annotate=False,
+                      workers=merge.DEFAULT_WORKERS, chunk_size=merge.CHUNK_SIZE, verbose=False):
+    """Bring merged file ``out`` up to date with the logfiles in ``src``.
+
+    Works like ``merge.merge_logfiles`` or, with ``union=True``, like
+    ``merge.merge_union``, but appends only the logfiles that were not merged
+    before. Returns an ``IncrementalStats``.
+
+    ``src`` can be a zip archive, but not a tar archive: a tar archive cannot
+    be read in parts, so merge it from scratch instead.
+    """
+    start = time.perf_counter()
+    with merge.open_sources(src, out, pattern, exclude) as source:
+        if not getattr(source, 'random_access', True):
+            raise ValueError('cannot merge incrementally from a tar archive: {}'.format(src))
+        stats = _merge_incremental(list(source), out, union, missing, columns, drop_columns,
+                                   annotate, workers, chunk_size, verbose)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def _merge_incremental(paths, out, union, missing, columns, drop_columns, annotate, workers,
+                       chunk_size, verbose):
+    # lists, not tuples, so the options compare equal to the ones in the manifest
+    options = {'union': union, 'missing': missing, 'drop_columns': list(drop_columns),
+               'columns': None if columns is None else list(columns), 'annotate': annotate}
+    manifest_file = manifest_path(out)
+    manifest = load_manifest(manifest_file)
+
+    # a file with the same size and modification time as last time is
+    # assumed to be unchanged, so an up-to-date merge only costs a stat per file
+    items = {str(path): path for path in paths}
+    current = {name: sources.file_stat(item) for name, item in items.items()}
+    known = set() if manifest is None else {entry['path'] for entry in manifest['files']}
+    new = [path for path in paths if str(path) not in known]
+    reason, touched = _check_manifest(manifest, options, out, items, current, new, workers)
+
+    stats = IncrementalStats(rebuilt=reason is not None, reason=reason or '')
+    translate = merge.newline_translator()
+    if reason is None:
+        files = manifest['files']
+        schema = manifest['schema']
+        refheader = manifest['refheader'].encode('utf-8', 'surrogateescape')
+        mode = 'ab'
+    else:
+        files = []
+        new = paths
+        mode = 'wb'
+        refheader = merge.read_header(paths[0]) if paths else b''
+        if union:
+            headers = merge.ordered_map(merge.read_header, paths, workers)
+            schema = merge.union_columns(merge.parse_header(header) for header in headers)
+        else:
+            schema = merge.parse_header(refheader)
+    projected = merge.projection(schema, columns, drop_columns) if paths else None
+    target = schema if projected is None else projected
+    stats.columns = provenance.PROVENANCE_COLUMNS + target if annotate else target
+
+    if union:
+        def read(path):
+            return merge.read_into_schema(path, target, missing, chunk_size, translate,
+                                           merge.content_hash(), annotate)
+    else:
+        def read(path):
+            return merge.read_body(path, refheader, chunk_size, translate,
+                                    merge.content_hash(), projected, annotate)
+
+    def record(path, result):
+        size, mtime_ns = current[str(path)]
+        files.append({'path': str(path), 'size': size, 'mtime_ns': mtime_ns, 'hash': result.digest,
+                      'header_id': merge.header_id(result.header), 'merged': result.body is not None})
+
+    if new or reason is not None:
+        with open(out, mode, buffering=merge.WRITE_BUFFER) as fout:
+            if reason is not None:
+                if union:
+                    header = merge.header_line(b'', target, annotate, translate)
+                else:
+                    header = merge.header_line(refheader, projected, annotate, translate)
+                fout.write(header)
+                stats.bytes_written += len(header)
+            merge.write_bodies(fout, new, read, stats, workers, verbose, record)
+
+    if reason is None and not new and not touched:
+        return stats
+    cache.write_json(manifest_file, {
+        'version': MANIFEST_VERSION,
+        'options': options,
+        'refheader': refheader.decode('utf-8', 'surrogateescape'),
+        'schema': schema,
+        'output_size': os.path.getsize(out),
+        'files': files,
+    })
+    return stats
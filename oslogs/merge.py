@@ -0,0 +1,491 @@
+"""Merge OpenSesame logfiles into a single csv file.
+
+This is the merge loop from ``content/07_files/merging_files.ipynb`` as a
+reusable function. The result is byte for byte what the tutorial script
+writes: the header of the first file is written once, and every file whose
+header is not identical to that reference header is skipped. Files are read
+by a small pool of threads (merging is mostly waiting on the disk), and the
+output is written in large buffered chunks in the original file order.
+
+``merge_union`` is the flexible alternative for logfiles of slightly
+different versions of an experiment: instead of skipping files with a
+different header it merges all files into the union of their columns.
+
+Both read logfiles from a folder or straight from a zip or tar archive, and
+both can write just a selection of the columns (see ``project_columns``),
+which makes the merged file many times smaller than the 347-column logfiles.
+"""
+import csv
+import fnmatch
+import hashlib
+import io
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from operator import itemgetter
+
+from . import provenance, sources
+
+# size of the blocks we read from the logfiles and of the output buffer
+CHUNK_SIZE = 1 << 20
+WRITE_BUFFER = 8 << 20
+
+# reading files is I/O bound, so use more threads than cores
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+@dataclass
+class MergeStats:
+    """What a merge did and how fast it was."""
+    files_read: int = 0
+    files_merged: int = 0
+    skipped: list = field(default_factory=list)
+    bytes_read: int = 0
+    bytes_written: int = 0
+    seconds: float = 0.0
+    columns: list = field(default_factory=list)
+
+    @property
+    def files_per_second(self):
+        return self.files_read / self.seconds if self.seconds else 0.0
+
+    @property
+    def mb_per_second(self):
+        return self.bytes_read / 1e6 / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return ('Merged {} of {} files ({} skipped) in {:.2f} s: '
+                '{:.0f} files/s, {:.1f} MB/s'.format(
+                    self.files_merged, self.files_read, len(self.skipped),
+                    self.seconds, self.files_per_second, self.mb_per_second))
+
+
+def list_logfiles(src, pattern='*', exclude=()):
+    """Return the paths of the logfiles in folder ``src``.
+
+    Files are returned in ``os.listdir`` order, like the tutorial loop, so the
+    merged output is identical. ``pattern`` is a glob on the file name and
+    ``exclude`` a collection of file names to leave out (for instance the
+    atypical ``CI_RSI2000_test.csv``).
+    """
+    paths = []
+    # os.scandir lists entries in the same order as os.listdir, but saves a
+    # stat call per file
+    with os.scandir(src) as entries:
+        for entry in entries:
+            if pattern != '*' and not fnmatch.fnmatch(entry.name, pattern) or entry.name in exclude:
+                continue
+            if entry.is_file():
+                paths.append(entry.path)
+    return paths
+
+
+def normalized_chunks(fhand, chunk_size=CHUNK_SIZE):
+    """Yield the content of binary file ``fhand`` in chunks of about ``chunk_size``.
+
+    Line endings are translated the way ``open(path)`` does in text mode:
+    ``\\r\\n`` and ``\\r`` both become ``\\n``.
+    """
+    pending_cr = False
+    while True:
+        chunk = fhand.read(chunk_size)
+        if not chunk:
+            break
+        if pending_cr:
+            chunk = b'\r' + chunk
+        # a \r at the end of a chunk may be the first half of \r\n
+        pending_cr = chunk.endswith(b'\r')
+        if pending_cr:
+            chunk = chunk[:-1]
+        if b'\r' in chunk:
+            chunk = chunk.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        if chunk:
+            yield chunk
+    if pending_cr:
+        yield b'\n'
+
+
+def split_header(chunks):
+    """Split an iterator of chunks into the first line and an iterator over the rest."""
+    chunks = iter(chunks)
+    header = b''
+    for chunk in chunks:
+        end = chunk.find(b'\n')
+        if end == -1:
+            header += chunk
+            continue
+        header += chunk[:end + 1]
+        rest = chunk[end + 1:]
+        return header, _prepend(rest, chunks)
+    return header, iter(())
+
+
+def _prepend(first, chunks):
+    if first:
+        yield first
+    yield from chunks
+
+
+def read_header(path):
+    """Return the first line of logfile ``path`` (or archive member) as bytes."""
+    with sources.open_logfile(path) as fhand:
+        header, _ = split_header(normalized_chunks(fhand, 64 << 10))
+    return header
+
+
+def parse_header(header):
+    """Return the column names in header line ``header`` (bytes) as a list."""
+    if not header.strip():
+        return []
+    return next(csv.reader([header.decode('utf-8', 'surrogateescape')]))
+
+
+def header_id(header):
+    """Return a short id for header line ``header`` (bytes)."""
+    return hashlib.blake2b(header, digest_size=8).hexdigest()
+
+
+def content_hash():
+    """Return a new hashlib object for hashing the content of logfiles."""
+    return hashlib.blake2b(digest_size=16)
+
+
+def union_columns(headers):
+    """Return the union of the column lists in ``headers``.
+
+    The order is stable: the columns of the first header, followed by every
+    new column in the order in which it is first seen.
+    """
+    columns = {}
+    for header in headers:
+        for column in header:
+            columns.setdefault(column, None)
+    return list(columns)
+
+
+def project_columns(available, columns=None, drop_columns=()):
+    """Return the columns of ``available`` that are selected by ``columns`` and ``drop_columns``.
+
+    Both are lists of column names or glob patterns such as ``count_*``.
+    ``columns`` selects the columns to keep (None keeps all of them) in the
+    order given; the columns matched by one pattern keep their order in
+    ``available``. Columns matched by ``drop_columns`` are then left out.
+    A column name in ``columns`` that is not available raises a KeyError.
+    """
+    if columns is None:
+        selected = list(available)
+    else:
+        selected = {}
+        not_found = []
+        for pattern in columns:
+            matches = [column for column in available if fnmatch.fnmatchcase(column, pattern)]
+            if not matches and not _is_glob(pattern):
+                not_found.append(pattern)
+            for column in matches:
+                selected.setdefault(column, None)
+        if not_found:
+            raise KeyError('columns not found: {}'.format(', '.join(not_found)))
+    return [column for column in selected
+            if not any(fnmatch.fnmatchcase(column, pattern) for pattern in drop_columns)]
+
+
+def _is_glob(pattern):
+    return any(char in pattern for char in '*?[')
+
+
+def projection(schema, columns, drop_columns):
+    """Return the projected columns of ``schema``, or None if all columns are kept."""
+    if columns is None and not drop_columns:
+        return None
+    return project_columns(schema, columns, drop_columns)
+
+
+def ordered_map(func, items, workers=DEFAULT_WORKERS, executor=ThreadPoolExecutor):
+    """Like ``map`` but running ``func`` in a thread pool.
+
+    Results come back in input order, and at most ``2 * workers`` results are
+    in flight at any time, which bounds memory use for large inputs. Pass
+    ``executor=ProcessPoolExecutor`` for work that needs more than one core
+    (``func`` and the items then have to be picklable).
+    """
+    with executor(workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def newline_translator():
+    """Return a function that turns the newlines of a chunk into ``os.linesep``.
+
+    Text mode writes ``os.linesep`` for every newline, so the merged files
+    do the same.
+    """
+    if os.linesep == '\n':
+        return lambda chunk: chunk
+    linesep = os.linesep.encode()
+    return lambda chunk: chunk.replace(b'\n', linesep)
+
+
+# what a reader task returns for one logfile: the raw header line, the body
+# chunks to write (None if the file is skipped), the number of bytes read and
+# the content hash (None if no hash was asked for)
+_FileRead = namedtuple('_FileRead', 'header body nbytes digest')
+
+
+class _HashingReader:
+    """Binary file wrapper that feeds everything read to a hashlib object."""
+
+    def __init__(self, fhand, digest):
+        self.fhand = fhand
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.fhand.read(size)
+        self.digest.update(data)
+        return data
+
+
+def source_values(path):
+    """Return the values of the provenance columns of logfile ``path`` (without the row)."""
+    return os.path.basename(str(path)), provenance.participant_from_path(str(path))
+
+
+def read_body(path, refheader, chunk_size, translate, digest=None, columns=None, annotate=False):
+    """Read one logfile, skipping its body if the header is not ``refheader``.
+
+    With ``columns`` only those columns of the rows are kept, and with
+    ``annotate`` the provenance columns are added in front.
+    """
+    with sources.open_logfile(path) as raw:
+        fhand = raw if digest is None else _HashingReader(raw, digest)
+        header, rest = split_header(normalized_chunks(fhand, chunk_size))
+        if header == refheader and columns is None:
+            if annotate:
+                rest = provenance.Annotator.for_file(path, header).blocks(rest)
+            body = [translate(chunk) for chunk in rest]
+        elif header == refheader:
+            source = source_values(path) if annotate else None
+            body = [_remap_rows(b''.join(rest), parse_header(header), columns, '', source)]
+        else:
+            body = None
+            if digest is not None:
+                # the content hash covers the whole file, also when it is skipped
+                deque(rest, maxlen=0)
+        return _FileRead(header, body, raw.tell(), None if digest is None else digest.hexdigest())
+
+
+def _row_mapper(header, columns, missing):
+    """Return a function that puts a row with columns ``header`` in the order of ``columns``."""
+    position = {}
+    for i, column in enumerate(header):
+        position.setdefault(column, i)
+    width = len(header)
+    # columns this file does not have point at a sentinel appended to every row
+    getter = itemgetter(*[position.get(column, width) for column in columns])
+    single = len(columns) == 1
+
+    def mapper(row):
+        if len(row) < width:
+            row += [missing] * (width - len(row))
+        elif len(row) > width:
+            del row[width:]
+        row.append(missing)
+        return [getter(row)] if single else getter(row)
+    return mapper
+
+
+def _csv_bytes(rows):
+    """Return ``rows`` as csv bytes, quoted like OpenSesame does."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator=os.linesep)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8', 'surrogateescape')
+
+
+def _remap_rows(data, header, columns, missing, source=None):
+    """Return the csv rows in ``data`` (bytes, columns ``header``) in the order of ``columns``.
+
+    With ``source``, a (file name, participant) pair, the provenance columns
+    are added in front.
+    """
+    mapper = _row_mapper(header, columns, missing)
+    reader = csv.reader(io.StringIO(data.decode('utf-8', 'surrogateescape')))
+    rows = (mapper(row) for row in reader if row)
+    if source is not None:
+        rows = ([*source, str(i), *row] for i, row in enumerate(rows))
+    return _csv_bytes(rows)
+
+
+def read_into_schema(path, columns, missing, chunk_size, translate, digest=None, annotate=False):
+    """Read one logfile with its rows in the order of ``columns``.
+
+    Files that already have exactly these columns are copied as they are;
+    other files are parsed row by row. With ``annotate`` the provenance
+    columns are added in front.
+    """
+    with sources.open_logfile(path) as raw:
+        fhand = raw if digest is None else _HashingReader(raw, digest)
+        header, rest = split_header(normalized_chunks(fhand, chunk_size))
+        file_columns = parse_header(header)
+        if file_columns == columns:
+            if annotate:
+                rest = provenance.Annotator.for_file(path, header).blocks(rest)
+            body = [translate(chunk) for chunk in rest]
+            # unlike the tutorial, do not glue the next file to an unterminated last line
+            if body and not body[-1].endswith(b'\n'):
+                body.append(translate(b'\n'))
+        else:
+            source = source_values(path) if annotate else None
+            body = [_remap_rows(b''.join(rest), file_columns, columns, missing, source)]
+        return _FileRead(header, body, raw.tell(), None if digest is None else digest.hexdigest())
+
+
+def write_bodies(fout, items, read, stats, workers, verbose, on_file=None):
+    """Run ``read`` on ``items`` in a thread pool and write the bodies to ``fout`` in order.
+
+    ``on_file(item, result)`` is called for every file after it is written.
+    """
+    def read_item(item):
+        return item, read(item)
+
+    for item, result in ordered_map(read_item, items, workers):
+        if verbose:
+            print('Reading {}'.format(item), file=sys.stderr)
+        stats.files_read += 1
+        stats.bytes_read += result.nbytes
+        if result.body is None:
+            stats.skipped.append(str(item))
+        else:
+            stats.files_merged += 1
+            for chunk in result.body:
+                fout.write(chunk)
+                stats.bytes_written += len(chunk)
+        if on_file is not None:
+            on_file(item, result)
+
+
+@contextmanager
+def open_sources(src, out=None, pattern='*', exclude=()):
+    """Open the logfiles in ``src``: a folder, a zip or tar archive, or a list of paths.
+
+    Yields an iterable of paths and archive members (see ``sources``). The
+    output file ``out`` is never part of it.
+    """
+    if isinstance(src, (str, os.PathLike)) and sources.is_archive(src):
+        with sources.open_archive(src, pattern, exclude) as archive:
+            yield archive
+        return
+    if isinstance(src, (str, os.PathLike)):
+        paths = list_logfiles(src, pattern, exclude)
+    else:
+        paths = list(src)
+    if out is not None:
+        # never merge the output file into itself (realpath is slow, so only
+        # resolve paths that have the same file name as the output)
+        out_path = os.path.realpath(out)
+        name = os.path.basename(out_path)
+        paths = [path for path in paths
+                 if os.path.basename(path) != name or os.path.realpath(path) != out_path]
+    yield paths
+
+
+def first_item(items):
+    """Return the first of ``items`` (a list or an archive), or None if there are none."""
+    for item in items:
+        return item
+    return None
+
+
+def header_line(refheader, columns, annotate, translate):
+    """Return the first line of a merged file.
+
+    That is ``refheader`` as it is if ``columns`` is None, else a header
+    with ``columns``. ``annotate`` adds the provenance columns in front.
+    """
+    if columns is None:
+        if not refheader:
+            return b''
+        prefix = provenance.header_prefix(refheader) if annotate else b''
+        return translate(prefix + refheader)
+    if not columns:
+        return b''
+    return _csv_bytes([provenance.PROVENANCE_COLUMNS + columns if annotate else columns])
+
+
+def merge_logfiles(src, out, pattern='*', exclude=(), columns=None, drop_columns=(),
+                   annotate=False, workers=DEFAULT_WORKERS, chunk_size=CHUNK_SIZE,
+                   verbose=False):
+    """Merge the logfiles in ``src`` into the csv file ``out``.
+
+    ``src`` is a folder (see ``list_logfiles`` for ``pattern`` and
+    ``exclude``), a zip or tar archive, or a list of paths. The header of the
+    first file is the reference header; files with a different header are
+    skipped, exactly like the ``write_this_file`` flag in the tutorial.
+    ``columns`` and ``drop_columns`` select the columns to write (see
+    ``project_columns``). With ``annotate`` the file name, participant and
+    row number of every row are added as first columns (see ``provenance``).
+    Returns a ``MergeStats``.
+    """
+    start = time.perf_counter()
+    stats = MergeStats()
+    translate = newline_translator()
+    with open_sources(src, out, pattern, exclude) as items:
+        first = first_item(items)
+        refheader = b'' if first is None else read_header(first)
+        schema = parse_header(refheader)
+        projected = None if first is None else projection(schema, columns, drop_columns)
+        stats.columns = schema if projected is None else projected
+        if annotate:
+            stats.columns = provenance.PROVENANCE_COLUMNS + stats.columns
+
+        def read(item):
+            return read_body(item, refheader, chunk_size, translate, columns=projected,
+                              annotate=annotate)
+
+        with open(out, 'wb', buffering=WRITE_BUFFER) as fout:
+            header = header_line(refheader, projected, annotate, translate)
+            fout.write(header)
+            stats.bytes_written += len(header)
+            write_bodies(fout, items, read, stats, workers, verbose)
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def merge_union(src, out, pattern='*', exclude=(), missing='', columns=None, drop_columns=(),
+                annotate=False, workers=DEFAULT_WORKERS, chunk_size=CHUNK_SIZE, verbose=False):
+    """Merge the logfiles in ``src`` into ``out`` using the union of their columns.
+
+    A first pass reads only the headers and builds the union schema (see
+    ``union_columns``). A second pass streams the rows of every file into that
+    schema; columns a file does not have are filled with ``missing``. No file
+    is skipped. Arguments are as for ``merge_logfiles``.
+    """
+    start = time.perf_counter()
+    stats = MergeStats()
+    translate = newline_translator()
+    with open_sources(src, out, pattern, exclude) as items:
+        headers = ordered_map(read_header, items, workers)
+        schema = union_columns(parse_header(header) for header in headers)
+        projected = projection(schema, columns, drop_columns)
+        target = schema if projected is None else projected
+        stats.columns = provenance.PROVENANCE_COLUMNS + target if annotate else target
+
+        def read(item):
+            return read_into_schema(item, target, missing, chunk_size, translate,
+                                     annotate=annotate)
+
+        with open(out, 'wb', buffering=WRITE_BUFFER) as fout:
+            header = header_line(b'', target, annotate, translate)
+            fout.write(header)
+            stats.bytes_written += len(header)
+            write_bodies(fout, items, read, stats, workers, verbose)
+    stats.seconds = time.perf_counter() - start
+    return stats
@@ -0,0 +1,169 @@
+"""Exclude extreme and incorrect responses per subject and condition, in one pass.
+
+The analysis section of ``content/03_conditionals/conflict_tasks.ipynb``
+flags extreme responses in SPSS by hand: response times outside 100-1000 ms
+are recoded into an ``extreme_responses`` column, and Select Cases keeps
+``correct = 1 & extreme_responses = 0``. It mentions two other common rules,
+removing trials more than 2 or 3 standard deviations from the mean, or (the
+robust alternative of Leys et al., 2013) more than a few median absolute
+deviations from the median, per subject and condition.
+
+``filter_trials`` applies these rules in order:
+
+- 'no response': ``response`` is 'None' (pandas reads 'None' as missing);
+- 'incorrect': ``correct`` is not 1;
+- 'cutoff': the response time is outside ``cutoffs`` (inclusive), or missing;
+- 'sd': the response time is more than ``sd`` standard deviations from the
+  mean of its group;
+- 'mad': the response time is more than ``mad`` scaled median absolute
+  deviations from the median of its group.
+
+The groups are numbered once, and the means, standard deviations and
+medians of all groups come from a few passes over arrays (``np.bincount``
+and one sort per median), not a loop over the groups. The statistics of a
+rule only use the trials that the rules before it kept, and every excluded
+trial is counted under the first rule that excluded it.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from .chunked import to_numbers
+
+# the range of response times the tutorial accepts, in ms
+CUTOFFS = (100, 1000)
+GROUP_COLUMNS = ['subject_nr', 'congruency_type']
+# makes the MAD of normally distributed numbers estimate their standard deviation
+MAD_SCALE = 1.4826
+
+
+@dataclass
+class ExclusionReport:
+    """What ``filter_trials`` excluded.
+
+    ``counts`` has the number of trials excluded by every rule that was
+    applied, ``table`` has them per group of the ``report_by`` columns (and
+    the trials kept), and ``reasons`` has the rule that excluded each trial
+    of the input (missing for kept trials), like the tutorial's
+    ``extreme_responses`` column.
+    """
+    rows: int = 0
+    kept: int = 0
+    counts: pd.Series = None
+    table: pd.DataFrame = None
+    reasons: pd.Series = field(default=None, repr=False)
+
+    def __str__(self):
+        lines = ['Kept {} of {} trials ({:.1f}%)'.format(
+            self.kept, self.rows, 100 * self.kept / self.rows if self.rows else 0)]
+        for rule, count in self.counts.items():
+            lines.append('  {:12} {:10} excluded'.format(rule, count))
+        return '\n'.join(lines)
+
+
+def _group_codes(frame, by):
+    """Return the number of the group of ``by`` columns of every row, and the number of groups."""
+    if not by:
+        return np.zeros(len(frame), dtype=np.intp), 1
+    grouped = frame.groupby(list(by), observed=True, sort=False, dropna=False)
+    return grouped.ngroup().to_numpy(dtype=np.intp), grouped.ngroups
+
+
+def _group_means(values, codes, n_groups):
+    """Return the mean and standard deviation (ddof 1, like ``Series.std``) of every group."""
+    n = np.bincount(codes, minlength=n_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.bincount(codes, values, minlength=n_groups) / n
+        deviations = values - means[codes]
+        stds = np.sqrt(np.bincount(codes, deviations * deviations, minlength=n_groups) / (n - 1))
+    return means, np.where(n > 1, stds, np.nan)
+
+
+def _group_medians(values, codes, n_groups):
+    """Return the median of every group (NaN for empty groups), with one sort."""
+    if not len(values):
+        return np.full(n_groups, np.nan)
+    ordered = values[np.lexsort((values, codes))]
+    n = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(n) - n
+    # empty groups point at any row; their median is replaced below
+    low = np.minimum(starts + (n - 1) // 2, len(values) - 1)
+    high = np.minimum(starts + n // 2, len(values) - 1)
+    return np.where(n > 0, (ordered[low] + ordered[high]) / 2, np.nan)
+
+
+def _rule_masks(frame, by, value, cutoffs, sd, mad, drop_no_response, correct_only):
+    """Yield (rule, mask of the trials it excludes) given the trials kept so far."""
+    times = to_numbers(frame[value]).to_numpy()
+    if drop_no_response:
+        response = frame['response']
+        yield 'no response', lambda kept: (response.isna() | (response == 'None')).to_numpy()
+    if correct_only:
+        yield 'incorrect', lambda kept: (to_numbers(frame['correct']) != 1).to_numpy()
+    if cutoffs is not None:
+        low, high = cutoffs
+        yield 'cutoff', lambda kept: ~((times >= low) & (times <= high))
+    if sd is None and mad is None:
+        return
+    codes, n_groups = _group_codes(frame, by)
+
+    def beyond_sd(kept):
+        used = kept & ~np.isnan(times)
+        means, stds = _group_means(times[used], codes[used], n_groups)
+        return np.abs(times - means[codes]) > sd * stds[codes]
+
+    def beyond_mad(kept):
+        used = kept & ~np.isnan(times)
+        medians = _group_medians(times[used], codes[used], n_groups)
+        deviations = np.abs(times - medians[codes])
+        mads = _group_medians(deviations[used], codes[used], n_groups)
+        return deviations > mad * MAD_SCALE * mads[codes]
+
+    if sd is not None:
+        yield 'sd', beyond_sd
+    if mad is not None:
+        yield 'mad', beyond_mad
+
+
+def filter_trials(frame, by=GROUP_COLUMNS, value='response_time', cutoffs=CUTOFFS, sd=None,
+                  mad=None, drop_no_response=True, correct_only=True, report_by=('subject_nr',)):
+    """Return ``frame`` without its extreme and incorrect trials, and an ``ExclusionReport``.
+
+    ``by`` are the columns whose groups (e.g. subject and condition) the
+    'sd' and 'mad' rules compare each trial with; ``sd`` and ``mad`` are
+    the number of deviations (e.g. 2.5) a trial may be away, and ``None``
+    turns the rule off, as do ``cutoffs=None``, ``drop_no_response=False``
+    (e.g. for the nogo trials of a go/nogo task) and ``correct_only=False``
+    (to keep incorrect trials for the error rates). The default is the
+    tutorial's ``correct = 1 & extreme_responses = 0``.
+    """
+    kept = np.ones(len(frame), dtype=bool)
+    reasons = np.zeros(len(frame), dtype=np.int8)
+    rules = []
+    for rule, excluded_by in _rule_masks(frame, by, value, cutoffs, sd, mad, drop_no_response,
+                                         correct_only):
+        rules.append(rule)
+        excluded = kept & excluded_by(kept)
+        reasons[excluded] = len(rules)
+        kept &= ~excluded
+
+    # reason 0 is kept, reason i the i-th rule
+    counts = pd.Series(np.bincount(reasons, minlength=len(rules) + 1)[1:], index=pd.Index(rules),
+                       name='excluded')
+    codes, n_groups = _group_codes(frame, report_by)
+    cells = np.bincount(codes * (len(rules) + 1) + reasons, minlength=n_groups * (len(rules) + 1))
+    cells = cells.reshape(n_groups, len(rules) + 1)
+    if report_by:
+        keys = frame[list(report_by)].drop_duplicates()
+        index = pd.MultiIndex.from_frame(keys) if len(report_by) > 1 else pd.Index(keys.iloc[:, 0])
+    else:
+        index = pd.RangeIndex(1)
+    table = pd.DataFrame(cells[:, 1:], index=index, columns=rules)
+    table.insert(0, 'trials', cells.sum(axis=1))
+    table['kept'] = cells[:, 0]
+    report = ExclusionReport(
+        rows=len(frame), kept=int(kept.sum()), counts=counts, table=table.sort_index(),
+        reasons=pd.Series(pd.Categorical.from_codes(reasons - 1, rules),
+                          index=frame.index, name='excluded_by'))
+    return frame[kept].reset_index(drop=True), report
@@ -0,0 +1,78 @@
+"""Count rows per subject for many categorical columns in one pass.
+
+The ``columns_to_check`` loop in ``content/10_dataframes/datawrangling.ipynb``
+makes a ``pivot_table(index=['subject_nr'], columns=[column], aggfunc='size')``
+per column and concatenates them; every pivot table is a full groupby over
+the data. ``count_by`` turns every column into integer codes once, counts
+the (subject, value) pairs of every column with ``np.bincount`` and builds
+the same wide table from the counts.
+"""
+import numpy as np
+import pandas as pd
+
+
+def _codes(values):
+    """Return the integer codes (-1 for missing), the unique values and their sort order.
+
+    The codes are not sorted: sorting the small table of counts afterwards is
+    cheaper than renumbering every code, which is what ``sort=True`` does.
+    """
+    codes, uniques = pd.factorize(values)
+    return codes, uniques, uniques.argsort()
+
+
+def count_by(frame, columns, index='subject_nr'):
+    """Return the number of rows per ``index`` value for every value of each of ``columns``.
+
+    The result is what the tutorial loop returns::
+
+        pd.concat([frame.pivot_table(index=[index], columns=[column], aggfunc='size')
+                   for column in columns], axis=1)
+
+    That is a row per ``index`` value, a column per value of every column in
+    ``columns``, and NaN where a combination does not occur (see
+    ``counts_table``).
+    """
+    index_codes, index_values, index_order = _codes(frame[index])
+    n_index = len(index_values)
+    missing_index = index_codes < 0
+    index_values = pd.Index(index_values.take(index_order), name=index)
+
+    # count the (subject, value) pairs of every column with a bincount on
+    # subject * n_values + value; missing values are left out
+    blocks = []
+    for column in columns:
+        codes, values, order = _codes(frame[column])
+        keys = index_codes * len(values) + codes
+        missing = (codes < 0) | missing_index
+        if missing.any():
+            keys = keys[~missing]
+        counts = np.bincount(keys, minlength=n_index * len(values)).reshape(n_index, -1)
+        blocks.append(pd.DataFrame(counts[index_order][:, order], index=index_values,
+                                   columns=pd.Index(values.take(order), name=column)))
+    return counts_table(blocks)
+
+
+def counts_table(blocks):
+    """Return the tables of counts in ``blocks`` side by side, as the tutorial loop has them.
+
+    Every block has the counts of the values of one column (zero where a
+    combination does not occur) and the blocks may have different rows.
+    Like ``pivot_table``, a combination that does not occur is NaN and
+    makes every column of its block float; a row without any count is not
+    in the table at all.
+    """
+    if not blocks:
+        return pd.DataFrame()
+    table = pd.concat(blocks, axis=1).sort_index().fillna(0).astype('int64')
+    table = table[table.to_numpy().any(axis=1)]
+    parts = []
+    start = 0
+    for block in blocks:
+        part = table.iloc[:, start:start + block.shape[1]]
+        start += block.shape[1]
+        if not part.to_numpy().all():
+            part = part.astype('float64').where(part > 0)
+        parts.append(part)
+    # pd.concat keeps the column name only if there is a single table
+    return pd.concat(parts, axis=1) if len(parts) > 1 else parts[0]
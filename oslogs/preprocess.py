@@ -0,0 +1,107 @@
+"""Preprocess the logfile of every subject in a pool of processes.
+
+``content/10_dataframes/datawrangling.ipynb`` concatenates all logfiles and
+then trims the columns, casts the types, keeps the blocks before 11 and
+recodes ``subject_nr`` on the whole table. Those steps only ever look at the
+rows of one subject, so ``preprocess_subjects`` runs them per logfile in
+worker processes (pandas holds the GIL for most of this, so threads would
+not help) and only concatenates the small, typed results. With
+``aggregate`` the workers reduce every subject to a table of its own, e.g.
+its trial counts, and only those tables come back.
+"""
+import functools
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from . import chunked, columnar, merge, sources
+from .recode import recode_values
+
+# logfiles per task: fewer round trips to the workers for many small files
+BATCH_SIZE = 16
+PROCESSES = os.cpu_count() or 1
+
+
+def preprocess_frame(frame, columns=chunked.INCLUDE_COLUMNS, max_block=chunked.MAX_BLOCK,
+                     recode=None, dtypes=columnar.LOG_DTYPES):
+    """Trim, filter, recode and type the trials in ``frame``, like the tutorial.
+
+    Keeps ``columns`` (missing ones are left empty), drops the rows of
+    blocks from ``max_block`` on, maps the subject numbers with ``recode``
+    (see ``recode.recode_values``) and applies ``dtypes`` (see
+    ``columnar.apply_dtypes``).
+    """
+    frame = frame.reindex(columns=columns)
+    if max_block is not None:
+        frame = frame[pd.to_numeric(frame['block'], errors='coerce') < max_block]
+    if recode is not None:
+        frame['subject_nr'] = recode_values(frame['subject_nr'], recode, unknown='keep')
+    return columnar.apply_dtypes(frame.reset_index(drop=True), dtypes)
+
+
+def preprocess_logfile(item, aggregate=None, **options):
+    """Read logfile ``item`` and return ``preprocess_frame`` of it, or ``aggregate`` of that.
+
+    ``item`` is a path or a (name, bytes) pair with the content of the file.
+    """
+    name, data = (item, None) if isinstance(item, (str, os.PathLike)) else item
+    columns = options.get('columns', chunked.INCLUDE_COLUMNS)
+    try:
+        frame = pd.read_csv(name if data is None else io.BytesIO(data),
+                            usecols=set(columns).__contains__)
+    except pd.errors.EmptyDataError:
+        frame = pd.DataFrame()
+    try:
+        frame = preprocess_frame(frame, **options)
+    except ValueError as error:
+        raise ValueError('{}: {}'.format(name, error)) from None
+    return frame if aggregate is None else aggregate(frame)
+
+
+def _preprocess_batch(batch, aggregate, options):
+    return [preprocess_logfile(item, aggregate, **options) for item in batch]
+
+
+def _batches(items, batch_size):
+    batch = []
+    for item in items:
+        if not isinstance(item, (str, os.PathLike)):
+            # archive members cannot be sent to another process, their content can
+            with sources.open_logfile(item) as fhand:
+                item = (str(item), fhand.read())
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def preprocess_subjects(src, pattern='*', exclude=(), columns=chunked.INCLUDE_COLUMNS,
+                        max_block=chunked.MAX_BLOCK, recode=None, dtypes=columnar.LOG_DTYPES,
+                        aggregate=None, processes=PROCESSES, batch_size=BATCH_SIZE):
+    """Preprocess the logfiles in ``src`` in ``processes`` worker processes.
+
+    ``src`` is what ``merge.merge_logfiles`` accepts. Every logfile goes
+    through ``preprocess_frame`` in a worker and the results are
+    concatenated in file order, keeping the categories. ``aggregate`` is
+    applied to each preprocessed logfile in the worker and must be
+    picklable: a module-level function or a ``functools.partial`` of one,
+    e.g. ``functools.partial(pivot.count_by, columns=['task_type'])``. Its
+    results are concatenated. With ``processes=1`` everything runs in
+    this process.
+    """
+    options = dict(columns=columns, max_block=max_block, recode=recode, dtypes=dtypes)
+    work = functools.partial(_preprocess_batch, aggregate=aggregate, options=options)
+    with merge.open_sources(src, None, pattern, exclude) as items:
+        if processes == 1:
+            results = [result for item in items for result in work([item])]
+        else:
+            batches = merge.ordered_map(work, _batches(items, batch_size), processes,
+                                        executor=ProcessPoolExecutor)
+            results = [result for batch in batches for result in batch]
+    if aggregate is not None:
+        return pd.concat(results) if results else pd.DataFrame()
+    return columnar.combine(results)
@@ -0,0 +1,148 @@
+"""Lazy queries over logfiles: read only the columns and rows you need.
+
+``content/10_dataframes/datawrangling.ipynb`` reads all 347 columns of
+every logfile, and only then selects ``include_columns`` and filters the rows
+with ``df_trim[df_trim['block'] < 11]`` and ``correct == 1``. A ``LogQuery``
+collects the same steps without reading anything, and ``collect()`` pushes
+them down into the reader:
+
+    df = (scan_logs('data')
+          .select(include_columns)
+          .filter('block', '<', 11)
+          .filter('correct', '==', 1)
+          .collect())
+
+From csv logfiles only the selected and filtered columns are converted
+(``usecols``), and every block of rows is filtered as soon as it is read, so
+the full table never exists in memory. From a Parquet file written by
+``columnar.merge_columnar`` only those columns are read and the filters are
+applied by pyarrow while reading, skipping whole row groups where possible.
+"""
+import operator
+import os
+
+import pandas as pd
+
+from . import columnar, merge, sources
+
+# the comparisons a filter can use; these are also the ones pyarrow understands
+OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda values, value: values.isin(value),
+    'not in': lambda values, value: ~values.isin(value),
+}
+
+# rows per block when reading csv files
+CHUNK_ROWS = 1 << 16
+
+
+class LogQuery:
+    """A query over the logfiles in ``src``; nothing is read until ``collect``.
+
+    ``src`` is what ``merge.merge_logfiles`` accepts (a folder, an archive
+    or a list of paths, with ``pattern`` and ``exclude``) or a Parquet or
+    Feather file. ``select`` and ``filter`` return a new query.
+    """
+
+    def __init__(self, src, pattern='*', exclude=(), columns=None, filters=()):
+        self.src = src
+        self.pattern = pattern
+        self.exclude = exclude
+        self.columns = columns
+        self.filters = tuple(filters)
+
+    def _replace(self, **changes):
+        args = dict(src=self.src, pattern=self.pattern, exclude=self.exclude,
+                    columns=self.columns, filters=self.filters)
+        args.update(changes)
+        return LogQuery(**args)
+
+    def select(self, columns):
+        """Keep only ``columns``, in this order."""
+        return self._replace(columns=list(columns))
+
+    def filter(self, column, op, value):
+        """Keep only the rows where ``column op value`` holds, e.g. ``('block', '<', 11)``."""
+        if op not in OPERATORS:
+            raise ValueError('unknown operator {!r}, use one of {}'.format(op, ', '.join(OPERATORS)))
+        return self._replace(filters=self.filters + ((column, op, value),))
+
+    def needed_columns(self):
+        """Return the columns that have to be read, or None for all of them."""
+        if self.columns is None:
+            return None
+        return merge.union_columns([self.columns, [column for column, _, _ in self.filters]])
+
+    def __repr__(self):
+        steps = ['scan_logs({!r})'.format(self.src)]
+        if self.columns is not None:
+            steps.append('select({!r})'.format(self.columns))
+        steps.extend('filter({!r}, {!r}, {!r})'.format(*condition) for condition in self.filters)
+        return '.'.join(steps)
+
+    def collect(self, dtypes=None, workers=merge.DEFAULT_WORKERS):
+        """Run the query and return a DataFrame (with a fresh index).
+
+        ``dtypes`` casts columns afterwards, e.g. ``columnar.LOG_DTYPES``.
+        Logfiles are read by ``workers`` threads and concatenated in order.
+        """
+        if isinstance(self.src, (str, os.PathLike)) and columnar.columnar_format(self.src):
+            frame = self._collect_columnar()
+        else:
+            with merge.open_sources(self.src, None, self.pattern, self.exclude) as items:
+                frames = list(merge.ordered_map(self.read_logfile, items, workers))
+            frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.columns)
+        return frame if dtypes is None else columnar.apply_dtypes(frame, dtypes)
+
+    def _mask(self, frame):
+        mask = None
+        for column, op, value in self.filters:
+            if column not in frame:
+                raise KeyError('cannot filter on missing column {}'.format(column))
+            condition = OPERATORS[op](frame[column], value)
+            mask = condition if mask is None else mask & condition
+        return mask
+
+    def apply(self, frame):
+        """Return the rows of ``frame`` that pass the filters, with the selected columns."""
+        mask = self._mask(frame)
+        if mask is not None:
+            frame = frame[mask.fillna(False).astype(bool)]
+        return frame if self.columns is None else frame[self.columns]
+
+    def read_logfile(self, item):
+        """Read logfile ``item`` block by block and return its rows that pass the query."""
+        needed = self.needed_columns()
+        usecols = None if needed is None else set(needed).__contains__
+        blocks = []
+        with sources.open_logfile(item) as fhand:
+            try:
+                reader = pd.read_csv(fhand, usecols=usecols, chunksize=CHUNK_ROWS)
+            except pd.errors.EmptyDataError:
+                reader = []
+            for block in reader:
+                if needed is not None:
+                    # columns this logfile does not have are left empty
+                    block = block.reindex(columns=needed)
+                blocks.append(self.apply(block))
+        return pd.concat(blocks, ignore_index=True) if blocks else pd.DataFrame(columns=self.columns)
+
+    def _collect_columnar(self):
+        needed = self.needed_columns()
+        if columnar.columnar_format(self.src) == 'parquet':
+            frame = pd.read_parquet(self.src, columns=needed, filters=list(self.filters) or None)
+        else:
+            frame = self.apply(pd.read_feather(self.src, columns=needed))
+        if self.columns is not None:
+            frame = frame[self.columns]
+        return frame.reset_index(drop=True)
+
+
+def scan_logs(src, pattern='*', exclude=()):
+    """Return a ``LogQuery`` over the logfiles in ``src`` that selects everything."""
+    return LogQuery(src, pattern, exclude)
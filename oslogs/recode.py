@@ -0,0 +1,120 @@
+"""Recode (anonymise) subject numbers with a mapping table, in one pass.
+
+``content/10_dataframes/datawrangling.ipynb`` renumbers the subjects with
+one ``replace`` per subject::
+
+    df_trim_blocks['subject_nr'] = df_trim_blocks['subject_nr'].replace(3, 1)
+    df_trim_blocks['subject_nr'] = df_trim_blocks['subject_nr'].replace(4, 2)
+
+Every call scans the whole column, so k subjects cost k passes. Here the
+mapping is built once (``build_mapping``) and ``recode_values`` applies it
+in a single pass: the column is factorized into integer codes, only the
+distinct values are looked up in the mapping, and the codes pick the new
+values. Of categorical columns only the categories are renamed, unless two
+categories get the same new value, which merges them. ``save_mapping``
+stores the mapping as a csv file, so the same subjects get the same numbers
+next time (and new subjects get new ones).
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+METHODS = ('order', 'sorted', 'hash')
+HASH_LENGTH = 12
+
+
+def _new_values(values, method, salt, start):
+    if method == 'hash':
+        if not salt:
+            raise ValueError('method hash needs a salt, or the codes can be recomputed from the numbers')
+        codes = [hashlib.sha256('{}{}'.format(salt, value).encode()).hexdigest()[:HASH_LENGTH]
+                 for value in values]
+        if len(set(codes)) < len(codes):
+            raise ValueError('hash codes collide, use a different salt')
+        return codes
+    return np.arange(start, start + len(values))
+
+
+def build_mapping(values, method='order', salt=None, existing=None, name='subject_nr'):
+    """Return a mapping (a Series of new values, indexed by the old ones) for ``values``.
+
+    ``method`` 'order' numbers the distinct values 1, 2, ... in order of
+    first appearance, like the tutorial (3 -> 1, 4 -> 2); 'sorted' numbers
+    them in sorted order; 'hash' gives every value a code from a salted
+    SHA-256 hash, so codes do not reveal the order of participation.
+    Values already in mapping ``existing`` keep their new value and new
+    numbers continue after the highest one there.
+    """
+    if method not in METHODS:
+        raise ValueError('unknown method {!r}, use one of {}'.format(method, ', '.join(METHODS)))
+    uniques = pd.unique(pd.Series(values).dropna())
+    # a column of subject numbers with missing values is read as floats
+    if uniques.dtype.kind == 'f' and np.all(np.mod(uniques, 1) == 0):
+        uniques = uniques.astype(np.int64)
+    if method == 'sorted':
+        uniques = np.sort(uniques)
+    start = 1
+    if existing is not None and len(existing):
+        uniques = uniques[~pd.Index(uniques).isin(existing.index)]
+        if method != 'hash':
+            start = int(existing.max()) + 1
+    mapping = pd.Series(_new_values(uniques, method, salt, start), index=pd.Index(uniques, name=name),
+                        name='new_' + name)
+    if existing is not None and len(existing):
+        mapping = pd.concat([existing, mapping.rename(existing.name)])
+    if not mapping.is_unique:
+        raise ValueError('two subjects would get the same new value')
+    return mapping
+
+
+def recode_values(values, mapping, unknown='error'):
+    """Return ``values`` (a Series) with every value replaced by its new value in ``mapping``.
+
+    ``mapping`` is a Series from ``build_mapping`` or a dict. Values that
+    are not in it raise a KeyError with ``unknown='error'`` and are kept
+    with ``unknown='keep'`` (what ``replace`` does). Missing values stay
+    missing.
+    """
+    if isinstance(mapping, dict):
+        mapping = pd.Series(mapping)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        new = _lookup(values.cat.categories, mapping, unknown)
+        if pd.Index(new).is_unique:
+            return values.cat.rename_categories(new)
+        # categories that get the same new value (e.g. a value that is kept
+        # and one that is recoded to it) become one category
+        new_codes, categories = pd.factorize(new)
+        codes = values.cat.codes.to_numpy()
+        codes = np.where(codes < 0, -1, new_codes.take(codes))
+        return pd.Series(pd.Categorical.from_codes(codes, categories, ordered=values.cat.ordered),
+                         index=values.index, name=values.name)
+    codes, uniques = pd.factorize(values)
+    new = _lookup(pd.Index(uniques), mapping, unknown)
+    if (codes < 0).any():
+        # code -1 (a missing value) takes the last item
+        new = np.append(new, np.nan)
+    return pd.Series(new.take(codes), index=values.index, name=values.name)
+
+
+def _lookup(uniques, mapping, unknown):
+    """Return the new values of the distinct values ``uniques``, as an array."""
+    positions = pd.Index(mapping.index).get_indexer(uniques)
+    missing = positions < 0
+    if not missing.any():
+        return mapping.to_numpy().take(positions)
+    if unknown == 'error':
+        raise KeyError('no new value for {}'.format(', '.join(map(str, uniques[missing][:5]))))
+    new = np.asarray(uniques, dtype=object).copy()
+    new[~missing] = mapping.to_numpy().take(positions[~missing])
+    return pd.Index(new).infer_objects().to_numpy()
+
+
+def save_mapping(mapping, path):
+    """Write ``mapping`` to csv file ``path``, one old,new pair per line."""
+    mapping.to_csv(path, header=True)
+
+
+def load_mapping(path):
+    """Read a mapping written by ``save_mapping``."""
+    return pd.read_csv(path, index_col=0).iloc[:, 0]
@@ -0,0 +1,85 @@
+"""Reshape wide repeated-measures tables (``t1_min``, ``t1_max``, ...) into tidy ones.
+
+The tidy data section of ``content/10_dataframes/dataframes_python_lessons.ipynb``
+tidies ``df_messy`` in three steps::
+
+    df_messy = pd.melt(df_messy, id_vars=['name', 'age'], var_name='time_minmax', value_name='score')
+    df_messy[['time','minmax']] = df_messy.time_minmax.str.split("_", expand = True)
+    df_messy = df_messy.pivot_table(index=['name','age','time'], columns='minmax', values='score')
+
+``melt`` copies the table into one long column, ``str.split`` splits the same
+few column names once for every row, and ``pivot_table`` groups the long
+table back into columns. ``wide_to_long`` splits every column name once,
+which gives a grid of (time, measure) -> column, and builds the tidy table
+straight from the block of values: when the columns are ordered time by time
+(as in ``df_messy``) the tidy block is a reshaped view of the wide one,
+otherwise it takes one indexing pass.
+"""
+import numpy as np
+import pandas as pd
+
+
+def split_columns(columns, sep='_'):
+    """Split column names like ``t1_min`` at the first ``sep`` into a grid.
+
+    Returns the distinct first parts (e.g. times), the distinct second parts
+    (measures), both in order of appearance, and an array with the position
+    in ``columns`` of every (first, second) pair, -1 if there is no such
+    column.
+    """
+    firsts = {}
+    seconds = {}
+    pairs = []
+    for column in columns:
+        first, found, second = str(column).partition(sep)
+        if not found:
+            raise ValueError('column {!r} has no {!r} to split at'.format(column, sep))
+        pairs.append((firsts.setdefault(first, len(firsts)), seconds.setdefault(second, len(seconds))))
+    grid = np.full((len(firsts), len(seconds)), -1, dtype=np.intp)
+    for position, (row, col) in enumerate(pairs):
+        if grid[row, col] >= 0:
+            raise ValueError('columns {!r} and {!r} are the same pair'.format(
+                columns[grid[row, col]], columns[position]))
+        grid[row, col] = position
+    return list(firsts), list(seconds), grid
+
+
+def wide_to_long(frame, id_vars, sep='_', name='time', sort=False):
+    """Return the tidy version of ``frame``: a row per row of ``frame`` and time.
+
+    The columns that are not in ``id_vars`` are named ``<time><sep><measure>``;
+    the result has the ``id_vars``, a categorical column ``name`` with the
+    times and a column per measure (missing combinations are NaN). With
+    ``sort`` the rows are sorted by the ``id_vars`` and time, and the
+    measures by name, which is the table the tutorial's ``pivot_table`` makes
+    (without its index).
+    """
+    id_vars = list(id_vars)
+    value_columns = [column for column in frame.columns if column not in id_vars]
+    times, measures, grid = split_columns(value_columns, sep)
+    if sort:
+        time_order = np.argsort(times, kind='stable')
+        measure_order = np.argsort(measures, kind='stable')
+        grid = grid[time_order][:, measure_order]
+        times = [times[i] for i in time_order]
+        measures = [measures[i] for i in measure_order]
+        # the times of a row are in order already, so sorting the wide rows
+        # sorts the tidy table
+        frame = frame.sort_values(id_vars, kind='stable')
+
+    n_rows, n_times = len(frame), len(times)
+    values = frame[value_columns].to_numpy()
+    if (grid.ravel() == np.arange(grid.size)).all():
+        # the columns are t1_a, t1_b, t2_a, t2_b, ...: every row of the wide
+        # block is n_times rows of the tidy block
+        block = values.reshape(n_rows * n_times, len(measures))
+    else:
+        if (grid < 0).any():
+            values = np.column_stack([values, np.full(n_rows, np.nan)])
+            grid = np.where(grid < 0, values.shape[1] - 1, grid)
+        block = values[:, grid.ravel()].reshape(n_rows * n_times, len(measures))
+
+    rows = np.repeat(np.arange(n_rows), n_times)
+    result = frame[id_vars].take(rows).reset_index(drop=True)
+    result[name] = pd.Categorical.from_codes(np.tile(np.arange(n_times), n_rows), times)
+    return pd.concat([result, pd.DataFrame(block, columns=measures)], axis=1)
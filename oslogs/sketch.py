@@ -0,0 +1,321 @@
+"""Mergeable summaries of a column of numbers, for data that does not fit in memory.
+
+``df_correct['response_time'].describe()`` in
+``content/10_dataframes/datawrangling.ipynb`` needs the whole column: the
+quartiles come from sorting it. The summaries here are updated one block of
+rows at a time and two summaries can be merged, so a column can be
+described block by block (or file by file, in parallel) and the parts
+combined at the end:
+
+- ``Moments`` keeps the count, mean, variance, minimum and maximum exactly;
+- ``QuantileSketch`` keeps a few thousand numbers from which any quantile
+  can be estimated (a KLL sketch: the rank of an estimate is off by about
+  ``1.7 / k`` of the count);
+- ``Histogram`` counts the numbers in fixed bins; with the default bins
+  of 1 ms it holds every rounded response time exactly, and can be drawn
+  with any coarser bins, like ``ax.hist(df['response_time'], bins=30)`` in
+  ``content/11_plotting/plotting_behavioral_data.ipynb``.
+
+``describe(moments, sketch)`` combines the first two into the Series
+``describe()`` returns. A ``Summary`` holds all three. ``summarize`` makes a
+``Summary`` per group of a DataFrame, and ``summarize_logfiles`` does that
+for every logfile in a pool of threads and merges the summaries of the same
+group, so describe tables (``describe_groups``) and histograms of hundreds of
+millions of trials come from about 100 kB per group.
+"""
+import os
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from . import columnar, merge, query
+
+# size of the smallest compactor of a QuantileSketch
+SKETCH_K = 1000
+DESCRIBE_PERCENTILES = (0.25, 0.5, 0.75)
+# Histogram bins: 0 to 10 s in steps of 1 ms
+HISTOGRAM_RANGE = (0, 10000)
+HISTOGRAM_WIDTH = 1
+
+
+@dataclass
+class Moments:
+    """Count, mean, sum of squared deviations (``m2``), minimum and maximum."""
+    count: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+    min: float = np.nan
+    max: float = np.nan
+
+    def update(self, values):
+        """Add the numbers in ``values`` (missing values are left out)."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            mean = values.mean()
+            self.merge(Moments(len(values), mean, ((values - mean) ** 2).sum(),
+                               values.min(), values.max()))
+        return self
+
+    def merge(self, other):
+        """Add the numbers summarised by ``other``."""
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2, self.min, self.max = (
+                other.count, other.mean, other.m2, other.min, other.max)
+            return self
+        # Chan et al.'s formula for combining the variance of two parts
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.mean += delta * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def std(self):
+        """The sample standard deviation, like ``Series.std()``."""
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+
+class QuantileSketch:
+    """Approximate quantiles of a stream of numbers (a KLL sketch).
+
+    The sketch has a stack of compactors. Numbers go into the first one;
+    when a compactor is full it is sorted and every other number (starting
+    at a random first or second one) moves up a level, where each number
+    stands for twice as many. Higher levels hold fewer numbers, so the
+    sketch stays at about ``3 * k`` numbers however many it has seen.
+    ``seed`` makes the choices, and so the estimates, reproducible.
+    """
+
+    def __init__(self, k=SKETCH_K, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        """The number of numbers the sketch keeps."""
+        return sum(len(items) for items in self.levels)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        """Add the numbers in ``values`` (missing values are left out)."""
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Add the numbers summarised by sketch ``other``."""
+        self.levels.extend(np.empty(0) for _ in range(len(other.levels) - len(self.levels)))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # with an odd number of items the largest one stays behind
+                odd = len(items) % 2
+                pairs = items[:len(items) - odd]
+                promoted = pairs[self._rng.integers(2)::2]
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+                self.levels[level] = items[len(items) - odd:]
+            level += 1
+
+    def quantile(self, q):
+        """Estimate quantile(s) ``q``, interpolated like ``Series.quantile``."""
+        items = np.concatenate(self.levels)
+        if not len(items):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        weights = np.concatenate([np.full(len(level), 2.0 ** i) for i, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, weights = items[order], weights[order]
+        # the position (0 to count - 1) in the sorted column that each item
+        # stands in the middle of; with all weights 1 this is exact
+        positions = np.cumsum(weights) - (weights + 1) / 2
+        return np.interp(np.asarray(q) * (self.count - 1), positions, items)
+
+
+def describe(moments, sketch, percentiles=DESCRIBE_PERCENTILES, name=None):
+    """Return what ``Series.describe()`` would, from a ``Moments`` and a ``QuantileSketch``.
+
+    The count, mean, std, min and max are exact; the percentiles are
+    estimates (exact as long as the sketch has not compacted anything).
+    """
+    quantiles = sketch.quantile(np.asarray(percentiles))
+    index = ['count', 'mean', 'std', 'min']
+    values = [moments.count, moments.mean if moments.count else np.nan, moments.std, moments.min]
+    for percentile, value in zip(percentiles, quantiles):
+        index.append('{:g}%'.format(100 * percentile))
+        values.append(value)
+    index.append('max')
+    values.append(moments.max)
+    return pd.Series(values, index=index, name=name, dtype=float)
+
+
+class Histogram:
+    """Counts of numbers in bins of ``width`` from ``start`` to ``stop``.
+
+    Numbers below ``start`` or from ``stop`` on are counted in ``under`` and
+    ``over``. Histograms with the same bins can be merged.
+    """
+
+    def __init__(self, start=HISTOGRAM_RANGE[0], stop=HISTOGRAM_RANGE[1], width=HISTOGRAM_WIDTH):
+        self.start = start
+        self.width = width
+        self.counts = np.zeros(int(np.ceil((stop - start) / width)), dtype=np.int64)
+        self.under = 0
+        self.over = 0
+
+    @property
+    def edges(self):
+        return self.start + self.width * np.arange(len(self.counts) + 1)
+
+    def update(self, values):
+        """Add the numbers in ``values`` (missing values are left out)."""
+        values = np.asarray(values, dtype=float)
+        bins = np.floor((values[~np.isnan(values)] - self.start) / self.width)
+        inside = (bins >= 0) & (bins < len(self.counts))
+        self.under += int((bins < 0).sum())
+        self.over += int((bins >= len(self.counts)).sum())
+        self.counts += np.bincount(bins[inside].astype(np.intp), minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        """Add the counts of ``other``, which must have the same bins."""
+        if (other.start, other.width, len(other.counts)) != (self.start, self.width, len(self.counts)):
+            raise ValueError('cannot merge histograms with different bins')
+        self.counts += other.counts
+        self.under += other.under
+        self.over += other.over
+        return self
+
+    def rebin(self, bins=10, range=None):
+        """Return (counts, edges) for ``bins`` equal bins over ``range``, like ``np.histogram``.
+
+        ``range`` defaults to the lowest and highest non-empty bin. Every
+        number counts as the left edge of its bin, which is exact for whole
+        numbers in bins of width 1.
+        """
+        left = self.edges[:-1]
+        if range is None:
+            filled = np.flatnonzero(self.counts)
+            range = (left[filled[0]], left[filled[-1]]) if len(filled) else (self.start, self.start + 1)
+        return np.histogram(left, bins=bins, range=range, weights=self.counts)
+
+    def plot(self, ax=None, bins=30, range=None, **kwargs):
+        """Draw the histogram with ``bins`` bins, like ``ax.hist(values, bins=bins)``."""
+        import matplotlib.pyplot as plt
+        ax = plt.gca() if ax is None else ax
+        counts, edges = self.rebin(bins, range)
+        kwargs.setdefault('fill', True)
+        ax.stairs(counts, edges, **kwargs)
+        return ax
+
+
+@dataclass
+class Summary:
+    """``Moments``, a ``QuantileSketch`` and a ``Histogram`` of the same numbers."""
+    moments: Moments = field(default_factory=Moments)
+    quantiles: QuantileSketch = field(default_factory=QuantileSketch)
+    histogram: Histogram = field(default_factory=Histogram)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        self.moments.update(values)
+        self.quantiles.update(values)
+        self.histogram.update(values)
+        return self
+
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.quantiles.merge(other.quantiles)
+        self.histogram.merge(other.histogram)
+        return self
+
+    def describe(self, percentiles=DESCRIBE_PERCENTILES, name=None):
+        return describe(self.moments, self.quantiles, percentiles, name)
+
+
+def summarize(frame, by=None, value='response_time'):
+    """Return a ``Summary`` of column ``value``, or a dict of them per group of ``by`` columns.
+
+    Group keys are tuples, like the keys of ``frame.groupby(list(by))``.
+    """
+    if not by:
+        return Summary().update(frame[value].to_numpy(dtype=float, na_value=np.nan))
+    summaries = {}
+    for key, group in frame.groupby(list(by), observed=True, sort=False)[value]:
+        summaries[key] = Summary().update(group.to_numpy(dtype=float, na_value=np.nan))
+    return summaries
+
+
+def merge_summaries(parts):
+    """Merge dicts of ``Summary`` per group into one dict (the first summaries are reused)."""
+    merged = {}
+    for summaries in parts:
+        for key, summary in summaries.items():
+            if key in merged:
+                merged[key].merge(summary)
+            else:
+                merged[key] = summary
+    return merged
+
+
+def summarize_logfiles(src, by=('subject_nr',), value='response_time', filters=(), pattern='*',
+                       exclude=(), workers=merge.DEFAULT_WORKERS):
+    """Return a ``Summary`` of ``value`` per group of ``by`` over the logfiles in ``src``.
+
+    ``filters`` are (column, operator, value) conditions as for
+    ``query.LogQuery.filter``, e.g. ``[('correct', '==', 1)]`` for the
+    tutorial's ``df_correct``. Every logfile is read (only the needed
+    columns) and summarised by one of ``workers`` threads; a Parquet or
+    Feather file is summarised block by block. With ``by=()`` the result is
+    a single ``Summary``.
+    """
+    by = list(by)
+    lazy = query.LogQuery(src, pattern, exclude, by + [value], filters)
+
+    def summarize_part(frame):
+        return summarize(frame, by, value) if by else {(): summarize(frame, None, value)}
+
+    if isinstance(src, (str, os.PathLike)) and columnar.columnar_format(src):
+        # chunked imports this module
+        from .chunked import iter_chunks
+        chunks = iter_chunks(src, columns=lazy.needed_columns())
+        summaries = merge_summaries(summarize_part(lazy.apply(chunk)) for chunk in chunks)
+    else:
+        with merge.open_sources(src, None, pattern, exclude) as items:
+            summaries = merge_summaries(merge.ordered_map(
+                lambda item: summarize_part(lazy.read_logfile(item)), items, workers))
+    return summaries if by else summaries.get((), Summary())
+
+
+def describe_groups(summaries, names=None, percentiles=DESCRIBE_PERCENTILES):
+    """Return a table like ``frame.groupby(names)[value].describe()`` from ``summaries``."""
+    keys = sorted(summaries)
+    rows = [summaries[key].describe(percentiles) for key in keys]
+    if keys and len(keys[0]) == 1:
+        index = pd.Index([key[0] for key in keys], name=names[0] if names else None)
+    else:
+        index = pd.MultiIndex.from_tuples(keys, names=names)
+    return pd.DataFrame(rows, index=index)
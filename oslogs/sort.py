@@ -0,0 +1,188 @@
+"""Sort a merged logfile by participant and trial, and drop duplicate rows.
+
+When a participant's logfile is copied twice, or logfiles from several
+machines are merged, the merged file from ``content/07_files/merging_files.ipynb``
+contains duplicate rows and the rows are no longer in trial order.
+``sort_logfile`` fixes that without loading the whole file into memory: it is an
+external merge sort. Rows are read until ``memory`` bytes are used, sorted
+and spilled to a temporary file (a "run"); the runs are then merged into the
+output, dropping rows that are exact copies of a row already written.
+
+Like the tutorial, this assumes one row per line (no line breaks inside
+quoted values). The rows are written exactly as they were read.
+"""
+import heapq
+import io
+import itertools
+import os
+import pickle
+import tempfile
+import time
+from dataclasses import dataclass
+from operator import itemgetter
+
+import pandas as pd
+
+from . import merge
+
+# participant, session, block and the trial counter of the experiment loop
+SORT_KEYS = ['subject_nr', 'session', 'block', 'count_exp_trial_sequence']
+MEMORY = 256 << 20
+
+# rough number of bytes Python needs per row on top of the line itself
+# (the row tuple, the sort key and its values)
+_ROW_OVERHEAD = 120
+_KEY_OVERHEAD = 90
+# rows per pickle in a run file
+_BATCH = 10000
+
+
+@dataclass
+class SortStats:
+    """What ``sort_logfile`` did and how long it took."""
+    rows_read: int = 0
+    rows_written: int = 0
+    duplicates: int = 0
+    runs: int = 0
+    bytes_read: int = 0
+    seconds: float = 0.0
+
+    def __str__(self):
+        return ('Sorted {} rows into {} ({} duplicates dropped, {} runs) in {:.2f} s: '
+                '{:.1f} MB/s'.format(self.rows_read, self.rows_written, self.duplicates,
+                                     self.runs, self.seconds,
+                                     self.bytes_read / 1e6 / self.seconds if self.seconds else 0.0))
+
+
+def sort_value(value):
+    """Return a sort key for csv field ``value``: numbers by value, then text, then empty fields."""
+    try:
+        number = float(value)
+    except ValueError:
+        return (1, value) if value else (2, value)
+    # nan does not compare, so sort it with the text
+    return (0, number) if number == number else (1, value)
+
+
+def _key_indices(header, keys):
+    columns = merge.parse_header(header)
+    not_found = [key for key in keys if key not in columns]
+    if not_found:
+        raise KeyError('columns not found: {}'.format(', '.join(not_found)))
+    return [columns.index(key) for key in keys]
+
+
+def _keys(lines, indices):
+    """Return the sort keys of ``lines``.
+
+    pandas' csv parser only converts the key columns, which is several times
+    faster than splitting all the columns of every row with the csv module.
+    """
+    frame = pd.read_csv(io.BytesIO(b''.join(lines)), header=None, usecols=indices, dtype=object,
+                        keep_default_na=False, skip_blank_lines=False)
+    if len(frame) != len(lines):
+        raise ValueError('cannot sort rows with line breaks inside values')
+    return zip(*[map(sort_value, frame[index].fillna('').tolist()) for index in indices])
+
+
+def _rows(fhand, indices, linesep, stats):
+    """Yield (key, line) for every row in binary file ``fhand``."""
+    while True:
+        lines = list(itertools.islice(fhand, _BATCH))
+        if not lines:
+            return
+        if not lines[-1].endswith(b'\n'):
+            lines[-1] += linesep
+        stats.rows_read += len(lines)
+        stats.bytes_read += sum(map(len, lines))
+        yield from zip(_keys(lines, indices), lines)
+
+
+def _runs(rows, memory, n_keys):
+    """Cut the (key, line) ``rows`` into sorted lists of about ``memory`` bytes.
+
+    Yields (run, last). Every row gets its input position as a tie breaker,
+    so the sort is stable.
+    """
+    run = []
+    used = 0
+    per_row = _ROW_OVERHEAD + _KEY_OVERHEAD * n_keys
+    for position, (key, line) in enumerate(rows):
+        if used >= memory:
+            run.sort()
+            yield run, False
+            run = []
+            used = 0
+        run.append((key, position, line))
+        used += len(line) + per_row
+    run.sort()
+    yield run, True
+
+
+def _spill(run, folder):
+    """Write ``run`` to a temporary file in ``folder`` and return its path."""
+    fd, path = tempfile.mkstemp(suffix='.run', dir=folder)
+    with os.fdopen(fd, 'wb') as fout:
+        for start in range(0, len(run), _BATCH):
+            pickle.dump(run[start:start + _BATCH], fout, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path):
+    with open(path, 'rb') as fhand:
+        while True:
+            try:
+                yield from pickle.load(fhand)
+            except EOFError:
+                return
+
+
+def _unique(rows, stats):
+    """Yield the lines of the sorted ``rows``, leaving out exact duplicates.
+
+    Duplicates have the same key, so only the lines of one key are remembered.
+    """
+    for _, group in itertools.groupby(rows, key=itemgetter(0)):
+        seen = set()
+        for _, _, line in group:
+            if line in seen:
+                stats.duplicates += 1
+                continue
+            seen.add(line)
+            yield line
+
+
+def sort_logfile(src, out, keys=SORT_KEYS, dedupe=True, memory=MEMORY, tmpdir=None):
+    """Sort merged logfile ``src`` by the columns ``keys`` and write it to ``out``.
+
+    Fields that are numbers are compared as numbers, so participant 10 comes
+    after participant 9. Rows with the same keys keep their order. With
+    ``dedupe`` rows that are exact copies of an earlier row are dropped.
+    At most about ``memory`` bytes of rows are kept in memory; the rest is
+    spilled to temporary files in ``tmpdir``. Returns a ``SortStats``.
+    """
+    if os.path.realpath(src) == os.path.realpath(out):
+        raise ValueError('cannot sort {} into itself'.format(src))
+    start = time.perf_counter()
+    stats = SortStats()
+    with open(src, 'rb') as fhand, tempfile.TemporaryDirectory(dir=tmpdir) as folder:
+        header = fhand.readline()
+        linesep = b'\r\n' if header.endswith(b'\r\n') else b'\n'
+        indices = _key_indices(header, keys)
+        runs = []
+        for run, last in _runs(_rows(fhand, indices, linesep, stats), memory, len(keys)):
+            if not last:
+                # spill the run (and let go of it) before the next one is read
+                run = _read_run(_spill(run, folder))
+            runs.append(run)
+        stats.runs = len(runs)
+        merged = heapq.merge(*runs)
+        lines = _unique(merged, stats) if dedupe else map(itemgetter(2), merged)
+
+        with open(out, 'wb', buffering=merge.WRITE_BUFFER) as fout:
+            fout.write(header)
+            for line in lines:
+                fout.write(line)
+                stats.rows_written += 1
+    stats.seconds = time.perf_counter() - start
+    return stats
@@ -0,0 +1,178 @@
+"""Read logfiles straight from zip and tar archives, without extracting them.
+
+The OSF data of the merging tutorial comes as ``data_pilot.zip``. Instead of
+extracting the archive first, the merge functions accept the archive itself
+as source; every member is streamed through the same header check and writer
+as a logfile on disk.
+
+Members of a zip archive are read and decompressed by several threads at
+once. A (compressed) tar archive can only be read from front to back, so its
+members are read one after the other and only the merging itself runs in
+parallel.
+"""
+import fnmatch
+import io
+import os
+import posixpath
+import tarfile
+import threading
+import time
+import zipfile
+
+ZIP_SUFFIXES = ('.zip',)
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_archive(path):
+    """Return whether ``path`` is a zip or tar archive (judged by its name)."""
+    name = os.fspath(path).lower()
+    return name.endswith(ZIP_SUFFIXES + TAR_SUFFIXES) and os.path.isfile(path)
+
+
+class Member:
+    """A logfile inside an archive.
+
+    ``name`` is the path of the archive joined with the path of the member,
+    and ``open()`` returns a binary file object with its content.
+    """
+    __slots__ = ('name', 'size', 'mtime_ns', '_opener')
+
+    def __init__(self, name, size, mtime_ns, opener):
+        self.name = name
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self._opener = opener
+
+    def open(self):
+        return self._opener()
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return 'Member({!r})'.format(self.name)
+
+
+def _selected(member_name, pattern, exclude):
+    # skip the resource forks that macOS adds to zip archives
+    if member_name.startswith('__MACOSX/'):
+        return False
+    basename = posixpath.basename(member_name)
+    return fnmatch.fnmatch(basename, pattern) and basename not in exclude
+
+
+class ZipSource:
+    """The logfiles in a zip archive, in archive order.
+
+    ``pattern`` and ``exclude`` apply to the file names of the members, like
+    in ``merge.list_logfiles``. Use as a context manager to close the archive.
+    Every thread that opens members gets its own handle on the archive.
+    """
+    random_access = True
+
+    def __init__(self, path, pattern='*', exclude=()):
+        self.path = os.fspath(path)
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+        self.members = []
+        for info in self._zip().infolist():
+            if info.is_dir() or not _selected(info.filename, pattern, exclude):
+                continue
+            # zip files store the local time, with two second resolution
+            mtime_ns = int(time.mktime(info.date_time + (0, 0, -1))) * 10**9
+            opener = (lambda info=info: self._zip().open(info))
+            self.members.append(Member(os.path.join(self.path, info.filename),
+                                       info.file_size, mtime_ns, opener))
+
+    def _zip(self):
+        handle = getattr(self._local, 'zip', None)
+        if handle is None:
+            handle = self._local.zip = zipfile.ZipFile(self.path)
+            with self._lock:
+                self._handles.append(handle)
+        return handle
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def close(self):
+        with self._lock:
+            for handle in self._handles:
+                handle.close()
+            self._handles.clear()
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TarSource:
+    """The logfiles in a (compressed) tar archive, in archive order.
+
+    Every iteration streams through the archive once. The content of a member
+    is read while iterating, because a compressed stream cannot go back;
+    ``stream`` leaves that to the caller.
+    """
+    random_access = False
+
+    def __init__(self, path, pattern='*', exclude=()):
+        self.path = os.fspath(path)
+        self.pattern = pattern
+        self.exclude = exclude
+
+    def __iter__(self):
+        for member in self.stream():
+            with member.open() as fhand:
+                data = fhand.read()
+            yield Member(member.name, member.size, member.mtime_ns, lambda data=data: io.BytesIO(data))
+
+    def stream(self):
+        """Yield the members without reading their content.
+
+        A member can only be opened until the next one is yielded, and
+        whatever is not read of it is skipped.
+        """
+        with tarfile.open(self.path, 'r|*') as tar:
+            for info in tar:
+                if not info.isfile() or not _selected(info.name, self.pattern, self.exclude):
+                    continue
+                yield Member(os.path.join(self.path, info.name), info.size,
+                             int(info.mtime * 1e9), lambda info=info: tar.extractfile(info))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_archive(path, pattern='*', exclude=()):
+    """Return a ``ZipSource`` or ``TarSource`` for archive ``path``."""
+    if os.fspath(path).lower().endswith(ZIP_SUFFIXES):
+        return ZipSource(path, pattern, exclude)
+    return TarSource(path, pattern, exclude)
+
+
+def open_logfile(item):
+    """Open a logfile path or archive ``Member`` for reading bytes."""
+    if isinstance(item, (str, os.PathLike)):
+        return open(item, 'rb')
+    return item.open()
+
+
+def file_stat(item):
+    """Return the (size, mtime_ns) of a logfile path or archive ``Member``."""
+    if isinstance(item, (str, os.PathLike)):
+        stat = os.stat(item)
+        return stat.st_size, stat.st_mtime_ns
+    return item.size, item.mtime_ns
@@ -0,0 +1,243 @@
+"""Cache the intermediate tables of an analysis on disk, stage by stage.
+
+Every run of ``content/10_dataframes/datawrangling.ipynb`` starts again from
+the raw logfiles to make ``df_trim``, ``df_trim_blocks`` and ``df_correct``,
+and ``plotting_behavioral_data.ipynb`` then parses ``df_cleaned.csv`` again.
+A ``Pipeline`` is a set of named stages, each a function of the stages it
+needs (its arguments have their names)::
+
+    pipeline = Pipeline()
+
+    @pipeline.stage(inputs=['data'])
+    def df():
+        return pd.concat(pd.read_csv(path) for path in list_logfiles('data'))
+
+    @pipeline.stage
+    def df_trim(df, columns=INCLUDE_COLUMNS):
+        return df[columns]
+
+    df_trim = pipeline.get('df_trim')
+
+``get`` returns a stage from the cache if it is there, and otherwise computes
+it, getting the stages it needs the same way. A stage is cached under a hash
+of its source code, the values of its keyword arguments, the size and
+modification time of its ``inputs`` and the hashes of the stages it needs.
+Editing a stage therefore only recomputes that stage and the ones after it;
+stages before it come from the cache. Values used by a stage should be
+passed as keyword arguments (like ``columns`` above), not read from global
+variables, or changing them will not be noticed.
+
+Tables are stored as Feather files (with pyarrow installed), which keep
+their column types and load quickly; everything else is pickled. When the
+cache grows beyond ``max_bytes`` the stages that were used least recently
+are deleted.
+"""
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import time
+
+import pandas as pd
+
+from . import cache, chunked, columnar, downloads, merge, sources
+from .recode import recode_values
+
+CACHE_DIR = os.path.join(downloads.CACHE_DIR, 'stages')
+MAX_BYTES = 2 << 30
+FORMATS = ('.feather', '.pickle')
+
+
+def _input_id(path):
+    """Return the names, sizes and modification times of the files in ``path``."""
+    if os.path.isdir(path):
+        paths = sorted(merge.list_logfiles(path))
+    else:
+        paths = [path]
+    return repr([(os.path.basename(item),) + sources.file_stat(item) for item in paths]).encode()
+
+
+def _store(value, path):
+    """Write ``value`` next to ``path`` (no suffix) and return the file name."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        suffix = '.pickle'
+        if isinstance(value, pd.DataFrame):
+            try:
+                value.to_feather(tmp)
+                suffix = '.feather'
+            except (ImportError, ValueError, TypeError):
+                # no pyarrow, or a table Feather cannot hold (an index other
+                # than 0, 1, 2, ... or MultiIndex columns)
+                pass
+        if suffix == '.pickle':
+            with open(tmp, 'wb') as fout:
+                pickle.dump(value, fout, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path + suffix)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path + suffix
+
+
+def _load(path):
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    with open(path, 'rb') as fhand:
+        return pickle.load(fhand)
+
+
+class Pipeline:
+    """Named stages whose results are cached in ``cache_dir``.
+
+    ``history`` lists (stage, 'cached' or 'computed', seconds) for every
+    stage ``get`` returned or needed.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stages = {}
+        self.history = []
+
+    def stage(self, func=None, name=None, inputs=()):
+        """Add ``func`` as a stage; use as ``@pipeline.stage`` or ``@pipeline.stage(inputs=[...])``.
+
+        The arguments of ``func`` without a default are the stages it needs.
+        ``inputs`` are files or folders the stage reads; when one of their
+        files changes, the stage is computed again.
+        """
+        def add(func):
+            self.stages[name or func.__name__] = (func, list(inputs))
+            return func
+        return add if func is None else add(func)
+
+    def _dependencies(self, name):
+        func, _ = self.stages[name]
+        needed = [parameter.name for parameter in inspect.signature(func).parameters.values()
+                  if parameter.default is inspect.Parameter.empty]
+        for dependency in needed:
+            if dependency not in self.stages:
+                raise KeyError('stage {} needs {}, which is not a stage'.format(name, dependency))
+        return needed
+
+    def key(self, name, _seen=()):
+        """Return the hash that stage ``name`` is cached under."""
+        if name in _seen:
+            raise ValueError('stage {} depends on itself'.format(name))
+        func, inputs = self.stages[name]
+        digest = hashlib.sha256(name.encode())
+        digest.update(cache.source_id(func))
+        for parameter in inspect.signature(func).parameters.values():
+            if parameter.default is not inspect.Parameter.empty:
+                digest.update(parameter.name.encode())
+                digest.update(cache.value_id(parameter.default))
+        for path in inputs:
+            digest.update(_input_id(path))
+        for dependency in self._dependencies(name):
+            digest.update(self.key(dependency, _seen + (name,)).encode())
+        return digest.hexdigest()
+
+    def _path(self, name, key):
+        return os.path.join(self.cache_dir, '{}-{}'.format(name, key[:20]))
+
+    def cached(self, name):
+        """Return the file stage ``name`` is cached in, or None."""
+        path = self._path(name, self.key(name))
+        for suffix in FORMATS:
+            if os.path.exists(path + suffix):
+                return path + suffix
+        return None
+
+    def get(self, name):
+        """Return the result of stage ``name``, from the cache if it is there."""
+        if name not in self.stages:
+            raise KeyError('no stage {}'.format(name))
+        start = time.perf_counter()
+        cached = self.cached(name)
+        if cached is not None:
+            try:
+                value = _load(cached)
+            except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+                cached = None
+            else:
+                # the modification time records when an entry was last used
+                os.utime(cached)
+                self.history.append((name, 'cached', time.perf_counter() - start))
+                return value
+        func, _ = self.stages[name]
+        value = func(**{dependency: self.get(dependency) for dependency in self._dependencies(name)})
+        _store(value, self._path(name, self.key(name)))
+        self.history.append((name, 'computed', time.perf_counter() - start))
+        self.evict()
+        return value
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in ``max_bytes``."""
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir)
+                       if entry.is_file() and entry.name.endswith(FORMATS)]
+        except FileNotFoundError:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            total -= entry.stat().st_size
+            os.remove(entry.path)
+
+    def clear(self):
+        """Delete all cached stages."""
+        max_bytes, self.max_bytes = self.max_bytes, -1
+        try:
+            self.evict()
+        finally:
+            self.max_bytes = max_bytes
+
+
+def datawrangling_pipeline(src, pattern='*', exclude=(), recode=None, cache_dir=CACHE_DIR,
+                           max_bytes=MAX_BYTES):
+    """Return a ``Pipeline`` with the stages of the datawrangling tutorial.
+
+    The stages are ``df`` (all logfiles in ``src``), ``df_trim``,
+    ``df_trim_blocks`` (with ``recode`` applied to ``subject_nr``) and
+    ``df_correct``. ``pipeline.get('df_trim_blocks')`` is what the
+    plotting tutorial reads from ``df_cleaned.csv``.
+    """
+    pipeline = Pipeline(cache_dir, max_bytes)
+    inputs = [src] if isinstance(src, (str, os.PathLike)) else list(src)
+
+    @pipeline.stage(inputs=inputs)
+    def df(src=src, pattern=pattern, exclude=tuple(exclude)):
+        with merge.open_sources(src, None, pattern, exclude) as items:
+            frames = []
+            for item in items:
+                with sources.open_logfile(item) as fhand:
+                    frames.append(pd.read_csv(fhand))
+        return pd.concat(frames, ignore_index=True)
+
+    @pipeline.stage
+    def df_trim(df, columns=tuple(chunked.INCLUDE_COLUMNS)):
+        df_trim = df[list(columns)].copy()
+        return columnar.apply_dtypes(df_trim, {'subject_nr': 'category', 'correct': 'category',
+                                               'response_time': 'Int64'})
+
+    @pipeline.stage
+    def df_trim_blocks(df_trim, max_block=chunked.MAX_BLOCK, recode=recode):
+        df_trim_blocks = df_trim[df_trim['block'] < max_block].reset_index(drop=True)
+        if recode is not None:
+            df_trim_blocks['subject_nr'] = recode_values(df_trim_blocks['subject_nr'], recode,
+                                                         unknown='keep')
+        return df_trim_blocks
+
+    @pipeline.stage
+    def df_correct(df_trim_blocks):
+        return df_trim_blocks[df_trim_blocks['correct'] == 1].reset_index(drop=True)
+
+    return pipeline
+
@@ -0,0 +1,125 @@
+"""Group logfiles by experiment version, judged by their header.
+
+Experiments change while data collection is running: a variable is added, a
+plugin is updated. The merge loop in ``content/07_files/merging_files.ipynb``
+can only compare every header with the header of the first file, so a
+mismatch is discovered one file at a time. ``scan_versions`` reads just the
+first line of every logfile below a folder (with a pool of threads), gives
+every distinct header a fingerprint (``merge.header_id``) and groups the
+files by it. ``VersionIndex.diff`` shows which columns differ between two
+versions, and every group can then be merged on its own, for instance with
+``merge_logfiles(index.versions[fingerprint].files, out)``.
+"""
+import os
+import time
+from dataclasses import dataclass, field
+
+from . import merge, sources
+from .collect import walk_files
+
+
+@dataclass
+class Version:
+    """The logfiles that share one header."""
+    fingerprint: str
+    columns: list
+    files: list = field(default_factory=list)
+
+
+@dataclass
+class VersionIndex:
+    """The versions found by ``scan_versions``, most common version first."""
+    versions: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def files(self):
+        return sum(len(version.files) for version in self.versions.values())
+
+    @property
+    def reference(self):
+        """The most common version, or None if no files were found."""
+        return next(iter(self.versions.values()), None)
+
+    def diff(self, fingerprint, other=None):
+        """Return how the columns of version ``fingerprint`` differ from version ``other``.
+
+        ``other`` is the reference version by default. Returns a dict with
+        the columns that were 'added' and 'removed', and whether the columns
+        they share are 'reordered'.
+        """
+        base = self.versions[other].columns if other else self.reference.columns
+        columns = self.versions[fingerprint].columns
+        known = set(base)
+        added = [column for column in columns if column not in known]
+        present = set(columns)
+        removed = [column for column in base if column not in present]
+        shared = [column for column in columns if column in known]
+        reordered = shared != [column for column in base if column in present]
+        return {'added': added, 'removed': removed, 'reordered': reordered}
+
+    def to_dict(self):
+        """Return the index as a dict that can be saved as JSON."""
+        return {fingerprint: {'columns': version.columns,
+                              'files': [str(path) for path in version.files],
+                              'diff': self.diff(fingerprint)}
+                for fingerprint, version in self.versions.items()}
+
+    def __str__(self):
+        lines = ['{} files in {} versions, scanned in {:.2f} s'.format(
+            self.files, len(self.versions), self.seconds)]
+        for fingerprint, version in self.versions.items():
+            lines.append('{}  {:6} files  {:4} columns'.format(
+                fingerprint, len(version.files), len(version.columns)))
+            if version is self.reference:
+                continue
+            diff = self.diff(fingerprint)
+            for key in ('added', 'removed'):
+                if diff[key]:
+                    lines.append('    {}: {}'.format(key, ', '.join(diff[key])))
+            if diff['reordered']:
+                lines.append('    columns in a different order')
+        return '\n'.join(lines)
+
+
+def _headers(root, pattern, workers):
+    """Yield (file, header line) for every logfile matching ``pattern`` in ``root``.
+
+    The files of an archive are the names of its members: the archive is
+    closed when the scan is done, so the members cannot be opened later.
+    """
+    if not sources.is_archive(root):
+        paths = [path for path, _ in walk_files(root, pattern)]
+        yield from zip(paths, merge.ordered_map(merge.read_header, paths, workers))
+        return
+    with sources.open_archive(root, pattern) as archive:
+        if archive.random_access:
+            members = list(archive)
+            headers = merge.ordered_map(merge.read_header, members, workers)
+            for member, header in zip(members, headers):
+                yield member.name, header
+        else:
+            for member in archive.stream():
+                yield member.name, merge.read_header(member)
+
+
+def scan_versions(root, pattern='*.csv', workers=merge.DEFAULT_WORKERS):
+    """Return a ``VersionIndex`` of all logfiles matching ``pattern`` below ``root``.
+
+    ``root`` is a folder, which is searched recursively, or a zip or tar
+    archive (whose files are listed by name). Only the first line of every
+    file is read. Within a version the files are in the order in which they
+    were found.
+    """
+    start = time.perf_counter()
+    groups = {}
+    for item, header in _headers(os.fspath(root), pattern, workers):
+        fingerprint = merge.header_id(header)
+        version = groups.get(fingerprint)
+        if version is None:
+            version = groups[fingerprint] = Version(fingerprint, merge.parse_header(header))
+        version.files.append(item)
+    ordered = sorted(groups.values(), key=lambda version: len(version.files), reverse=True)
+    index = VersionIndex({version.fingerprint: version for version in ordered})
+    index.seconds = time.perf_counter() - start
+    return index
@@ -0,0 +1,80 @@
+"""Tests of ``oslogs.chunked``: ``run_pipeline`` against the datawrangling tutorial."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, chunked, columnar, merge
+
+RECODE = {3: 1, 4: 2}
+
+
+@pytest.fixture
+def src(tmp_path):
+    benchmarks.make_logfiles(tmp_path / 'data', 4, n_rows=150, n_columns=40, first=3)
+    return tmp_path / 'data'
+
+
+def _tutorial(src):
+    """The steps of content/10_dataframes/datawrangling.ipynb."""
+    df = pd.concat((pd.read_csv(path) for path in merge.list_logfiles(src)), ignore_index=True)
+    df_trim = df[chunked.INCLUDE_COLUMNS].copy()
+    df_trim['response_time'] = df_trim['response_time'].round().astype(int)
+    df_trim_blocks = df_trim[df_trim['block'] < 11].copy()
+    for old, new in RECODE.items():
+        df_trim_blocks['subject_nr'] = df_trim_blocks['subject_nr'].replace(old, new)
+    dfs = []
+    for column in chunked.COUNT_COLUMNS:
+        dfs.append(df_trim_blocks.pivot_table(index=['subject_nr'], columns=[column], aggfunc='size'))
+    session = df_trim_blocks.pivot_table(index=['session'], columns='task_transition_type',
+                                         aggfunc='size')
+    df_correct = df_trim_blocks[df_trim_blocks['correct'] == 1]
+    switch_table = pd.pivot_table(df_correct, values='response_time', index=['subject_nr'],
+                                  columns=['task_transition_type'], aggfunc='mean')
+    switch_table['switch cost'] = switch_table['task-switch'] - switch_table['task-repetition']
+    return (df_trim_blocks, pd.concat(dfs, axis=1), session, switch_table,
+            df_correct['response_time'].describe())
+
+
+@pytest.mark.parametrize('chunk_rows', [chunked.CHUNK_ROWS, 100])
+def test_like_the_tutorial(src, tmp_path, chunk_rows):
+    result = chunked.run_pipeline(src, recode=RECODE, cleaned=tmp_path / 'df_cleaned.csv',
+                                  chunk_rows=chunk_rows, workers=2)
+    df_trim_blocks, counts, session, switch_table, describe = _tutorial(src)
+    assert result.rows_read == 600 and result.rows_kept == len(df_trim_blocks)
+    pd.testing.assert_frame_equal(result.counts, counts, check_names=False)
+    pd.testing.assert_frame_equal(result.session_counts, session, check_names=False)
+    np.testing.assert_allclose(result.effects['switch_cost'], switch_table['switch cost'])
+    assert result.effects.index.tolist() == switch_table.index.tolist() == [1, 2, 5, 6]
+
+    for stat in ('count', 'mean', 'std', 'min', 'max'):
+        assert result.describe[stat] == pytest.approx(describe[stat])
+    # the quartiles come from a sketch
+    for stat in ('25%', '50%', '75%'):
+        assert result.describe[stat] == pytest.approx(describe[stat], rel=0.02)
+
+    cleaned = pd.read_csv(tmp_path / 'df_cleaned.csv')
+    pd.testing.assert_frame_equal(cleaned, df_trim_blocks.reset_index(drop=True))
+
+
+def test_from_a_merged_and_a_parquet_file(src, tmp_path):
+    pytest.importorskip('pyarrow')
+    expected = chunked.run_pipeline(src, recode=RECODE)
+    merge.merge_logfiles(src, tmp_path / 'merged.csv')
+    columnar.merge_columnar(src, tmp_path / 'merged.parquet')
+    for path in (tmp_path / 'merged.csv', tmp_path / 'merged.parquet'):
+        result = chunked.run_pipeline(path, recode=RECODE, chunk_rows=128)
+        pd.testing.assert_frame_equal(result.counts, expected.counts, check_names=False,
+                                      check_index_type=False)
+        np.testing.assert_allclose(result.effects['switch_cost'], expected.effects['switch_cost'])
+
+
+def test_iter_chunks_sizes(src):
+    chunks = list(chunked.iter_chunks(src, columns=['subject_nr', 'age'], chunk_rows=200))
+    assert sum(map(len, chunks)) == 600 and all(len(chunk) >= 200 for chunk in chunks[:-1])
+    assert all(list(chunk.columns) == ['subject_nr', 'age'] for chunk in chunks)
+    assert all(chunk['age'].isna().all() for chunk in chunks)
+
+
+def test_no_trials(tmp_path):
+    result = chunked.run_pipeline(tmp_path)
+    assert result.rows_read == 0 and result.effects is None and result.counts.empty
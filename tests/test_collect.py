@@ -0,0 +1,64 @@
+"""Tests of ``oslogs.collect`` on a small folder per participant tree."""
+import errno
+import os
+
+import pytest
+
+from oslogs import collect
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'tutorial_data2'
+    for pp in (1, 2, 3):
+        (root / str(pp)).mkdir(parents=True)
+        (root / str(pp) / 'file.txt').write_text('participant {}\n'.format(pp))
+    (root / 'notes').mkdir()
+    (root / 'notes' / 'file.txt').write_text('no participant\n')
+    (root / 'readme.txt').write_text('left alone\n')
+    return root
+
+
+def test_copy(tree, tmp_path):
+    dest = tmp_path / 'collected'
+    stats = collect.collect_files(tree, dest)
+    assert stats.files == 3 and not stats.errors
+    assert sorted(os.listdir(dest)) == ['file_pp1.txt', 'file_pp2.txt', 'file_pp3.txt']
+    assert (dest / 'file_pp2.txt').read_text() == 'participant 2\n'
+    assert stats.unassigned == [str(tree / 'notes' / 'file.txt')]
+
+
+def test_hardlink(tree, tmp_path):
+    dest = tmp_path / 'collected'
+    collect.collect_files(tree, dest, mode='hardlink')
+    assert os.path.samefile(dest / 'file_pp1.txt', tree / '1' / 'file.txt')
+
+
+def test_existing_files_are_errors_without_overwrite(tree, tmp_path):
+    dest = tmp_path / 'collected'
+    collect.collect_files(tree, dest)
+    stats = collect.collect_files(tree, dest)
+    assert stats.files == 0 and len(stats.errors) == 3
+    assert collect.collect_files(tree, dest, overwrite=True).files == 3
+
+
+def test_reflink_falls_back_to_copying(tree, tmp_path, monkeypatch):
+    calls = []
+
+    def unsupported(src, dst):
+        calls.append(src)
+        raise collect.ReflinkUnsupported(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP), dst)
+
+    monkeypatch.setattr(collect, '_reflink', unsupported)
+    dest = tmp_path / 'collected'
+    with pytest.warns(RuntimeWarning, match='cannot reflink'):
+        stats = collect.collect_files(tree, dest, mode='reflink', workers=1)
+    assert stats.files == stats.copied == 3 and not stats.errors
+    # the filesystem is asked once, the other files are copied straight away
+    assert len(calls) == 1
+    assert (dest / 'file_pp3.txt').read_text() == 'participant 3\n'
+
+
+def test_unknown_mode(tree, tmp_path):
+    with pytest.raises(ValueError):
+        collect.collect_files(tree, tmp_path / 'collected', mode='move')
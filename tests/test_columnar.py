@@ -0,0 +1,77 @@
+"""Tests of ``oslogs.columnar`` against the merged csv file read with pandas."""
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from oslogs import benchmarks, columnar, merge  # noqa: E402
+
+
+@pytest.fixture
+def src(tmp_path):
+    benchmarks.make_logfiles(tmp_path / 'data', 6, n_rows=50, n_columns=25)
+    return tmp_path / 'data'
+
+
+def _expected(src, tmp_path, union=False, **options):
+    out = tmp_path / 'merged.csv'
+    (merge.merge_union if union else merge.merge_logfiles)(src, out, **options)
+    header = merge.parse_header(merge.read_header(out))
+    text = dict.fromkeys((column for column in header if column not in columnar.LOG_DTYPES), object)
+    frame = pd.read_csv(out, dtype=text)
+    # the text columns come back from pyarrow as strings
+    return columnar.apply_dtypes(frame.astype(dict.fromkeys(text, 'str')))
+
+
+@pytest.mark.parametrize('name', ['merged.parquet', 'merged.feather'])
+def test_like_the_merged_csv(src, tmp_path, name):
+    stats = columnar.merge_columnar(src, tmp_path / name, workers=2)
+    frame = columnar.load_columnar(tmp_path / name)
+    expected = _expected(src, tmp_path)
+    assert stats.columns == list(expected.columns) and stats.files_merged == 6
+    pd.testing.assert_frame_equal(frame, expected)
+    assert isinstance(frame['subject_nr'].dtype, pd.CategoricalDtype)
+    assert frame['response_time'].dtype == 'Int64'
+
+
+def test_parquet_like_feather_across_row_groups(src, tmp_path, monkeypatch):
+    feather = tmp_path / 'merged.feather'
+    columnar.merge_columnar(src, feather)
+    parquet = tmp_path / 'merged.parquet'
+    # row groups of about 100 rows, so the categories differ between them
+    write = columnar._write_parquet
+    monkeypatch.setattr(columnar, '_write_parquet', lambda frames, out: write(frames, out, 100))
+    columnar.merge_columnar(src, parquet)
+    pd.testing.assert_frame_equal(columnar.load_columnar(parquet), columnar.load_columnar(feather))
+    pd.testing.assert_frame_equal(columnar.load_columnar(parquet, columns=['response_time']),
+                                  columnar.load_columnar(feather)[['response_time']])
+
+
+def test_union_with_missing_columns(src, tmp_path):
+    (src / 'subject-9.csv').write_text('"subject_nr","response_time","age"\n"9","512.6","21"\n')
+    columnar.merge_columnar(src, tmp_path / 'merged.parquet', union=True,
+                            drop_columns=['count_*'])
+    frame = columnar.load_columnar(tmp_path / 'merged.parquet')
+    expected = _expected(src, tmp_path, union=True, drop_columns=['count_*'])
+    pd.testing.assert_frame_equal(frame, expected)
+    assert frame.loc[frame['age'].notna(), 'response_time'].tolist() == [513]
+
+
+def test_annotate(src, tmp_path):
+    columnar.merge_columnar(src, tmp_path / 'merged.feather', annotate=True,
+                            columns=['subject_nr'])
+    frame = columnar.load_columnar(tmp_path / 'merged.feather')
+    assert list(frame.columns) == ['source_file', 'participant', 'source_row', 'subject_nr']
+    assert (frame['participant'].astype(str) == frame['subject_nr'].astype(str)).all()
+    assert frame.groupby('source_file', observed=True)['source_row'].max().tolist() == [49] * 6
+
+
+def test_column_that_cannot_be_typed(src, tmp_path):
+    (src / 'subject-1.csv').write_text('"subject_nr","response_time"\n"1","slow"\n')
+    with pytest.raises(ValueError, match='response_time'):
+        columnar.merge_columnar(src, tmp_path / 'merged.parquet', union=True)
+
+
+def test_unknown_format(src, tmp_path):
+    with pytest.raises(ValueError):
+        columnar.merge_columnar(src, tmp_path / 'merged.csv')
@@ -0,0 +1,61 @@
+"""Tests of ``oslogs.compact``: compact types hold the same values as ``pd.read_csv``."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import compact, merge
+
+
+@pytest.fixture
+def src(tmp_path):
+    rng = np.random.default_rng(0)
+    src = tmp_path / 'data'
+    src.mkdir()
+    for subject_nr in range(1, 7):
+        n = 200
+        pd.DataFrame({
+            'subject_nr': subject_nr,
+            'response_time': rng.lognormal(6.5, 0.3, n).round(1),
+            'response': rng.choice(['a', 'l', 'None'], n),
+            'count_trial': np.arange(n),
+            'fullscreen': 'yes',
+            # the same in the sample, different in the last logfile
+            'opensesame_version': '3.3.14' if subject_nr < 6 else '4.0.1',
+            'notes': ['note {}'.format(i) for i in range(n)],
+        }).to_csv(src / 'subject-{}.csv'.format(subject_nr), index=False)
+    return src
+
+
+def _plain(src):
+    return pd.concat([pd.read_csv(path) for path in merge.list_logfiles(src)], ignore_index=True)
+
+
+def test_same_values_as_read_csv(src):
+    frame, report = compact.read_compact(src, sample_rows=300, workers=2)
+    plain = _plain(src)
+    assert frame.attrs['constants'] == {'fullscreen': 'yes'}
+    assert list(frame.columns) == [column for column in plain if column != 'fullscreen']
+    assert isinstance(frame['response'].dtype, pd.CategoricalDtype)
+    assert isinstance(frame['opensesame_version'].dtype, pd.CategoricalDtype)
+    assert frame['notes'].dtype == plain['notes'].dtype
+    assert frame['subject_nr'].dtype == 'int8' and frame['count_trial'].dtype == 'int16'
+    assert frame['response_time'].dtype == 'float64'
+    restored = frame.astype(plain.dtypes.drop('fullscreen').to_dict())
+    pd.testing.assert_frame_equal(restored, plain.drop(columns='fullscreen'))
+
+    assert report.bytes_after < report.bytes_before
+    assert report.columns.loc['fullscreen', 'dtype_after'] == 'constant'
+    assert report.columns.loc['fullscreen', 'after'] == 0
+    assert 'constant columns dropped' in str(report)
+
+
+def test_keep_constants(src):
+    frame, report = compact.read_compact(src, drop_constants=False)
+    assert 'fullscreen' in frame and not report.constants
+
+
+def test_profile_dtypes():
+    sample = pd.DataFrame({'a': [1, 1, 1, 1], 'b': [1, 2, 3, 4], 'c': ['x', 'y', 'x', 'x'],
+                           'd': ['p', 'q', 'r', 's'], 'e': [0.5, 1.5, 0.5, 0.5]})
+    plan = compact.profile_dtypes(sample)
+    assert plan == compact.DtypePlan(categories=['c'], integers=['b'], constants=['a'])
@@ -0,0 +1,70 @@
+"""Tests of ``oslogs.cube`` against groupby on the trials."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, cube, query
+
+DIMS = ['subject_nr', 'session', 'task_transition_type']
+
+
+@pytest.fixture
+def trials():
+    rng = np.random.default_rng(0)
+    n = 3000
+    frame = pd.DataFrame({
+        'subject_nr': rng.integers(1, 8, n),
+        'session': rng.choice(['lowswitch', 'highswitch'], n),
+        'task_transition_type': rng.choice(['task-repetition', 'task-switch', None], n),
+        'correct': rng.choice([0, 1], n),
+        'response_time': rng.normal(600, 100, n),
+    })
+    frame.loc[::50, 'response_time'] = np.nan
+    return frame
+
+
+def test_stats_like_groupby(trials):
+    summary = cube.build_cube(trials, DIMS)
+    # trials with a missing dim are not in the cube, so not in any reduction either
+    complete = trials.dropna(subset=DIMS)
+    for dims in (DIMS, ['session', 'task_transition_type'], ['subject_nr']):
+        stats = summary.stats(dims)
+        expected = complete.groupby(dims)['response_time'].agg(['count', 'mean', 'std'])
+        expected = expected[expected['count'] > 0]
+        assert stats['count'].tolist() == expected['count'].tolist()
+        np.testing.assert_allclose(stats['mean'], expected['mean'])
+        np.testing.assert_allclose(stats['sd'], expected['std'])
+
+
+def test_pivot_like_pivot_table(trials):
+    summary = cube.build_cube(trials, DIMS)
+    expected = trials.pivot_table('response_time', 'subject_nr', 'task_transition_type')
+    result = summary.pivot('subject_nr', 'task_transition_type')
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy())
+
+
+def test_merge_of_halves(trials):
+    whole = cube.build_cube(trials, DIMS)
+    halves = cube.build_cube(trials[:1000], DIMS).merge(cube.build_cube(trials[1000:], DIMS))
+    pd.testing.assert_frame_equal(halves.table[['count']], whole.table[['count']])
+    np.testing.assert_allclose(halves.table['sum'], whole.table['sum'])
+
+
+def test_select_drops_levels_that_no_longer_occur():
+    trials = pd.DataFrame({'correct': [1, 1, 0, 0], 'session': ['a', 'b', 'a', 'c'],
+                           'task': ['x', 'y', 'x', 'y'], 'response_time': [1.0, 2.0, 3.0, 4.0]})
+    selected = cube.build_cube(trials, ['correct', 'session', 'task']).select(correct=1)
+    levels, lines = selected._lines('session', 'task', cube.CONFIDENCE)
+    assert levels.tolist() == ['a', 'b']
+    assert [level for level, _ in lines] == ['x', 'y']
+    with pytest.raises(ValueError):
+        selected.select(session='a', task='x')
+
+
+def test_cube_logfiles_like_build_cube(tmp_path):
+    benchmarks.make_logfiles(tmp_path, 4, n_rows=200)
+    frame = query.scan_logs(tmp_path).collect()
+    expected = cube.build_cube(frame, ['subject_nr', 'session'])
+    result = cube.cube_logfiles(tmp_path, ['subject_nr', 'session'], workers=2)
+    assert result.table['count'].tolist() == expected.table['count'].tolist()
+    np.testing.assert_allclose(result.table['sum'], expected.table['sum'])
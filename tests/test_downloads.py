@@ -0,0 +1,122 @@
+"""Tests of ``oslogs.downloads`` against a local HTTP server."""
+import hashlib
+import http.server
+import threading
+import urllib.error
+
+import pytest
+
+from oslogs import downloads
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Serves ``server.files`` (path -> bytes) with an ETag, and counts the requests."""
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        content = self.server.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        etag = '"{}"'.format(hashlib.sha256(content).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    httpd.files = {'/subject-1.csv': b'subject_nr,response_time\n1,500\n'}
+    httpd.requests = []
+    httpd.url = 'http://127.0.0.1:{}'.format(httpd.server_address[1])
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+def _stop(httpd):
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _read(path):
+    with open(path, 'rb') as fhand:
+        return fhand.read()
+
+
+def test_first_download(server, tmp_path):
+    url = server.url + '/subject-1.csv'
+    path, how, size = downloads.fetch(url, cache_dir=tmp_path)
+    assert how == 'downloaded'
+    assert size == len(server.files['/subject-1.csv'])
+    assert _read(path) == server.files['/subject-1.csv']
+
+
+def test_cache_hit(server, tmp_path):
+    url = server.url + '/subject-1.csv'
+    first, _, _ = downloads.fetch(url, cache_dir=tmp_path)
+    path, how, size = downloads.fetch(url, cache_dir=tmp_path)
+    assert (path, how, size) == (first, 'cached', 0)
+    assert len(server.requests) == 1
+
+
+def test_revalidated(server, tmp_path):
+    url = server.url + '/subject-1.csv'
+    first, _, _ = downloads.fetch(url, cache_dir=tmp_path)
+    path, how, size = downloads.fetch(url, cache_dir=tmp_path, max_age=0)
+    assert (path, how, size) == (first, 'revalidated', 0)
+    assert len(server.requests) == 2
+
+
+def test_changed_file_is_downloaded_again(server, tmp_path):
+    url = server.url + '/subject-1.csv'
+    first, _, _ = downloads.fetch(url, cache_dir=tmp_path)
+    server.files['/subject-1.csv'] = b'subject_nr,response_time\n1,600\n'
+    path, how, size = downloads.fetch(url, cache_dir=tmp_path, max_age=0)
+    assert how == 'downloaded'
+    assert path != first
+    assert _read(path) == server.files['/subject-1.csv']
+
+
+def test_offline_uses_the_cache(server, tmp_path):
+    url = server.url + '/subject-1.csv'
+    first, _, _ = downloads.fetch(url, cache_dir=tmp_path)
+    _stop(server)
+    path, how, size = downloads.fetch(url, cache_dir=tmp_path, max_age=0, timeout=5)
+    assert (path, how, size) == (first, 'offline', 0)
+
+
+def test_offline_without_cache_raises(server, tmp_path):
+    url = server.url + '/subject-1.csv'
+    _stop(server)
+    with pytest.raises(OSError):
+        downloads.fetch(url, cache_dir=tmp_path, timeout=5)
+
+
+def test_missing_file_raises(server, tmp_path):
+    with pytest.raises(urllib.error.HTTPError):
+        downloads.fetch(server.url + '/subject-2.csv', cache_dir=tmp_path)
+
+
+def test_download_fetches_repeated_urls_once(server, tmp_path):
+    server.files['/subject-2.csv'] = b'subject_nr,response_time\n2,700\n'
+    first, second = server.url + '/subject-1.csv', server.url + '/subject-2.csv'
+    stats = downloads.download([first, second, first], cache_dir=tmp_path)
+    assert stats.downloaded == 2
+    assert len(server.requests) == 2
+    assert stats.paths[0] == stats.paths[2] != stats.paths[1]
+    assert _read(stats.paths[1]) == server.files['/subject-2.csv']
@@ -0,0 +1,70 @@
+"""Tests of ``oslogs.effects`` against the pivot tables of the datawrangling tutorial."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import effects
+
+
+@pytest.fixture
+def trials():
+    rng = np.random.default_rng(0)
+    n = 4000
+    frame = pd.DataFrame({
+        'subject_nr': rng.integers(1, 11, n),
+        'session': rng.choice(['lowswitch', 'highswitch'], n),
+        'task_transition_type': rng.choice(['task-switch', 'task-repetition'], n),
+        'congruency_type': rng.choice(['congruent', 'incongruent'], n),
+        'response_time': rng.lognormal(6.5, 0.3, n).round(),
+    })
+    frame.loc[::97, 'response_time'] = np.nan
+    return frame
+
+
+def _switch_table(trials, index='subject_nr'):
+    # the tutorial: a pivot table of the means, then subtract the columns
+    table = trials.pivot_table('response_time', index, 'task_transition_type')
+    table['switch_cost'] = table['task-switch'] - table['task-repetition']
+    return table
+
+
+def test_switch_cost_like_the_tutorial(trials):
+    result = effects.compute_effects(trials)
+    expected = _switch_table(trials)
+    for column in ('task-switch', 'task-repetition', 'switch_cost'):
+        np.testing.assert_allclose(result[column], expected[column])
+    assert result.index.equals(expected.index)
+
+
+def test_per_session(trials):
+    result = effects.compute_effects(trials, by=('subject_nr', 'session'), interactions=False)
+    expected = _switch_table(trials, ['subject_nr', 'session'])
+    np.testing.assert_allclose(result['switch_cost'], expected['switch_cost'])
+    congruency = trials.pivot_table('response_time', ['subject_nr', 'session'], 'congruency_type')
+    np.testing.assert_allclose(result['congruency_effect'],
+                               congruency['incongruent'] - congruency['congruent'])
+    assert 'switch_cost x congruency_effect' not in result
+
+
+def test_interaction(trials):
+    result = effects.compute_effects(trials)
+    means = trials.pivot_table('response_time', 'subject_nr',
+                               ['task_transition_type', 'congruency_type'])
+    cost = means['task-switch'] - means['task-repetition']
+    np.testing.assert_allclose(result['switch_cost x congruency_effect'],
+                               cost['incongruent'] - cost['congruent'])
+
+
+def test_cells_of_parts_add_up(trials):
+    columns = effects.contrast_columns()
+    parts = [effects.cell_sums(part, ['subject_nr'], columns)
+             for part in (trials[:1000], trials[1000:2500], trials[2500:])]
+    cells = parts[0].add(parts[1], fill_value=0).add(parts[2], fill_value=0)
+    pd.testing.assert_frame_equal(effects.effects_from_cells(cells), effects.compute_effects(trials))
+
+
+def test_missing_level_gives_nan(trials):
+    trials = trials[(trials['subject_nr'] != 3) | (trials['task_transition_type'] == 'task-switch')]
+    result = effects.compute_effects(trials)
+    assert np.isnan(result.loc[3, 'switch_cost'])
+    assert result['switch_cost'].drop(3).notna().all()
@@ -0,0 +1,61 @@
+"""Tests of ``oslogs.facets`` against ``np.histogram`` of every facet."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import facets
+
+
+@pytest.fixture
+def trials():
+    rng = np.random.default_rng(0)
+    n = 5000
+    frame = pd.DataFrame({
+        'subject_nr': rng.integers(1, 24, n),
+        'task_type': rng.choice(['parity', 'magnitude'], n),
+        'response_time': rng.lognormal(6.5, 0.3, n).round(),
+    })
+    frame.loc[::101, 'response_time'] = np.nan
+    frame.loc[::103, 'task_type'] = None
+    return frame
+
+
+@pytest.mark.parametrize('row, col', [('subject_nr', 'task_type'), (None, 'task_type'),
+                                      ('subject_nr', None), (None, None)])
+@pytest.mark.parametrize('binwidth', [50, 7.5])
+def test_like_np_histogram_per_facet(trials, row, col, binwidth):
+    result = facets.facet_histograms(trials, row=row, col=col, binwidth=binwidth)
+    names = [name for name in (row, col) if name]
+    complete = trials.dropna(subset=['response_time'] + names)
+    assert result.edges[0] == complete['response_time'].min()
+    assert np.allclose(np.diff(result.edges), binwidth)
+    assert result.counts.sum() == len(complete)
+    # seaborn selects the trials of every facet and bins them on their own
+    for key, group in complete.groupby(names) if names else [((), complete)]:
+        key = dict(zip(names, key))
+        expected, _ = np.histogram(group['response_time'], bins=result.edges)
+        np.testing.assert_array_equal(result.facet(key.get(row), key.get(col)), expected)
+
+
+def test_start(trials):
+    result = facets.facet_histograms(trials, binwidth=100, start=500)
+    assert result.edges[0] == 500
+    kept = trials.dropna()
+    assert result.counts.sum() == (kept['response_time'] >= 500).sum()
+
+
+def test_pages(trials):
+    pytest.importorskip('matplotlib')
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    result = facets.facet_histograms(trials, rows_per_page=10)
+    assert result.n_pages == 3 and '23 x 2 facets' in str(result)
+    figures = list(result.pages())
+    assert [len(fig.axes) for fig in figures] == [20, 20, 6]
+    assert figures[0].axes[0].get_title() == 'task_type = magnitude'
+    for fig in figures:
+        plt.close(fig)
+    with pytest.raises(IndexError):
+        result.plot(3)
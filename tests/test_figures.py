@@ -0,0 +1,73 @@
+"""Tests of ``oslogs.figures`` on a small table of cleaned trials."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('matplotlib')
+
+from oslogs import figures  # noqa: E402
+
+
+@pytest.fixture
+def cleaned(tmp_path):
+    rng = np.random.default_rng(0)
+    n = 240
+    frame = pd.DataFrame({
+        'subject_nr': np.repeat([1, 2], n // 2),
+        'session': np.tile(np.repeat(['lowswitch', 'highswitch'], n // 4), 2),
+        'task_transition_type': rng.choice(['task-repetition', 'task-switch'], n),
+        'response_time': rng.normal(600, 100, n).round(),
+        'correct': rng.choice([0, 1], n, p=[0.2, 0.8]),
+        'response': rng.choice(['left', 'right', 'None'], n),
+    })
+    path = tmp_path / 'df_cleaned.csv'
+    frame.to_csv(path, index=False)
+    return path
+
+
+SPEC = [
+    {'name': 'rt_histogram', 'kind': 'hist', 'per': ['subject_nr'], 'bins': 10},
+    {'name': 'switch_cost', 'kind': 'line', 'x': 'session', 'hue': 'task_transition_type'},
+]
+
+
+def test_render_and_skip(cleaned, tmp_path):
+    out = tmp_path / 'figures'
+    stats = figures.render_figures(cleaned, out, SPEC, processes=1)
+    assert stats.rendered == 3 and stats.skipped == 0
+    assert os.path.exists(out / 'rt_histogram' / 'rt_histogram_subject_nr-1.png')
+    assert os.path.exists(out / 'switch_cost.png')
+
+    stats = figures.render_figures(cleaned, out, SPEC, processes=1)
+    assert stats.rendered == 0 and stats.skipped == 3
+    assert figures.render_figures(cleaned, out, SPEC, processes=1, force=True).rendered == 3
+
+
+def test_changed_spec_entry_is_drawn_again(cleaned, tmp_path):
+    out = tmp_path / 'figures'
+    figures.render_figures(cleaned, out, SPEC, processes=1)
+    spec = [dict(SPEC[0], bins=20), SPEC[1]]
+    stats = figures.render_figures(cleaned, out, spec, processes=1)
+    assert stats.rendered == 2 and stats.skipped == 1
+
+
+def test_every_format_is_written(cleaned, tmp_path):
+    out = tmp_path / 'figures'
+    stats = figures.render_figures(cleaned, out, SPEC[1:], formats=('png', 'svg'), processes=1)
+    assert sorted(os.path.basename(path) for path in stats.files) == ['switch_cost.png',
+                                                                      'switch_cost.svg']
+
+
+@pytest.mark.parametrize('formats', [(), ('gif',)])
+def test_bad_formats(cleaned, tmp_path, formats):
+    with pytest.raises(ValueError):
+        figures.render_figures(cleaned, tmp_path / 'figures', SPEC, formats=formats, processes=1)
+
+
+def test_bad_spec():
+    with pytest.raises(ValueError):
+        figures.load_spec([{'name': 'a', 'kind': 'pie'}])
+    with pytest.raises(ValueError):
+        figures.load_spec([{'name': 'a', 'kind': 'hist'}, {'name': 'a', 'kind': 'line'}])
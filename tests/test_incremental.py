@@ -0,0 +1,138 @@
+"""Tests of ``oslogs.incremental``: append, change and remove logfiles between merges."""
+import os
+import tarfile
+
+import pytest
+
+from oslogs import benchmarks, incremental, merge
+
+
+@pytest.fixture
+def src(tmp_path):
+    benchmarks.make_logfiles(tmp_path / 'data', 4, n_rows=30, n_columns=20)
+    return tmp_path / 'data'
+
+
+def _from_scratch(src, tmp_path, **options):
+    out = tmp_path / 'scratch.csv'
+    if options.pop('union', False):
+        merge.merge_union(src, out, **options)
+    else:
+        merge.merge_logfiles(src, out, **options)
+    return out.read_bytes()
+
+
+def _body(path):
+    with open(path, 'rb') as fhand:
+        fhand.readline()
+        return fhand.read()
+
+
+def test_first_merge_and_up_to_date(src, tmp_path):
+    out = tmp_path / 'merged.csv'
+    stats = incremental.merge_incremental(src, out)
+    assert stats.rebuilt and stats.reason == 'no manifest'
+    assert out.read_bytes() == _from_scratch(src, tmp_path)
+    assert os.path.exists(incremental.manifest_path(out))
+
+    stats = incremental.merge_incremental(src, out)
+    assert not stats.rebuilt and stats.files_read == 0
+    assert out.read_bytes() == _from_scratch(src, tmp_path)
+
+
+@pytest.mark.parametrize('options', [{}, {'union': True}, {'columns': ['subject_nr', 'response_time']},
+                                     {'annotate': True}])
+def test_append_new_logfiles(src, tmp_path, options):
+    out = tmp_path / 'merged.csv'
+    incremental.merge_incremental(src, out, **options)
+    before = out.read_bytes()
+    benchmarks.make_logfiles(src, 2, n_rows=30, n_columns=20, first=5, seed=1)
+
+    stats = incremental.merge_incremental(src, out, **options)
+    assert not stats.rebuilt and stats.files_read == stats.files_merged == 2
+    after = out.read_bytes()
+    assert after.startswith(before)
+    if not options:
+        new = [path for path in merge.list_logfiles(src)
+               if os.path.basename(path) in ('subject-5.csv', 'subject-6.csv')]
+        assert after[len(before):] == b''.join(_body(path) for path in new)
+    # the same rows as a merge from scratch, possibly in another order
+    assert sorted(after.splitlines()) == sorted(_from_scratch(src, tmp_path, **options).splitlines())
+
+
+def test_touched_logfile_is_not_merged_again(src, tmp_path):
+    out = tmp_path / 'merged.csv'
+    incremental.merge_incremental(src, out)
+    path = src / 'subject-2.csv'
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+    stats = incremental.merge_incremental(src, out)
+    assert not stats.rebuilt and stats.files_read == 0
+    # the new modification time is remembered
+    assert incremental.merge_incremental(src, out).files_read == 0
+
+
+def test_changed_logfile_rebuilds(src, tmp_path):
+    out = tmp_path / 'merged.csv'
+    incremental.merge_incremental(src, out)
+    with open(src / 'subject-2.csv', 'a') as fout:
+        fout.write(','.join(['"1"'] * 20) + '\n')
+    stats = incremental.merge_incremental(src, out)
+    assert stats.rebuilt and stats.reason == 'changed {}'.format(src / 'subject-2.csv')
+    assert out.read_bytes() == _from_scratch(src, tmp_path)
+
+
+def test_removed_logfile_rebuilds(src, tmp_path):
+    out = tmp_path / 'merged.csv'
+    incremental.merge_incremental(src, out)
+    os.remove(src / 'subject-3.csv')
+    stats = incremental.merge_incremental(src, out)
+    assert stats.rebuilt and stats.reason.startswith('removed')
+    assert out.read_bytes() == _from_scratch(src, tmp_path)
+
+
+@pytest.mark.parametrize('change, reason', [
+    (lambda out: out.write_bytes(out.read_bytes()[:-10]), 'merged file changed'),
+    (lambda out: out.unlink(), 'merged file missing'),
+])
+def test_changed_merged_file_rebuilds(src, tmp_path, change, reason):
+    out = tmp_path / 'merged.csv'
+    incremental.merge_incremental(src, out)
+    change(out)
+    stats = incremental.merge_incremental(src, out)
+    assert stats.rebuilt and stats.reason == reason
+    assert out.read_bytes() == _from_scratch(src, tmp_path)
+
+
+def test_changed_options_rebuild(src, tmp_path):
+    out = tmp_path / 'merged.csv'
+    incremental.merge_incremental(src, out)
+    stats = incremental.merge_incremental(src, out, drop_columns=['count_*'])
+    assert stats.rebuilt and stats.reason == 'merge options changed'
+    assert out.read_bytes() == _from_scratch(src, tmp_path, drop_columns=['count_*'])
+
+
+def test_new_columns_rebuild_a_union(src, tmp_path):
+    out = tmp_path / 'merged.csv'
+    incremental.merge_incremental(src, out, union=True)
+    (src / 'subject-9.csv').write_text('"subject_nr","age"\n"9","21"\n')
+    stats = incremental.merge_incremental(src, out, union=True)
+    assert stats.rebuilt and stats.reason == 'new columns in {}'.format(src / 'subject-9.csv')
+    assert out.read_bytes() == _from_scratch(src, tmp_path, union=True)
+
+
+def test_empty_first_merge(tmp_path):
+    src = tmp_path / 'data'
+    src.mkdir()
+    out = tmp_path / 'merged.csv'
+    assert incremental.merge_incremental(src, out).files_read == 0
+    benchmarks.make_logfiles(src, 2, n_rows=5, n_columns=20)
+    stats = incremental.merge_incremental(src, out)
+    assert stats.rebuilt and stats.reason == 'no reference header'
+    assert out.read_bytes() == _from_scratch(src, tmp_path)
+
+
+def test_tar_archive_is_refused(src, tmp_path):
+    with tarfile.open(tmp_path / 'data.tar', 'w') as tar:
+        tar.add(src, arcname='data')
+    with pytest.raises(ValueError):
+        incremental.merge_incremental(tmp_path / 'data.tar', tmp_path / 'merged.csv')
@@ -0,0 +1,154 @@
+"""Tests of ``oslogs.merge`` against the merge loop of the merging tutorial."""
+import os
+
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, merge
+
+HEADER = '"subject_nr","response_time","correct"'
+
+
+def _tutorial_merge(src, out):
+    # the loop of content/07_files/merging_files.ipynb
+    fout = open(out, 'w')
+    filecount = 0
+    for basename in os.listdir(src):
+        path = os.path.join(src, basename)
+        fhand = open(path)
+        linecount = 0
+        for line in fhand:
+            if linecount == 0:
+                if filecount == 0:
+                    refheader = line
+                    fout.write(line)
+                    write_this_file = True
+                else:
+                    write_this_file = line == refheader
+            elif write_this_file:
+                fout.write(line)
+            linecount = linecount + 1
+        fhand.close()
+        filecount = filecount + 1
+    fout.close()
+
+
+@pytest.fixture
+def logfiles(tmp_path):
+    src = tmp_path / 'data'
+    src.mkdir()
+    rows = ''.join('"{}","{}","1"\n'.format(pp, 500 + pp * j) for pp in (1, 2) for j in range(5))
+    files = {
+        'subject-1.csv': HEADER + '\n' + rows,
+        'subject-2.csv': (HEADER + '\n' + rows).replace('\n', '\r\n'),
+        'subject-3.csv': HEADER + '\n' + rows + '"3","611","0"',
+        'subject-4.csv': '"subject_nr","response_time"\n"4","520"\n',
+        'subject-5.csv': HEADER + '\n' + rows,
+        'subject-6.csv': (HEADER + '\n' + rows).replace('\n', '\r'),
+        'subject-7.csv': HEADER + '\n',
+        'subject-8.csv': HEADER + '\r\n"8","640","1"\r\n',
+    }
+    for name, content in files.items():
+        (src / name).write_bytes(content.encode())
+    return src
+
+
+@pytest.mark.parametrize('chunk_size', [7, merge.CHUNK_SIZE])
+@pytest.mark.parametrize('workers', [1, 4])
+def test_byte_identical_to_the_tutorial(logfiles, tmp_path, chunk_size, workers):
+    _tutorial_merge(logfiles, tmp_path / 'expected.csv')
+    stats = merge.merge_logfiles(logfiles, tmp_path / 'merged.csv', workers=workers,
+                                 chunk_size=chunk_size)
+    assert (tmp_path / 'merged.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()
+    # the first file in os.listdir order has the reference header
+    names = os.listdir(logfiles)
+    odd = names[0] == 'subject-4.csv'
+    skipped = [name for name in names if (name == 'subject-4.csv') != odd]
+    assert stats.files_read == 8 and stats.files_merged == 8 - len(skipped)
+    assert stats.skipped == [str(logfiles / name) for name in skipped]
+
+
+def test_exclude_and_pattern(logfiles, tmp_path):
+    stats = merge.merge_logfiles(logfiles, tmp_path / 'merged.csv', pattern='subject-[1-4].csv',
+                                 exclude=['subject-2.csv'])
+    assert stats.files_read == 3
+    assert merge.list_logfiles(logfiles, exclude=['subject-2.csv']) == [
+        str(logfiles / name) for name in os.listdir(logfiles) if name != 'subject-2.csv']
+
+
+def test_output_in_the_source_folder_is_not_merged(logfiles):
+    out = logfiles / 'merged.csv'
+    out.write_text(HEADER + '\n"9","999","1"\n')
+    stats = merge.merge_logfiles(logfiles, out)
+    assert stats.files_read == 8
+    assert b'"999"' not in out.read_bytes()
+
+
+def test_no_logfiles(tmp_path):
+    stats = merge.merge_logfiles(tmp_path, tmp_path / 'merged.csv')
+    assert stats.files_read == 0
+    assert (tmp_path / 'merged.csv').read_bytes() == b''
+
+
+@pytest.mark.parametrize('content, expected', [
+    (b'a\r\nb\rc\n', b'a\nb\nc\n'),
+    (b'ab\r\n\r\r', b'ab\n\n\n'),
+    (b'a\r', b'a\n'),
+])
+def test_normalized_chunks_across_chunk_boundaries(tmp_path, content, expected):
+    path = tmp_path / 'file.csv'
+    path.write_bytes(content)
+    with open(path, 'rb') as fhand:
+        assert b''.join(merge.normalized_chunks(fhand, 2)) == expected
+
+
+def _read_all(paths):
+    return [pd.read_csv(path, dtype=str, keep_default_na=False) for path in paths]
+
+
+def test_union_like_concat(logfiles, tmp_path):
+    (logfiles / 'subject-9.csv').write_text('"correct","block","subject_nr"\n"0","2","9"\n"1","2","9"\n')
+    stats = merge.merge_union(logfiles, tmp_path / 'merged.csv', missing='NA')
+    paths = merge.list_logfiles(logfiles)
+    expected = pd.concat(_read_all(paths), ignore_index=True).fillna('NA')
+    assert stats.files_merged == 9 and not stats.skipped
+    assert stats.columns == list(expected.columns)
+    result = pd.read_csv(tmp_path / 'merged.csv', dtype=str, keep_default_na=False)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_union_columns_in_order_of_appearance():
+    assert merge.union_columns([['a', 'b'], ['c', 'a'], ['b', 'd']]) == ['a', 'b', 'c', 'd']
+
+
+AVAILABLE = ['block', 'count_a', 'count_b', 'correct', 'response_time', 'subject_nr']
+
+
+@pytest.mark.parametrize('columns, drop_columns, expected', [
+    (None, (), AVAILABLE),
+    (['subject_nr', 'count_*'], (), ['subject_nr', 'count_a', 'count_b']),
+    (None, ['count_*', 'block'], ['correct', 'response_time', 'subject_nr']),
+    (['c*'], ['count_b'], ['count_a', 'correct']),
+    (['no_such_*'], (), []),
+])
+def test_project_columns(columns, drop_columns, expected):
+    assert merge.project_columns(AVAILABLE, columns, drop_columns) == expected
+
+
+def test_project_missing_column():
+    with pytest.raises(KeyError, match='age'):
+        merge.project_columns(AVAILABLE, ['subject_nr', 'age'])
+
+
+@pytest.mark.parametrize('union', [False, True])
+def test_projected_merge_like_selecting_columns(tmp_path, union):
+    src = tmp_path / 'data'
+    benchmarks.make_logfiles(src, 3, n_rows=25, n_columns=40)
+    out = tmp_path / 'merged.csv'
+    merged = merge.merge_union if union else merge.merge_logfiles
+    stats = merged(src, out, columns=['subject_nr', 'response_*', 'count_item_1*'],
+                   drop_columns=['count_item_10'], chunk_size=100)
+    expected = pd.concat(_read_all(merge.list_logfiles(src)), ignore_index=True)[stats.columns]
+    assert stats.columns[:2] == ['subject_nr', 'response_time']
+    assert 'count_item_10' not in stats.columns and 'count_item_11' in stats.columns
+    pd.testing.assert_frame_equal(pd.read_csv(out, dtype=str, keep_default_na=False), expected)
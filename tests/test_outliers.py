@@ -0,0 +1,91 @@
+"""Tests of ``oslogs.outliers``: trials and counts per rule against a loop per group."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import outliers
+
+BY = ['subject_nr', 'congruency_type']
+
+
+@pytest.fixture
+def trials():
+    rng = np.random.default_rng(0)
+    n = 6000
+    frame = pd.DataFrame({
+        'subject_nr': rng.integers(1, 16, n),
+        'congruency_type': rng.choice(['congruent', 'incongruent'], n),
+        'correct': (rng.random(n) < 0.9).astype(int),
+        'response': np.where(rng.random(n) < 0.03, 'None', 'a'),
+        'response_time': rng.lognormal(6.2, 0.5, n).round(),
+    })
+    frame.loc[rng.random(n) < 0.01, 'response_time'] = np.nan
+    # a condition with a single trial has no standard deviation
+    frame.loc[len(frame)] = [99, 'congruent', 1, 'a', 500.0]
+    return frame
+
+
+def _reference(frame, cutoffs, sd, mad):
+    """Apply the rules one after another with a loop per group, counting what each removes."""
+    counts = {}
+
+    def apply(rule, keep):
+        nonlocal frame
+        counts[rule] = int((~keep).sum())
+        frame = frame[keep]
+
+    apply('no response', frame['response'].notna() & (frame['response'] != 'None'))
+    apply('incorrect', frame['correct'] == 1)
+    apply('cutoff', (frame['response_time'] >= cutoffs[0]) & (frame['response_time'] <= cutoffs[1]))
+    for rule in ('sd', 'mad'):
+        keep = pd.Series(True, index=frame.index)
+        for _, group in frame.groupby(BY):
+            times = group['response_time']
+            if rule == 'sd':
+                keep[group.index] = ~((times - times.mean()).abs() > sd * times.std())
+            else:
+                deviations = (times - times.median()).abs()
+                keep[group.index] = ~(deviations > mad * outliers.MAD_SCALE * deviations.median())
+        apply(rule, keep)
+    return frame.reset_index(drop=True), counts
+
+
+@pytest.mark.parametrize('sd, mad', [(2.5, 3), (2, 2.5)])
+def test_counts_per_rule_like_a_loop(trials, sd, mad):
+    result, report = outliers.filter_trials(trials, by=BY, sd=sd, mad=mad)
+    expected, counts = _reference(trials, outliers.CUTOFFS, sd, mad)
+    pd.testing.assert_frame_equal(result, expected)
+    assert report.counts.to_dict() == counts
+    assert all(counts.values())
+    assert report.kept == len(result) and report.rows == len(trials)
+
+
+def test_the_tutorial_rule(trials):
+    # SPSS: extreme_responses for times outside 100-1000 ms, keep correct = 1 & extreme = 0
+    result, report = outliers.filter_trials(trials, drop_no_response=False)
+    extreme = ~trials['response_time'].between(100, 1000)
+    expected = trials[(trials['correct'] == 1) & ~extreme].reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected)
+    assert list(report.counts.index) == ['incorrect', 'cutoff']
+    reasons = report.reasons
+    assert (reasons == 'cutoff').sum() == (extreme & (trials['correct'] == 1)).sum()
+    assert reasons.isna().sum() == len(result)
+
+
+def test_report_per_subject(trials):
+    _, report = outliers.filter_trials(trials, by=BY, sd=2.5, mad=3)
+    expected = pd.crosstab(trials['subject_nr'], report.reasons)
+    table = report.table
+    assert table.index.tolist() == sorted(trials['subject_nr'].unique())
+    assert (table['trials'] == trials['subject_nr'].value_counts().sort_index()).all()
+    for rule in report.counts.index:
+        assert table[rule].tolist() == expected[rule].reindex(table.index, fill_value=0).tolist()
+    assert table['kept'].sum() == report.kept
+    assert 'Kept' in str(report)
+
+
+def test_every_rule_off(trials):
+    result, report = outliers.filter_trials(trials, cutoffs=None, drop_no_response=False,
+                                            correct_only=False, report_by=())
+    pd.testing.assert_frame_equal(result, trials.reset_index(drop=True))
+    assert report.counts.empty and report.table['kept'].tolist() == [len(trials)]
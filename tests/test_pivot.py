@@ -0,0 +1,57 @@
+"""Tests of ``oslogs.pivot`` against the ``columns_to_check`` loop of the tutorial."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import pivot
+
+
+def _loop(frame, columns, index='subject_nr'):
+    return pd.concat([frame.pivot_table(index=[index], columns=[column], aggfunc='size')
+                      for column in columns], axis=1)
+
+
+@pytest.fixture
+def trials():
+    rng = np.random.default_rng(0)
+    n = 2000
+    return pd.DataFrame({
+        'subject_nr': rng.integers(1, 30, n),
+        'task_type': rng.choice(['color', 'shape'], n),
+        'session': rng.integers(1, 4, n),
+        'response': rng.choice(['left', 'right', None], n),
+    })
+
+
+def test_every_combination(trials):
+    columns = ['task_type', 'session', 'response']
+    pd.testing.assert_frame_equal(pivot.count_by(trials, columns), _loop(trials, columns))
+
+
+@pytest.mark.parametrize('columns', [['session'], ['task_type', 'session'],
+                                     ['session', 'task_type', 'response']])
+def test_missing_combination(trials, columns):
+    # subject 1 never did session 3, subject 2 has no response at all
+    trials = trials[~((trials['subject_nr'] == 1) & (trials['session'] == 3))].copy()
+    trials.loc[trials['subject_nr'] == 2, 'response'] = None
+    result = pivot.count_by(trials, columns)
+    pd.testing.assert_frame_equal(result, _loop(trials, columns))
+    assert np.isnan(result.loc[1, 3])
+
+
+def test_counts_table_blocks_with_different_rows():
+    first = pd.DataFrame({'a': [1, 2, 0]}, index=pd.Index([1, 2, 4], name='subject_nr'))
+    second = pd.DataFrame({'b': [3, 1]}, index=pd.Index([2, 3], name='subject_nr'))
+    table = pivot.counts_table([first, second])
+    # subject 4 has no counts at all
+    expected = pd.DataFrame({'a': [1, 2, np.nan], 'b': [np.nan, 3, 1]},
+                            index=pd.Index([1, 2, 3], name='subject_nr'))
+    pd.testing.assert_frame_equal(table, expected)
+
+
+def test_counts_table_keeps_integers_without_gaps():
+    first = pd.DataFrame({'a': [1, 2]}, index=pd.Index([1, 2], name='subject_nr'))
+    second = pd.DataFrame({'b': [3, 0], 'c': [0, 1]}, index=pd.Index([1, 2], name='subject_nr'))
+    table = pivot.counts_table([first, second])
+    assert table['a'].dtype == 'int64'
+    assert (table[['b', 'c']].dtypes == 'float64').all()
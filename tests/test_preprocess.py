@@ -0,0 +1,57 @@
+"""Tests of ``oslogs.preprocess`` against the datawrangling steps on the whole table."""
+import functools
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, chunked, columnar, merge, pivot, preprocess
+
+RECODE = {3: 1, 4: 2}
+
+
+@pytest.fixture
+def src(tmp_path):
+    benchmarks.make_logfiles(tmp_path / 'data', 5, n_rows=150, n_columns=40, first=3)
+    return tmp_path / 'data'
+
+
+def _tutorial(src):
+    df = pd.concat((pd.read_csv(path) for path in merge.list_logfiles(src)), ignore_index=True)
+    df_trim = df[chunked.INCLUDE_COLUMNS]
+    df_trim_blocks = df_trim[df_trim['block'] < 11].copy()
+    for old, new in RECODE.items():
+        df_trim_blocks['subject_nr'] = df_trim_blocks['subject_nr'].replace(old, new)
+    return columnar.apply_dtypes(df_trim_blocks.reset_index(drop=True))
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_like_the_tutorial(src, processes):
+    frame = preprocess.preprocess_subjects(src, recode=RECODE, processes=processes, batch_size=2)
+    pd.testing.assert_frame_equal(frame, _tutorial(src))
+    assert sorted(frame['subject_nr'].cat.categories) == [1, 2, 5, 6, 7]
+
+
+def test_aggregate_per_subject(src):
+    count = functools.partial(pivot.count_by, columns=['task_type'])
+    counts = preprocess.preprocess_subjects(src, recode=RECODE, aggregate=count, processes=2)
+    trials = _tutorial(src).astype({'subject_nr': 'int64', 'task_type': 'str'})
+    expected = trials.pivot_table(index='subject_nr', columns='task_type', aggfunc='size')
+    # count_by keeps the categories of task_type as columns
+    counts.columns = counts.columns.astype('str')
+    pd.testing.assert_frame_equal(counts.sort_index(), expected, check_names=False)
+
+
+def test_from_a_zip_archive(src, tmp_path):
+    with zipfile.ZipFile(tmp_path / 'data.zip', 'w') as zfile:
+        for path in merge.list_logfiles(src):
+            zfile.write(path, os.path.basename(path))
+    frame = preprocess.preprocess_subjects(tmp_path / 'data.zip', recode=RECODE, processes=2)
+    pd.testing.assert_frame_equal(frame, _tutorial(src))
+
+
+def test_error_names_the_logfile(src):
+    (src / 'subject-9.csv').write_text('"subject_nr","block","response_time"\n"9","1","slow"\n')
+    with pytest.raises(ValueError, match='subject-9.csv'):
+        preprocess.preprocess_subjects(src, processes=1)
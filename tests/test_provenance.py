@@ -0,0 +1,56 @@
+"""Tests of ``oslogs.provenance`` against Exercise 4 of the merging tutorial."""
+import pytest
+
+from oslogs import provenance
+
+
+def _per_line(src, dst):
+    # Exercise 4: rewrite every line in Python
+    name = src.name
+    pp = provenance.participant_from_path(src)
+    with open(src) as fhand, open(dst, 'w') as fout:
+        for linecount, line in enumerate(fhand):
+            fout.write(name + '\t' + pp + '\t' + str(linecount) + '\t' + line)
+
+
+@pytest.mark.parametrize('n', [0, 1, 9999, 10001, 25000])
+def test_annotate_file_like_the_tutorial(tmp_path, n):
+    src = tmp_path / 'file_pp3.txt'
+    src.write_text(''.join('Hello world. \t line {}\n'.format(j) for j in range(n)))
+    _per_line(src, tmp_path / 'expected.txt')
+    # a small chunk size cuts lines and runs of row numbers across blocks
+    provenance.annotate_file(src, tmp_path / 'result.txt', chunk_size=1000)
+    assert (tmp_path / 'result.txt').read_bytes() == (tmp_path / 'expected.txt').read_bytes()
+
+
+def test_annotate_file_with_header(tmp_path):
+    src = tmp_path / 'subject-2.csv'
+    src.write_bytes(b'a,b\r\n1,2\r\n3,4')
+    provenance.annotate_file(src, tmp_path / 'result.csv', delimiter=',', header=True)
+    assert (tmp_path / 'result.csv').read_bytes() == (
+        b'source_file,participant,source_row,a,b\n'
+        b'subject-2.csv,2,0,1,2\n'
+        b'subject-2.csv,2,1,3,4')
+
+
+def test_quoted_fields():
+    annotator = provenance.Annotator('subject-1.csv', '1', quote=b'"')
+    annotator.rows = 123455
+    assert annotator.annotate(b'"x"\n"y"\n') == (b'"subject-1.csv","1","123455","x"\n'
+                                                 b'"subject-1.csv","1","123456","y"\n')
+
+
+def test_row_digits_across_runs():
+    runs = list(provenance.row_digits(9998, 20002))
+    rows = [high + low[:-1] for _, _, high, lows in runs for low in lows]
+    assert rows == [b'%d' % row for row in range(9998, 20002)]
+
+
+@pytest.mark.parametrize('path, participant', [
+    ('data/subject-3.csv', '3'),
+    ('data/sub_03.csv', '03'),
+    ('tutorial_data2/pp7/file.txt', '7'),
+    ('data/notes.txt', ''),
+])
+def test_participant_from_path(path, participant):
+    assert provenance.participant_from_path(path) == participant
@@ -0,0 +1,68 @@
+"""Tests of ``oslogs.query``: a lazy query gives what filtering the full table gives."""
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, columnar, merge, query
+
+COLUMNS = ['subject_nr', 'block', 'correct', 'response_time', 'task_type']
+
+
+@pytest.fixture
+def src(tmp_path):
+    benchmarks.make_logfiles(tmp_path / 'data', 5, n_rows=120, n_columns=30)
+    return tmp_path / 'data'
+
+
+def _eager(src):
+    # the datawrangling tutorial: read everything, then select and filter
+    frame = pd.concat([pd.read_csv(path) for path in merge.list_logfiles(src)], ignore_index=True)
+    frame = frame[COLUMNS]
+    frame = frame[frame['block'] < 11]
+    return frame[frame['correct'] == 1].reset_index(drop=True)
+
+
+def _lazy(src):
+    return (query.scan_logs(src).select(COLUMNS)
+            .filter('block', '<', 11).filter('correct', '==', 1))
+
+
+@pytest.mark.parametrize('chunk_rows', [query.CHUNK_ROWS, 7])
+def test_lazy_like_eager(src, monkeypatch, chunk_rows):
+    monkeypatch.setattr(query, 'CHUNK_ROWS', chunk_rows)
+    pd.testing.assert_frame_equal(_lazy(src).collect(workers=2), _eager(src))
+
+
+@pytest.mark.parametrize('name', ['merged.parquet', 'merged.feather'])
+def test_lazy_on_columnar_files(src, tmp_path, name):
+    pytest.importorskip('pyarrow')
+    columnar.merge_columnar(src, tmp_path / name)
+    frame = _lazy(tmp_path / name).collect(dtypes=columnar.LOG_DTYPES)
+    expected = columnar.apply_dtypes(_eager(src).astype({'task_type': 'str'}))
+    pd.testing.assert_frame_equal(frame, expected, check_categorical=False)
+
+
+def test_filter_on_a_column_that_is_not_selected(src):
+    frame = query.scan_logs(src).select(['response_time']).filter('task_type', 'in',
+                                                                  ['parity']).collect()
+    everything = pd.concat([pd.read_csv(path) for path in merge.list_logfiles(src)],
+                           ignore_index=True)
+    expected = everything.loc[everything['task_type'] == 'parity', ['response_time']]
+    pd.testing.assert_frame_equal(frame, expected.reset_index(drop=True))
+
+
+def test_missing_columns_are_empty(src):
+    (src / 'subject-9.csv').write_text('"subject_nr","block"\n"9","1"\n')
+    frame = query.scan_logs(src).select(['subject_nr', 'correct']).collect()
+    assert frame.loc[frame['subject_nr'] == 9, 'correct'].isna().all()
+    with pytest.raises(KeyError):
+        query.scan_logs(src).filter('age', '>', 18).collect()
+
+
+def test_query_is_immutable_and_checked(src):
+    base = query.scan_logs(src)
+    filtered = base.filter('block', '<', 11)
+    assert base.filters == () and filtered.filters == (('block', '<', 11),)
+    assert repr(filtered.select(['block'])) == "scan_logs({!r}).select(['block'])" \
+        ".filter('block', '<', 11)".format(src)
+    with pytest.raises(ValueError):
+        base.filter('block', '~', 11)
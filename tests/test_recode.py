@@ -0,0 +1,63 @@
+"""Tests of ``oslogs.recode`` against the tutorial's chained ``replace`` calls."""
+import pandas as pd
+import pytest
+
+from oslogs import recode
+
+
+def test_mapping_in_order_of_appearance():
+    mapping = recode.build_mapping(pd.Series([3, 3, 4, 3, 7]))
+    assert mapping.to_dict() == {3: 1, 4: 2, 7: 3}
+
+
+def test_existing_mapping_is_kept():
+    existing = recode.build_mapping(pd.Series([3, 4]))
+    mapping = recode.build_mapping(pd.Series([5, 4, 3]), existing=existing)
+    assert mapping.to_dict() == {3: 1, 4: 2, 5: 3}
+
+
+def test_hash_needs_a_salt():
+    with pytest.raises(ValueError):
+        recode.build_mapping(pd.Series([1, 2]), method='hash')
+
+
+def test_same_as_chained_replace():
+    values = pd.Series([3, 4, 3, 5, 4], name='subject_nr')
+    mapping = recode.build_mapping(values)
+    chained = values
+    for old, new in mapping.items():
+        chained = chained.replace(old, new)
+    pd.testing.assert_series_equal(recode.recode_values(values, mapping), chained)
+
+
+def test_unknown_values():
+    values = pd.Series([1, 2, 3])
+    with pytest.raises(KeyError):
+        recode.recode_values(values, {1: 10})
+    assert recode.recode_values(values, {1: 10}, unknown='keep').tolist() == [10, 2, 3]
+
+
+def test_missing_values_stay_missing():
+    result = recode.recode_values(pd.Series([1, None, 2]), {1: 10, 2: 20})
+    assert result.isna().tolist() == [False, True, False]
+
+
+def test_categories_are_renamed():
+    values = pd.Series([1, 3, 1]).astype('category')
+    result = recode.recode_values(values, {1: 10, 3: 30})
+    assert isinstance(result.dtype, pd.CategoricalDtype)
+    assert result.tolist() == [10, 30, 10]
+
+
+def test_categories_that_get_the_same_value_merge():
+    values = pd.Series([1, 3, 2, 3])
+    expected = recode.recode_values(values, {3: 1}, unknown='keep')
+    result = recode.recode_values(values.astype('category'), {3: 1}, unknown='keep')
+    assert result.tolist() == expected.tolist() == [1, 1, 2, 1]
+    assert list(result.cat.categories) == [1, 2]
+
+
+def test_save_and_load(tmp_path):
+    mapping = recode.build_mapping(pd.Series([3, 4]))
+    recode.save_mapping(mapping, tmp_path / 'mapping.csv')
+    pd.testing.assert_series_equal(recode.load_mapping(tmp_path / 'mapping.csv'), mapping)
@@ -0,0 +1,64 @@
+"""Tests of ``oslogs.reshape`` against the tutorial's melt, split and pivot_table."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, reshape
+
+DATA_MESSY = [['tom', 26, 12, 15, 15, 17, 18, 20],
+              ['nick', 23, 10, 19, 12, 14, 11, 18],
+              ['julie', 18, 15, 23, 14, 18, 12, 19],
+              ['angela', 21, 10, 11, 12, 14, 15, 30]]
+COLUMNS = ['name', 'age', 't1_min', 't1_max', 't2_min', 't2_max', 't3_min', 't3_max']
+
+
+def _tutorial(df_messy):
+    # content/10_dataframes/dataframes_python_lessons.ipynb
+    df_messy = pd.melt(df_messy, id_vars=['name', 'age'], var_name='time_minmax', value_name='score')
+    df_messy[['time', 'minmax']] = df_messy.time_minmax.str.split('_', expand=True)
+    del df_messy['time_minmax']
+    df_messy = df_messy.pivot_table(index=['name', 'age', 'time'], columns='minmax', values='score')
+    df_messy.reset_index(drop=False, inplace=True)
+    return df_messy
+
+
+def _check(result, expected):
+    assert isinstance(result['time'].dtype, pd.CategoricalDtype)
+    expected = expected.rename_axis(columns=None)
+    pd.testing.assert_frame_equal(result.astype({'time': 'str'}), expected[result.columns],
+                                  check_dtype=False)
+
+
+@pytest.mark.parametrize('df_messy', [
+    pd.DataFrame(DATA_MESSY, columns=COLUMNS),
+    benchmarks.make_wide(60, n_columns=30),
+])
+def test_sorted_like_the_tutorial(df_messy):
+    _check(reshape.wide_to_long(df_messy, ['name', 'age'], sort=True), _tutorial(df_messy))
+
+
+def test_unsorted_keeps_the_row_order():
+    df_messy = pd.DataFrame(DATA_MESSY, columns=COLUMNS)
+    result = reshape.wide_to_long(df_messy, ['name', 'age'])
+    assert result['name'].tolist() == [name for name, *_ in DATA_MESSY for _ in range(3)]
+    assert list(result.columns) == ['name', 'age', 'time', 'min', 'max']
+    assert result['min'].tolist() == [row[i] for row in DATA_MESSY for i in (2, 4, 6)]
+    assert result['max'].tolist() == [row[i] for row in DATA_MESSY for i in (3, 5, 7)]
+
+
+def test_columns_in_another_order_and_missing_pairs():
+    df_messy = pd.DataFrame(DATA_MESSY, columns=COLUMNS)
+    df_messy = df_messy[['age', 't2_max', 'name', 't1_min', 't1_max', 't2_min', 't3_min']]
+    result = reshape.wide_to_long(df_messy, ['name', 'age'], sort=True)
+    _check(result, _tutorial(df_messy))
+    assert np.isnan(result.loc[result['time'] == 't3', 'max']).all()
+
+
+def test_split_columns():
+    times, measures, grid = reshape.split_columns(['t1_min', 't2_max', 't1_max', 'x_y_z'])
+    assert times == ['t1', 't2', 'x'] and measures == ['min', 'max', 'y_z']
+    assert grid.tolist() == [[0, 2, -1], [-1, 1, -1], [-1, -1, 3]]
+    with pytest.raises(ValueError):
+        reshape.split_columns(['t1_min', 't1'])
+    with pytest.raises(ValueError):
+        reshape.wide_to_long(pd.DataFrame(columns=['id', 't1_min', 't1_min']), ['id'])
@@ -0,0 +1,98 @@
+"""Tests of ``oslogs.sketch`` against ``describe()`` and ``np.histogram`` of the whole column."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, merge, sketch
+
+
+@pytest.fixture
+def times():
+    rng = np.random.default_rng(1)
+    return rng.lognormal(6.5, 0.3, 200000).round()
+
+
+def _parts(values, n):
+    return np.array_split(values, n)
+
+
+def test_moments_of_parts_are_exact(times):
+    moments = sketch.Moments()
+    for part in _parts(times, 7):
+        moments.merge(sketch.Moments().update(part))
+    series = pd.Series(times)
+    assert moments.count == len(times)
+    assert moments.mean == pytest.approx(series.mean(), rel=1e-12)
+    assert moments.std == pytest.approx(series.std(), rel=1e-12)
+    assert (moments.min, moments.max) == (series.min(), series.max())
+
+
+def _rank_errors(quantile_sketch, values, qs):
+    ranks = np.searchsorted(np.sort(values), quantile_sketch.quantile(qs), side='right')
+    return np.abs(ranks / len(values) - qs)
+
+
+@pytest.mark.parametrize('k', [200, 1000])
+def test_kll_rank_error_bound(k):
+    # distinct values, so the rank of every estimate is well defined
+    values = np.random.default_rng(2).normal(600, 100, 300000)
+    qs = np.linspace(0.01, 0.99, 99)
+    updated = sketch.QuantileSketch(k).update(values)
+    merged = sketch.QuantileSketch(k)
+    for i, part in enumerate(_parts(values, 10)):
+        merged.merge(sketch.QuantileSketch(k, seed=i).update(part))
+    for quantile_sketch in (updated, merged):
+        assert quantile_sketch.count == len(values)
+        # about 1.7 / k on average; the largest of 99 errors stays within 4 / k
+        errors = _rank_errors(quantile_sketch, values, qs)
+        assert errors.max() < 4 / k
+        assert errors.mean() < 1.7 / k
+        assert len(quantile_sketch) < 3 * k + 100
+
+
+def test_exact_before_compacting():
+    values = np.random.default_rng(3).normal(600, 100, 500)
+    quantile_sketch = sketch.QuantileSketch(1000).update(values)
+    qs = [0, 0.1, 0.25, 0.5, 0.9, 1]
+    np.testing.assert_allclose(quantile_sketch.quantile(qs), pd.Series(values).quantile(qs))
+    assert np.isnan(sketch.QuantileSketch().quantile(0.5))
+
+
+def test_describe_like_series_describe():
+    values = pd.Series([512.0, 430.0, np.nan, 650.0, 701.0, 399.0], name='response_time')
+    result = sketch.Summary().update(values).describe(name='response_time')
+    pd.testing.assert_series_equal(result, values.describe())
+
+
+def test_histogram_like_np_histogram(times):
+    histogram = sketch.Histogram()
+    for part in _parts(times, 5):
+        histogram.merge(sketch.Histogram().update(part))
+    counts, edges = np.histogram(times, bins=10000, range=(0, 10000))
+    np.testing.assert_array_equal(histogram.counts, counts)
+    np.testing.assert_array_equal(histogram.edges, edges)
+    # whole numbers in bins of 1 ms rebin exactly
+    for bins, value_range in [(30, None), (17, (300, 1200))]:
+        counts, edges = np.histogram(times, bins=bins, range=value_range or (times.min(), times.max()))
+        result = histogram.rebin(bins, value_range)
+        np.testing.assert_array_equal(result[0], counts)
+        np.testing.assert_allclose(result[1], edges)
+
+
+def test_histogram_out_of_range_and_bins():
+    histogram = sketch.Histogram(0, 100, 10).update([-1, 0, 99.5, 100, 250, np.nan])
+    assert (histogram.under, histogram.over) == (1, 2)
+    assert histogram.counts[0] == 1 and histogram.counts[-1] == 1
+    with pytest.raises(ValueError):
+        histogram.merge(sketch.Histogram(0, 100, 5))
+
+
+def test_summarize_logfiles_like_groupby(tmp_path):
+    src = tmp_path / 'data'
+    benchmarks.make_logfiles(src, 4, n_rows=300, n_columns=20)
+    summaries = sketch.summarize_logfiles(src, by=['subject_nr'], filters=[('correct', '==', 1)],
+                                          workers=2)
+    frame = pd.concat([pd.read_csv(path) for path in merge.list_logfiles(src)])
+    expected = frame[frame['correct'] == 1].groupby('subject_nr')['response_time'].describe()
+    result = sketch.describe_groups(summaries, ['subject_nr'])
+    pd.testing.assert_frame_equal(result, expected, check_exact=False)
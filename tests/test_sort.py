@@ -0,0 +1,73 @@
+"""Tests of ``oslogs.sort`` against sorting and deduplicating with pandas."""
+import random
+
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, sort
+
+KEYS = ['subject_nr', 'block', 'count_item_0']
+
+
+@pytest.fixture
+def merged(tmp_path):
+    paths = benchmarks.make_logfiles(tmp_path / 'data', 12, n_rows=40, n_columns=20)
+    lines = []
+    for path in paths:
+        with open(path, 'rb') as fhand:
+            header = fhand.readline()
+            lines.extend(fhand.readlines())
+    rng = random.Random(0)
+    # a participant's logfile that was merged twice, and rows out of order
+    lines += lines[:40]
+    rng.shuffle(lines)
+    path = tmp_path / 'merged.csv'
+    path.write_bytes(header + b''.join(lines))
+    return path
+
+
+def _expected(path, keys, dedupe):
+    with open(path, 'rb') as fhand:
+        header = fhand.readline()
+        lines = fhand.readlines()
+    frame = pd.read_csv(path, dtype=str)
+    frame['line'] = lines
+    if dedupe:
+        frame = frame.drop_duplicates('line')
+    frame = frame.sort_values(keys, key=pd.to_numeric, kind='stable')
+    return header + b''.join(frame['line'])
+
+
+@pytest.mark.parametrize('memory', [sort.MEMORY, 20000])
+@pytest.mark.parametrize('dedupe', [True, False])
+def test_like_pandas(merged, tmp_path, memory, dedupe):
+    stats = sort.sort_logfile(merged, tmp_path / 'sorted.csv', keys=KEYS, dedupe=dedupe,
+                              memory=memory)
+    assert (tmp_path / 'sorted.csv').read_bytes() == _expected(merged, KEYS, dedupe)
+    assert stats.rows_read == 520 and stats.duplicates == (40 if dedupe else 0)
+    assert stats.rows_written == stats.rows_read - stats.duplicates
+    assert (stats.runs > 1) == (memory < sort.MEMORY)
+
+
+def test_values_sort_as_numbers_then_text_then_empty():
+    values = ['10', '', 'b', '9', '-1.5', 'nan', 'a']
+    assert sorted(values, key=sort.sort_value) == ['-1.5', '9', '10', 'a', 'b', 'nan', '']
+
+
+def test_crlf_and_unterminated_last_line(tmp_path):
+    src = tmp_path / 'merged.csv'
+    src.write_bytes(b'"subject_nr","x"\r\n"10","a"\r\n"9","b"\r\n"10","a"\r\n"2","c"')
+    sort.sort_logfile(src, tmp_path / 'sorted.csv', keys=['subject_nr'])
+    assert (tmp_path / 'sorted.csv').read_bytes() == \
+        b'"subject_nr","x"\r\n"2","c"\r\n"9","b"\r\n"10","a"\r\n'
+
+
+def test_errors(merged, tmp_path):
+    with pytest.raises(KeyError, match='trial'):
+        sort.sort_logfile(merged, tmp_path / 'sorted.csv', keys=['subject_nr', 'trial'])
+    with pytest.raises(ValueError):
+        sort.sort_logfile(merged, merged)
+    src = tmp_path / 'multiline.csv'
+    src.write_bytes(b'"subject_nr","x"\n"1","a\nb"\n')
+    with pytest.raises(ValueError, match='line breaks'):
+        sort.sort_logfile(src, tmp_path / 'sorted.csv', keys=['subject_nr'])
@@ -0,0 +1,81 @@
+"""Tests of ``oslogs.sources``: merging straight from zip and tar archives."""
+import os
+import pathlib
+import tarfile
+import zipfile
+
+import pytest
+
+from oslogs import benchmarks, incremental, merge, sources
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = sorted(benchmarks.make_logfiles(tmp_path / 'data', 5, n_rows=40, n_columns=30))
+    # a file with a CRLF header that is skipped, and one to exclude
+    (tmp_path / 'data' / 'subject-6.csv').write_bytes(b'"subject_nr"\r\n"6"\r\n')
+    (tmp_path / 'data' / 'CI_RSI2000_test.csv').write_bytes(b'"test"\n')
+    return paths + [str(tmp_path / 'data' / 'subject-6.csv')]
+
+
+def _zip(paths, archive):
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zfile:
+        zfile.writestr('data/', '')
+        for path in paths:
+            zfile.write(path, 'data/' + os.path.basename(path))
+            zfile.writestr('__MACOSX/data/._' + os.path.basename(path), b'resource fork')
+    return archive
+
+
+def _tar(paths, archive):
+    with tarfile.open(archive, 'w:gz') as tar:
+        for path in paths:
+            tar.add(path, 'data/' + os.path.basename(path))
+    return archive
+
+
+@pytest.mark.parametrize('make, name', [(_zip, 'data.zip'), (_tar, 'data.tar.gz')])
+@pytest.mark.parametrize('union', [False, True])
+def test_merge_from_archive_like_from_files(paths, tmp_path, make, name, union):
+    archive = make(paths + [str(tmp_path / 'data' / 'CI_RSI2000_test.csv')], tmp_path / name)
+    merged = merge.merge_union if union else merge.merge_logfiles
+    expected = merged(paths, tmp_path / 'expected.csv', chunk_size=1000)
+    stats = merged(archive, tmp_path / 'merged.csv', exclude=['CI_RSI2000_test.csv'],
+                   chunk_size=1000)
+    assert (tmp_path / 'merged.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()
+    assert stats.files_read == expected.files_read == 6
+    assert [os.path.basename(path) for path in stats.skipped] == \
+        [os.path.basename(path) for path in expected.skipped]
+
+
+def test_zip_members(paths, tmp_path):
+    archive = _zip(paths, tmp_path / 'data.zip')
+    assert sources.is_archive(archive) and not sources.is_archive(tmp_path / 'data')
+    with sources.open_archive(archive, pattern='subject-[12].csv') as source:
+        assert [str(member) for member in source] == [
+            os.path.join(str(archive), 'data', name) for name in ('subject-1.csv', 'subject-2.csv')]
+        member = source.members[0]
+        with sources.open_logfile(member) as fhand:
+            assert fhand.read() == pathlib.Path(paths[0]).read_bytes()
+        assert sources.file_stat(member)[0] == os.path.getsize(paths[0])
+        handles = list(source._handles)
+    assert all(handle.fp is None for handle in handles)
+
+
+def test_tar_members_are_streamed(paths, tmp_path):
+    archive = _tar(paths, tmp_path / 'data.tar.gz')
+    with sources.open_archive(archive) as source:
+        assert not source.random_access
+        names = [os.path.basename(member.name) for member in source.stream()]
+        assert names == [os.path.basename(path) for path in paths]
+        contents = [member.open().read() for member in source]
+    assert contents == [pathlib.Path(path).read_bytes() for path in paths]
+
+
+def test_incremental_from_zip(paths, tmp_path):
+    out = tmp_path / 'merged.csv'
+    incremental.merge_incremental(_zip(paths[:3], tmp_path / 'data.zip'), out)
+    stats = incremental.merge_incremental(_zip(paths, tmp_path / 'data.zip'), out)
+    assert not stats.rebuilt and stats.files_read == 3
+    merge.merge_logfiles(paths, tmp_path / 'expected.csv')
+    assert out.read_bytes() == (tmp_path / 'expected.csv').read_bytes()
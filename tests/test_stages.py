@@ -0,0 +1,136 @@
+"""Tests of ``oslogs.stages``: what is cached, and what is computed again after a change."""
+import os
+
+import pandas as pd
+import pytest
+
+from oslogs import benchmarks, chunked, columnar, merge, stages
+
+
+def _computed(pipeline):
+    return [name for name, how, _ in pipeline.history if how == 'computed']
+
+
+def _chain(pipeline, scale=2):
+    @pipeline.stage
+    def numbers():
+        return pd.DataFrame({'x': range(10)})
+
+    @pipeline.stage
+    def scaled(numbers, factor=scale):
+        return numbers * factor
+
+    @pipeline.stage
+    def total(scaled):
+        return int(scaled['x'].sum())
+    return pipeline
+
+
+def test_cached_on_the_second_get(tmp_path):
+    pipeline = _chain(stages.Pipeline(tmp_path / 'cache'))
+    assert pipeline.get('total') == 90
+    assert _computed(pipeline) == ['numbers', 'scaled', 'total']
+    pipeline = _chain(stages.Pipeline(tmp_path / 'cache'))
+    assert pipeline.get('total') == 90
+    assert pipeline.history[0][:2] == ('total', 'cached') and len(pipeline.history) == 1
+    assert pipeline.cached('scaled').endswith('.feather')
+
+
+def test_changed_argument_recomputes_the_stages_after_it(tmp_path):
+    _chain(stages.Pipeline(tmp_path / 'cache')).get('total')
+    pipeline = _chain(stages.Pipeline(tmp_path / 'cache'), scale=3)
+    assert pipeline.get('total') == 135
+    assert _computed(pipeline) == ['scaled', 'total']
+    assert ('numbers', 'cached') in [entry[:2] for entry in pipeline.history]
+
+
+def test_changed_code_recomputes_the_stages_after_it(tmp_path):
+    pipeline = _chain(stages.Pipeline(tmp_path / 'cache'))
+    pipeline.get('total')
+
+    @pipeline.stage
+    def scaled(numbers, factor=2):
+        return numbers * factor + 1
+
+    pipeline.history.clear()
+    assert pipeline.get('total') == 100
+    assert _computed(pipeline) == ['scaled', 'total']
+
+
+def test_changed_input_recomputes(tmp_path):
+    path = tmp_path / 'values.txt'
+    path.write_text('1 2 3')
+    pipeline = stages.Pipeline(tmp_path / 'cache')
+
+    @pipeline.stage(inputs=[path])
+    def values(path=str(path)):
+        with open(path) as fhand:
+            return [int(value) for value in fhand.read().split()]
+
+    assert pipeline.get('values') == [1, 2, 3]
+    path.write_text('1 2 3 4')
+    assert pipeline.get('values') == [1, 2, 3, 4]
+    assert _computed(pipeline) == ['values', 'values']
+
+
+def test_unreadable_entry_is_computed_again(tmp_path):
+    pipeline = _chain(stages.Pipeline(tmp_path / 'cache'))
+    pipeline.get('total')
+    with open(pipeline.cached('total'), 'wb') as fout:
+        fout.write(b'not a pickle')
+    pipeline.history.clear()
+    assert pipeline.get('total') == 90 and _computed(pipeline) == ['total']
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    pipeline = _chain(stages.Pipeline(tmp_path / 'cache'))
+    pipeline.get('total')
+    sizes = {name: os.path.getsize(pipeline.cached(name)) for name in ('numbers', 'scaled', 'total')}
+    os.utime(pipeline.cached('numbers'), ns=(0, 0))
+    pipeline.max_bytes = sizes['scaled'] + sizes['total']
+    pipeline.evict()
+    assert pipeline.cached('numbers') is None and pipeline.cached('total') is not None
+    pipeline.clear()
+    assert os.listdir(tmp_path / 'cache') == []
+
+
+def test_bad_stages(tmp_path):
+    pipeline = stages.Pipeline(tmp_path / 'cache')
+
+    @pipeline.stage
+    def first(second):
+        return second
+
+    with pytest.raises(KeyError):
+        pipeline.get('first')
+
+    @pipeline.stage
+    def second(first):
+        return first
+
+    with pytest.raises(ValueError):
+        pipeline.get('first')
+    with pytest.raises(KeyError):
+        pipeline.get('third')
+
+
+def test_datawrangling_pipeline(tmp_path):
+    src = tmp_path / 'data'
+    benchmarks.make_logfiles(src, 3, n_rows=150, n_columns=30, first=3)
+    pipeline = stages.datawrangling_pipeline(str(src), recode={3: 1}, cache_dir=tmp_path / 'cache')
+    df_correct = pipeline.get('df_correct')
+
+    df = pd.concat((pd.read_csv(path) for path in merge.list_logfiles(src)), ignore_index=True)
+    df_trim = df[chunked.INCLUDE_COLUMNS].copy()
+    df_trim = df_trim[df_trim['block'] < 11].reset_index(drop=True)
+    df_trim['subject_nr'] = df_trim['subject_nr'].replace(3, 1)
+    expected = columnar.apply_dtypes(df_trim, {'subject_nr': 'category', 'correct': 'category',
+                                               'response_time': 'Int64'})
+    expected = expected[expected['correct'] == 1].reset_index(drop=True)
+    pd.testing.assert_frame_equal(df_correct, expected)
+
+    # a new logfile changes the input of df, and so every stage
+    benchmarks.make_logfiles(src, 1, n_rows=150, n_columns=30, first=9)
+    pipeline.history.clear()
+    assert 9 in pipeline.get('df_correct')['subject_nr'].tolist()
+    assert _computed(pipeline) == ['df', 'df_trim', 'df_trim_blocks', 'df_correct']
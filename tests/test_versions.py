@@ -0,0 +1,79 @@
+"""Tests of ``oslogs.versions`` on a folder and archives with three experiment versions."""
+import json
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from oslogs import merge, versions
+
+V1 = ['subject_nr', 'response_time', 'correct']
+V2 = ['subject_nr', 'response_time', 'correct', 'block']
+V3 = ['correct', 'subject_nr']
+
+
+def _write(path, columns):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(','.join('"{}"'.format(column) for column in columns) + '\n'
+                    + ','.join('"1"' for _ in columns) + '\n')
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = tmp_path / 'data'
+    for pp in range(1, 5):
+        _write(root / 'pilot' / 'subject-{}.csv'.format(pp), V1)
+    for pp in range(5, 7):
+        _write(root / 'main' / 'pp{}'.format(pp) / 'subject-{}.csv'.format(pp), V2)
+    _write(root / 'subject-7.csv', V3)
+    (root / 'notes.txt').write_text('not a logfile\n')
+    return root
+
+
+def _names(files):
+    return sorted(os.path.basename(str(path)) for path in files)
+
+
+def _check(index):
+    assert index.files == 7 and len(index.versions) == 3
+    v1, v2, v3 = index.versions.values()
+    assert index.reference is v1 and v1.columns == V1
+    assert _names(v1.files) == ['subject-{}.csv'.format(pp) for pp in range(1, 5)]
+    assert _names(v2.files) == ['subject-5.csv', 'subject-6.csv'] and v2.columns == V2
+    assert _names(v3.files) == ['subject-7.csv']
+    assert index.diff(v2.fingerprint) == {'added': ['block'], 'removed': [], 'reordered': False}
+    assert index.diff(v3.fingerprint) == {'added': [], 'removed': ['response_time'],
+                                          'reordered': True}
+    assert index.diff(v1.fingerprint, v2.fingerprint)['removed'] == ['block']
+
+
+def test_folder(root, tmp_path):
+    index = versions.scan_versions(root, workers=2)
+    _check(index)
+    json.dumps(index.to_dict())
+    assert 'added: block' in str(index)
+    # every version can be merged on its own without skipping files
+    v2 = list(index.versions.values())[1]
+    stats = merge.merge_logfiles(v2.files, tmp_path / 'merged.csv')
+    assert stats.files_merged == 2 and not stats.skipped
+
+
+def test_archives(root, tmp_path):
+    paths = sorted(str(path) for path in root.rglob('*') if path.is_file())
+    with zipfile.ZipFile(tmp_path / 'data.zip', 'w') as zfile:
+        for path in paths:
+            zfile.write(path, os.path.relpath(path, tmp_path))
+    with tarfile.open(tmp_path / 'data.tar.gz', 'w:gz') as tar:
+        for path in paths:
+            tar.add(path, os.path.relpath(path, tmp_path))
+    for name in ('data.zip', 'data.tar.gz'):
+        index = versions.scan_versions(tmp_path / name)
+        _check(index)
+        assert all(isinstance(path, str) for version in index.versions.values()
+                   for path in version.files)
+
+
+def test_nothing_found(tmp_path):
+    index = versions.scan_versions(tmp_path)
+    assert index.files == 0 and index.reference is None